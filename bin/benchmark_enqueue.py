@@ -0,0 +1,78 @@
+#!/bin/env python3
+"""
+Benchmark enqueueing query jobs from many concurrent submitters.
+
+Starts SUBMITTERS threads (200 by default) that each enqueue the same QUERIES queries (10 by default) ROUNDS times (5 by
+default), with the first data source of the database REDASH_DATABASE_URL points to, prints the throughput and checks
+that each query got a single job. The jobs are deleted from RQ's Redis afterwards:
+
+    PYTHONPATH=. bin/run python bin/benchmark_enqueue.py [SUBMITTERS] [QUERIES] [ROUNDS]
+"""
+
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from rq import Connection
+
+from redash import create_app, models, rq_redis_connection
+from redash.tasks.queries.execution import _job_lock_id, enqueue_query
+from redash.tasks.worker import Job
+from redash.utils import gen_query_hash
+
+
+def main():
+    submitters = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    query_count = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    app = create_app()
+    with app.app_context():
+        data_source = models.DataSource.query.first()
+        if data_source is None:
+            sys.exit("The database needs a data source.")
+
+    run_id = uuid.uuid4().hex
+    queries = ["SELECT '{}', {}".format(run_id, i) for i in range(query_count)]
+    barrier = threading.Barrier(submitters + 1)
+    job_ids = defaultdict(set)
+    errors = []
+
+    def submit(offset):
+        barrier.wait()
+        try:
+            with app.app_context(), Connection(rq_redis_connection):
+                for i in range(rounds * query_count):
+                    query = queries[(offset + i) % query_count]
+                    job_ids[query].add(enqueue_query(query, data_source, None, metadata={}).id)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(submitters)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started_at = time.time()
+    for thread in threads:
+        thread.join()
+    duration = time.time() - started_at
+
+    calls = submitters * rounds * query_count
+    print(
+        "{} enqueues by {} submitters in {:.2f}s: {:.0f} enqueues/s".format(
+            calls, submitters, duration, calls / duration
+        )
+    )
+    print("Errors: {}".format(len(errors)))
+    print("Jobs per query: {}".format(sorted({len(ids) for ids in job_ids.values()})))
+
+    for query, ids in job_ids.items():
+        rq_redis_connection.delete(_job_lock_id(gen_query_hash(query), data_source.id))
+        for job_id in ids:
+            Job(job_id, connection=rq_redis_connection).delete()
+
+
+if __name__ == "__main__":
+    main()
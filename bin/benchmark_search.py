@@ -0,0 +1,104 @@
+#!/bin/env python3
+"""
+Benchmark the query and dashboard searches against synthetic data.
+
+Inserts COUNT synthetic queries and dashboards (200,000 by default) into the first organization of the database
+REDASH_DATABASE_URL points to, times each search, prints its plan, and rolls everything back:
+
+    PYTHONPATH=. bin/run python bin/benchmark_search.py [COUNT]
+
+Run it before and after applying the trigram indexes migration (or on a database without pg_trgm) to compare.
+"""
+
+import sys
+import time
+
+from sqlalchemy import text
+
+from redash import create_app, models
+from redash.models import db
+
+WORDS = ["sales", "revenue", "users", "churn", "日本語", "売上", "テスト", "레드대시", "funnel", "cohort"]
+
+SEARCHES = [
+    ("queries (full text)", lambda org, groups, user: models.Query.search("revenue", groups)),
+    ("queries (multi-byte)", lambda org, groups, user: models.Query.search("売上", groups, multi_byte_search=True)),
+    (
+        "queries (multi-byte, query text)",
+        lambda org, groups, user: models.Query.search("query:cohort_7", groups, multi_byte_search=True),
+    ),
+    ("dashboards", lambda org, groups, user: models.Dashboard.search(org, groups, user.id, "テスト")),
+]
+
+
+def insert_synthetic_data(org, count):
+    data_source = models.DataSource.query.join(models.DataSourceGroup).filter(models.DataSource.org == org).first()
+    user = models.User.query.filter(models.User.org == org).first()
+    if data_source is None or user is None:
+        sys.exit("The organization needs a data source that a group has access to, and a user.")
+
+    # The i-th row's words, picked with different strides so that they vary independently.
+    words = "(ARRAY[{}])".format(", ".join("'{}'".format(word) for word in WORDS))
+    word = words + "[1 + (i * {{}}) % {}]".format(len(WORDS))
+    params = {"org_id": org.id, "data_source_id": data_source.id, "user_id": user.id, "count": count}
+
+    db.session.execute(
+        text("""
+            INSERT INTO queries (org_id, data_source_id, user_id, name, description, query, query_hash, api_key, version,
+                                 is_archived, is_draft, schedule_failures, options, created_at, updated_at)
+            SELECT :org_id, :data_source_id, :user_id,
+                   {} || ' ' || {} || ' #' || i,
+                   'Description of ' || {},
+                   'SELECT * FROM ' || {} || '_' || (i % 100) || ' WHERE id > ' || i,
+                   md5(i::text), md5(i::text), 1, false, false, 0, '{{}}', now(), now()
+            FROM generate_series(1, :count) AS i
+            """.format(word.format(7), word.format(13), word.format(3), word.format(11))),
+        params,
+    )
+    db.session.execute(
+        text("""
+            INSERT INTO dashboards (org_id, user_id, name, slug, layout, dashboard_filters_enabled, is_archived,
+                                    is_draft, version, options, created_at, updated_at)
+            SELECT :org_id, :user_id, {} || ' ' || {} || ' #' || i, 'benchmark-' || i, '[]', false, false, false, 1,
+                   '{{}}', now(), now()
+            FROM generate_series(1, :count) AS i
+            """.format(word.format(7), word.format(13))),
+        params,
+    )
+    db.session.execute(text("ANALYZE queries"))
+    db.session.execute(text("ANALYZE dashboards"))
+    return user
+
+
+def benchmark(org, user, repeat=5):
+    for name, search in SEARCHES:
+        query = search(org, user.group_ids, user)
+        timings = []
+        for _ in range(repeat):
+            started_at = time.time()
+            count = len(query.limit(25).all())
+            timings.append(time.time() - started_at)
+
+        statement = query.limit(25).statement.compile(dialect=db.engine.dialect)
+        plan = db.session.connection().execute("EXPLAIN " + str(statement), statement.params)
+        print("{}: {} results, best of {}: {:.1f}ms".format(name, count, repeat, min(timings) * 1000))
+        for (line,) in plan:
+            print("    " + line)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    app = create_app()
+    with app.app_context():
+        org = models.Organization.query.first()
+        try:
+            started_at = time.time()
+            user = insert_synthetic_data(org, count)
+            print("Inserted {} queries and dashboards in {:.1f}s".format(count, time.time() - started_at))
+            benchmark(org, user)
+        finally:
+            db.session.rollback()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""partition events by month
+
+Revision ID: 064e187d719e
+Revises: 3e1c8f5a9b27
+Create Date: 2026-10-19 14:02:47.518302
+
+"""
+import datetime
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '064e187d719e'
+down_revision = '3e1c8f5a9b27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The existing events become a single partition, holding everything until the start of next month, instead of
+    # being copied. It's dropped once all of its events are past the retention period (REDASH_EVENTS_RETENTION_DAYS).
+    today = datetime.date.today()
+    next_month = (today.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+    bound = "{} 00:00:00+00".format(next_month.isoformat())
+
+    # The constraint and the indexes the partition needs are validated and built outside of the migration's
+    # transaction, which scans the table without blocking writes to it. That spares attaching the partition from
+    # scanning it, or building its indexes, while holding an exclusive lock: it only checks the constraint and attaches
+    # the partition's indexes to the partitioned table's.
+    op.execute(
+        "ALTER TABLE events ADD CONSTRAINT events_legacy_created_at_check "
+        "CHECK (created_at < '{}') NOT VALID".format(bound)
+    )
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TABLE events VALIDATE CONSTRAINT events_legacy_created_at_check")
+        op.execute("CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS events_legacy_pkey ON events (id, created_at)")
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS events_legacy_org_id_created_at_idx ON events (org_id, created_at)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS events_legacy_object_type_created_at_idx "
+            "ON events (object_type, created_at)"
+        )
+
+    op.execute("ALTER TABLE events DROP CONSTRAINT events_pkey")
+    op.execute("ALTER TABLE events RENAME TO events_legacy")
+    op.execute("ALTER TABLE events_legacy ADD CONSTRAINT events_legacy_pkey PRIMARY KEY USING INDEX events_legacy_pkey")
+
+    op.execute("CREATE TABLE events (LIKE events_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)")
+    op.execute("ALTER SEQUENCE events_id_seq OWNED BY events.id")
+    op.execute("ALTER TABLE events ADD CONSTRAINT events_pkey PRIMARY KEY (id, created_at)")
+    op.execute("ALTER TABLE events ADD CONSTRAINT events_org_id_fkey FOREIGN KEY (org_id) REFERENCES organizations (id)")
+    op.execute("ALTER TABLE events ADD CONSTRAINT events_user_id_fkey FOREIGN KEY (user_id) REFERENCES users (id)")
+    op.create_index("ix_events_org_id_created_at", "events", ["org_id", "created_at"])
+    op.create_index("ix_events_object_type_created_at", "events", ["object_type", "created_at"])
+
+    op.execute("ALTER TABLE events ATTACH PARTITION events_legacy FOR VALUES FROM (MINVALUE) TO ('{}')".format(bound))
+    op.execute("ALTER TABLE events_legacy DROP CONSTRAINT events_legacy_created_at_check")
+    op.execute("CREATE TABLE events_default PARTITION OF events DEFAULT")
+
+
+def downgrade():
+    op.execute("CREATE TABLE events_unpartitioned (LIKE events INCLUDING DEFAULTS)")
+    op.execute("INSERT INTO events_unpartitioned SELECT * FROM events")
+    op.execute("ALTER SEQUENCE events_id_seq OWNED BY events_unpartitioned.id")
+    op.execute("DROP TABLE events")
+    op.execute("ALTER TABLE events_unpartitioned RENAME TO events")
+    op.execute("ALTER TABLE events ADD CONSTRAINT events_pkey PRIMARY KEY (id)")
+    op.execute("ALTER TABLE events ADD CONSTRAINT events_org_id_fkey FOREIGN KEY (org_id) REFERENCES organizations (id)")
+    op.execute("ALTER TABLE events ADD CONSTRAINT events_user_id_fkey FOREIGN KEY (user_id) REFERENCES users (id)")
@@ -0,0 +1,25 @@
+"""add column_stats to query_results
+
+Revision ID: 3e1c8f5a9b27
+Revises: db0aca1ebd32
+Create Date: 2026-10-19 10:12:31.271841
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+
+
+# revision identifiers, used by Alembic.
+revision = '3e1c8f5a9b27'
+down_revision = 'db0aca1ebd32'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('query_results', sa.Column('column_stats', JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade():
+    op.drop_column('query_results', 'column_stats')
@@ -0,0 +1,26 @@
+"""add changes object index
+
+Revision ID: 5f1a9d3c7e20
+Revises: b4e7a9c2d815
+Create Date: 2026-10-19 19:02:41.517362
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5f1a9d3c7e20'
+down_revision = 'b4e7a9c2d815'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Recording a change reads the object's previous changes, to diff its text and JSON columns.
+    op.create_index(
+        "ix_changes_object_type_object_id", "changes", ["object_type", "object_id", "id"], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index("ix_changes_object_type_object_id", table_name="changes")
@@ -0,0 +1,47 @@
+"""add trigram search indexes
+
+Revision ID: 8c2d4f6a1b3e
+Revises: 064e187d719e
+Create Date: 2026-10-19 16:21:08.204715
+
+"""
+import logging
+
+from alembic import op
+from sqlalchemy import text
+
+
+# revision identifiers, used by Alembic.
+revision = '8c2d4f6a1b3e'
+down_revision = '064e187d719e'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+INDEXES = {
+    "ix_queries_name_trgm": ("queries", "name"),
+    "ix_queries_description_trgm": ("queries", "description"),
+    "ix_queries_query_trgm": ("queries", "query"),
+    "ix_dashboards_name_trgm": ("dashboards", "name"),
+}
+
+
+def upgrade():
+    # Trigram indexes serve the ILIKE '%term%' conditions of the multi-byte (and dashboard) search, which otherwise
+    # scan the whole table. Searching works without them, so they're skipped where pg_trgm isn't installed.
+    available = op.get_bind().execute(
+        text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    ).scalar()
+    if not available:
+        logger.warning("The pg_trgm extension isn't available, so searches won't use trigram indexes.")
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, (table, column) in INDEXES.items():
+        op.execute("CREATE INDEX IF NOT EXISTS {} ON {} USING gin ({} gin_trgm_ops)".format(name, table, column))
+
+
+def downgrade():
+    for name in INDEXES:
+        op.execute("DROP INDEX IF EXISTS {}".format(name))
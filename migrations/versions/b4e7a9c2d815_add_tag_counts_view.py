@@ -0,0 +1,50 @@
+"""add tag counts view
+
+Revision ID: b4e7a9c2d815
+Revises: 8c2d4f6a1b3e
+Create Date: 2026-10-19 17:48:33.091246
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e7a9c2d815'
+down_revision = '8c2d4f6a1b3e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE MATERIALIZED VIEW tag_counts AS
+        SELECT 'Query'::varchar AS object_type, org_id, ARRAY[data_source_id] AS data_source_ids,
+               CASE WHEN is_draft THEN user_id END AS user_id, is_draft, tag, count(*)::integer AS count
+        FROM queries, unnest(tags) AS tag
+        WHERE is_archived IS false AND data_source_id IS NOT NULL
+        GROUP BY 1, 2, 3, 4, 5, 6
+        UNION ALL
+        SELECT 'Dashboard', org_id, data_source_ids, user_id, is_draft, tag, count(*)::integer
+        FROM (
+            SELECT dashboards.org_id, dashboards.user_id, dashboards.is_draft, dashboards.tags,
+                   ARRAY(
+                       SELECT DISTINCT queries.data_source_id
+                       FROM widgets
+                       JOIN visualizations ON visualizations.id = widgets.visualization_id
+                       JOIN queries ON queries.id = visualizations.query_id
+                       WHERE widgets.dashboard_id = dashboards.id AND queries.data_source_id IS NOT NULL
+                       ORDER BY 1
+                   ) AS data_source_ids
+            FROM dashboards
+            WHERE is_archived IS false
+        ) AS dashboards, unnest(tags) AS tag
+        GROUP BY 1, 2, 3, 4, 5, 6
+    """)
+    op.execute("""
+        CREATE UNIQUE INDEX ix_tag_counts
+        ON tag_counts (object_type, org_id, data_source_ids, user_id, is_draft, tag)
+    """)
+
+
+def downgrade():
+    op.execute("DROP MATERIALIZED VIEW tag_counts")
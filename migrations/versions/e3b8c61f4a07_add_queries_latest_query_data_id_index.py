@@ -0,0 +1,26 @@
+"""add queries latest_query_data_id index
+
+Revision ID: e3b8c61f4a07
+Revises: 5f1a9d3c7e20
+Create Date: 2026-10-19 20:14:52.836410
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b8c61f4a07'
+down_revision = '5f1a9d3c7e20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Finding (and deleting) the query results no query uses looks queries up by the result they use.
+    op.create_index(
+        op.f("ix_queries_latest_query_data_id"), "queries", ["latest_query_data_id"], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_queries_latest_query_data_id"), table_name="queries")
@@ -33,6 +33,7 @@ def create_app():
         tasks,
     )
     from .handlers.webpack import configure_webpack
+    from .metrics import profiling
     from .metrics import request as request_metrics
     from .models import db, users
     from .utils import sentry
@@ -46,6 +47,7 @@ def create_app():
 
     security.init_app(app)
     request_metrics.init_app(app)
+    profiling.init_app(app)
     db.init_app(app)
     migrate.init_app(app, db)
     mail.init_app(app)
@@ -13,8 +13,10 @@ from werkzeug.exceptions import Unauthorized
 from redash import models, settings
 from redash.authentication import jwt_auth
 from redash.authentication.org_resolving import current_org
+from redash.models import principals
 from redash.settings.organization import settings as org_settings
-from redash.tasks import record_event
+from redash.tasks import enqueue_event
+from redash.utils.request_cache import request_cache
 
 login_manager = LoginManager()
 logger = logging.getLogger("authentication")
@@ -51,8 +53,8 @@ def load_user(user_id_with_identity):
 
     try:
         user_id, _ = user_id_with_identity.split("-")
-        user = models.User.get_by_id_and_org(user_id, org)
-        if user.is_disabled or user.get_id() != user_id_with_identity:
+        user, identity = get_user_by_id_and_org(user_id, org)
+        if user.is_disabled or identity != user_id_with_identity:
             return None
 
         return user
@@ -105,22 +107,89 @@ def hmac_load_user_from_request(request):
     return None
 
 
+def cache_user(user):
+    """Cache a user as the principal of the requests they make, and return their session identity.
+
+    Their API key isn't cached (only its hash, to check cached API keys against): it's loaded when it's accessed. Nor are
+    their details, which are updated in bulk (see sync_last_active_at), so that a cached user that's changed doesn't
+    write stale details back.
+    """
+    identity = user.get_id()
+    principal = {
+        "user": principals.dump_instance(user, exclude=("password_hash", "api_key", "details")),
+        "api_key_id": principals.api_key_id(user.org_id, user.api_key) if user.api_key else None,
+        "identity": identity,
+        "permissions": user.permissions,
+    }
+    principals.cache_principal("user", user.id, principal)
+    return identity
+
+
+def get_user_by_id_and_org(user_id, org):
+    """Return the user of the organization with the given id and their session identity, from the principals cache
+    when they're there."""
+    principal = principals.get_principal("user", user_id)
+    if principal is None or principal["user"]["org_id"] != org.id:
+        user = models.User.get_by_id_and_org(user_id, org)
+        return user, cache_user(user)
+
+    group_ids = tuple(sorted(principal["user"]["group_ids"] or []))
+    request_cache("group_permissions")[group_ids] = principal["permissions"]
+    return principals.load_instance(models.User, principal["user"]), principal["identity"]
+
+
+def get_cached_user_from_api_key(api_key, query_id, org):
+    cache_id = principals.api_key_id(org.id, api_key)
+    principal = principals.get_principal("api_key", cache_id)
+    if principal is None:
+        return None
+
+    if "user_id" in principal:
+        try:
+            user, _ = get_user_by_id_and_org(principal["user_id"], org)
+        except models.NoResultFound:
+            return None
+        # Regenerated keys and disabled users are left for the database lookup.
+        user_principal = principals.get_principal("user", user.id)
+        if user_principal and user_principal.get("api_key_id") == cache_id and not user.is_disabled:
+            return user
+    elif "api_key" in principal:
+        api_key = principals.load_instance(models.ApiKey, principal["api_key"])
+        return models.ApiUser(api_key, api_key.org, [])
+    elif query_id and str(principal["query_id"]) == str(query_id):
+        return models.ApiUser(
+            api_key,
+            org,
+            principal["groups"],
+            name="ApiKey: Query {}".format(principal["query_id"]),
+        )
+
+    return None
+
+
 def get_user_from_api_key(api_key, query_id):
     if not api_key:
         return None
 
-    user = None
+    org = current_org._get_current_object()
+    user = get_cached_user_from_api_key(api_key, query_id, org)
+    if user is not None:
+        return user
 
     # TODO: once we switch all api key storage into the ApiKey model, this code will be much simplified
-    org = current_org._get_current_object()
+    cache_id = principals.api_key_id(org.id, api_key)
     try:
         user = models.User.get_by_api_key_and_org(api_key, org)
         if user.is_disabled:
             user = None
+        else:
+            cache_user(user)
+            principals.cache_principal("api_key", cache_id, {"user_id": user.id})
     except models.NoResultFound:
         try:
             api_key = models.ApiKey.get_by_api_key(api_key)
             user = models.ApiUser(api_key, api_key.org, [])
+            principals.cache_principal("api_key", cache_id, {"api_key": principals.dump_instance(api_key)})
         except models.NoResultFound:
             if query_id:
                 query = models.Query.get_by_id_and_org(query_id, org)
@@ -131,6 +200,7 @@ def get_user_from_api_key(api_key, query_id):
                         list(query.groups.keys()),
                         name="ApiKey: Query {}".format(query.id),
                     )
+                    principals.cache_principal("api_key", cache_id, {"query_id": query.id, "groups": user.group_ids})
 
     return user
 
@@ -210,7 +280,7 @@ def log_user_logged_in(app, user):
         "ip": request.remote_addr,
     }
 
-    record_event.delay(event)
+    enqueue_event(event)
 
 
 @login_manager.unauthorized_handler
@@ -123,3 +123,37 @@ def reencrypt(old_secret, new_secret, show_sql):
 
     _reencrypt_for_table("data_sources", "DataSource")
     _reencrypt_for_table("notification_destinations", "NotificationDestination")
+
+
+@manager.command(name="compact_changes")
+@option("--batch-size", default=100, help="number of objects whose changes are rewritten in each transaction")
+def compact_changes(batch_size):
+    """Rewrite the change history to record only the columns that changed, and diffs of the text and JSON ones."""
+    from redash.models import Change, ChangeTrackingMixin, db
+    from redash.models.base import _gfk_types
+
+    _wait_for_db_connection(db)
+
+    def changes_size():
+        return db.session.execute("SELECT pg_size_pretty(sum(pg_column_size(change))) FROM changes").scalar()
+
+    size = changes_size()
+    objects = db.session.query(Change.object_type, Change.object_id).distinct().order_by(Change.object_type).all()
+    rewritten = 0
+    for i, (object_type, object_id) in enumerate(objects, 1):
+        model = _gfk_types.get(object_type)
+        if model is None or not issubclass(model, ChangeTrackingMixin):
+            continue
+
+        changes = Change.query.filter(Change.object_type == object_type, Change.object_id == object_id).order_by(
+            Change.id
+        )
+        rewritten += len(Change.compact(changes, model))
+        if i % batch_size == 0:
+            db.session.commit()
+            db.session.expunge_all()
+    db.session.commit()
+
+    print(f"Rewrote {rewritten} changes of {len(objects)} objects.")
+    # The space of the rewritten rows is reused by new rows, but only returned to the OS by VACUUM FULL.
+    print(f"The changes took {size}, and take {changes_size()} (run VACUUM FULL changes to shrink the table).")
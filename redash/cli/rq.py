@@ -10,7 +10,8 @@ from sqlalchemy.orm import configure_mappers
 from supervisor_checks import check_runner
 from supervisor_checks.check_modules import base
 
-from redash import rq_redis_connection
+from redash import rq_redis_connection, settings
+from redash.metrics import prometheus
 from redash.tasks import (
     periodic_job_definitions,
     rq_scheduler,
@@ -42,6 +43,9 @@ def worker(queues):
     else:
         queues = chain(*[queue.split(",") for queue in queues])
 
+    if prometheus.enabled() and settings.PROMETHEUS_WORKER_PORT:
+        prometheus.start_worker_exporter(settings.PROMETHEUS_WORKER_PORT)
+
     with Connection(rq_redis_connection):
         w = Worker(queues, log_job_description=False, job_monitoring_interval=5)
         w.work()
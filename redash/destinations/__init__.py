@@ -1,8 +1,32 @@
 import logging
 
+import requests
+from requests.adapters import HTTPAdapter
+
 logger = logging.getLogger(__name__)
 
-__all__ = ["BaseDestination", "register", "get_destination", "import_destinations"]
+__all__ = ["BaseDestination", "DeliveryError", "register", "get_destination", "import_destinations"]
+
+# Responses that mean the destination may accept the notification if it's sent again later.
+RETRYABLE_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+
+class DeliveryError(Exception):
+    pass
+
+
+_http_session = None
+
+
+def http_session():
+    """Return the requests session shared by destinations, so connections to the same host are reused."""
+    global _http_session
+    if _http_session is None:
+        _http_session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=20, pool_maxsize=20)
+        _http_session.mount("http://", adapter)
+        _http_session.mount("https://", adapter)
+    return _http_session
 
 
 class BaseDestination:
@@ -34,6 +58,13 @@ class BaseDestination:
     def notify(self, alert, query, user, new_state, app, host, metadata, options):
         raise NotImplementedError()
 
+    def post(self, url, **kwargs):
+        """POST using the shared session, raising DeliveryError if the response says to try again later."""
+        response = http_session().post(url, **kwargs)
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            raise DeliveryError("{} responded with status code {}".format(self.name(), response.status_code))
+        return response
+
     @classmethod
     def to_dict(cls):
         return {
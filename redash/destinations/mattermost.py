@@ -1,7 +1,5 @@
 import logging
 
-import requests
-
 from redash.destinations import BaseDestination, register
 from redash.utils import json_dumps
 
@@ -44,13 +42,14 @@ class Mattermost(BaseDestination):
             payload["channel"] = options.get("channel")
 
         try:
-            resp = requests.post(options.get("url"), data=json_dumps(payload), timeout=5.0)
+            resp = self.post(options.get("url"), data=json_dumps(payload), timeout=5.0)
             logging.warning(resp.text)
 
             if resp.status_code != 200:
                 logging.error("Mattermost webhook send ERROR. status_code => {status}".format(status=resp.status_code))
         except Exception:
             logging.exception("Mattermost webhook send ERROR.")
+            raise
 
 
 register(Mattermost)
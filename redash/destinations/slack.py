@@ -1,7 +1,5 @@
 import logging
 
-import requests
-
 from redash.destinations import BaseDestination, register
 from redash.utils import json_dumps
 
@@ -50,12 +48,13 @@ class Slack(BaseDestination):
         payload = {"attachments": [{"text": text, "color": color, "fields": fields}]}
 
         try:
-            resp = requests.post(options.get("url"), data=json_dumps(payload).encode("utf-8"), timeout=5.0)
+            resp = self.post(options.get("url"), data=json_dumps(payload).encode("utf-8"), timeout=5.0)
             logging.warning(resp.text)
             if resp.status_code != 200:
                 logging.error("Slack send ERROR. status_code => {status}".format(status=resp.status_code))
         except Exception:
             logging.exception("Slack send ERROR.")
+            raise
 
 
 register(Slack)
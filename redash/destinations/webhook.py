@@ -1,6 +1,5 @@
 import logging
 
-import requests
 from requests.auth import HTTPBasicAuth
 
 from redash.destinations import BaseDestination, register
@@ -40,7 +39,7 @@ class Webhook(BaseDestination):
 
             headers = {"Content-Type": "application/json"}
             auth = HTTPBasicAuth(options.get("username"), options.get("password")) if options.get("username") else None
-            resp = requests.post(
+            resp = self.post(
                 options.get("url"),
                 data=json_dumps(data),
                 auth=auth,
@@ -51,6 +50,7 @@ class Webhook(BaseDestination):
                 logging.error("webhook send ERROR. status_code => {status}".format(status=resp.status_code))
         except Exception:
             logging.exception("webhook send ERROR.")
+            raise
 
 
 register(Webhook)
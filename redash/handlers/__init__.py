@@ -1,8 +1,9 @@
-from flask import jsonify
+from flask import Response, abort, jsonify, request
 from flask_login import login_required
 
 from redash.handlers.api import api
 from redash.handlers.base import routes
+from redash.metrics import prometheus
 from redash.monitor import get_status
 from redash.permissions import require_super_admin
 from redash.security import talisman
@@ -14,6 +15,17 @@ def ping():
     return "PONG."
 
 
+@routes.route("/metrics", methods=["GET"])
+@talisman(force_https=False)
+def metrics():
+    if not prometheus.served():
+        abort(404)
+    if not prometheus.is_authorized(request):
+        abort(401)
+    body, content_type = prometheus.latest()
+    return Response(body, content_type=content_type)
+
+
 @routes.route("/status.json")
 @login_required
 @require_super_admin
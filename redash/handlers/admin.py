@@ -1,9 +1,11 @@
+from flask import abort, current_app
 from flask_login import current_user, login_required
 
 from redash import models, redis_connection
 from redash.authentication import current_org
 from redash.handlers import routes
 from redash.handlers.base import json_response, record_event
+from redash.metrics import profiling
 from redash.monitor import rq_status
 from redash.permissions import require_super_admin
 from redash.serializers import QuerySerializer
@@ -52,3 +54,52 @@ def queries_rq_status():
     )
 
     return json_response(rq_status())
+
+
+@routes.route("/api/admin/profiles", methods=["GET"])
+@require_super_admin
+@login_required
+def request_profiles():
+    record_event(
+        current_org,
+        current_user._get_current_object(),
+        {"action": "list", "object_type": "request_profile"},
+    )
+
+    return json_response({"profiles": profiling.list_reports()})
+
+
+@routes.route("/api/admin/profiles/<profile_id>", methods=["GET"])
+@require_super_admin
+@login_required
+def request_profile(profile_id):
+    record_event(
+        current_org,
+        current_user._get_current_object(),
+        {"action": "view", "object_type": "request_profile", "object_id": profile_id},
+    )
+
+    report = profiling.get_report(profile_id)
+    if report is None:
+        abort(404)
+
+    return json_response(report)
+
+
+@routes.route("/api/admin/profiles/<profile_id>.prof", methods=["GET"])
+@require_super_admin
+@login_required
+def request_profile_pstats(profile_id):
+    record_event(
+        current_org,
+        current_user._get_current_object(),
+        {"action": "view", "object_type": "request_profile", "object_id": profile_id},
+    )
+
+    stats = profiling.get_pstats(profile_id)
+    if stats is None:
+        abort(404)
+
+    response = current_app.response_class(stats, mimetype="application/octet-stream")
+    response.headers.add("Content-Disposition", "attachment", filename="{}.prof".format(profile_id))
+    return response
@@ -5,6 +5,7 @@ from redash import models, utils
 from redash.handlers.base import (
     BaseResource,
     get_object_or_404,
+    paginate,
     require_fields,
 )
 from redash.permissions import (
@@ -109,7 +110,12 @@ class AlertListResource(BaseResource):
     @require_permission("list_alerts")
     def get(self):
         self.record_event({"action": "list", "object_type": "alert"})
-        return [serialize_alert(alert) for alert in models.Alert.all(group_ids=self.current_user.group_ids)]
+        alerts = models.Alert.all(group_ids=self.current_user.group_ids)
+        # Only paged when asked to, as clients expect the whole list otherwise.
+        if "cursor" in request.args:
+            page_size = request.args.get("page_size", 25, type=int)
+            return paginate(alerts, None, page_size, serialize_alert, cursor=request.args["cursor"])
+        return [serialize_alert(alert) for alert in alerts]
 
 
 class AlertSubscriptionListResource(BaseResource):
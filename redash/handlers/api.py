@@ -94,7 +94,7 @@ from redash.handlers.visualizations import (
     VisualizationResource,
 )
 from redash.handlers.widgets import WidgetListResource, WidgetResource
-from redash.utils import json_dumps
+from redash.utils import COMPACT_SEPARATORS, json_dumps
 
 
 class ApiExt(Api):
@@ -111,7 +111,7 @@ def json_representation(data, code, headers=None):
     # Flask-Restful checks only for flask.Response but flask-login uses werkzeug.wrappers.Response
     if isinstance(data, Response):
         return data
-    resp = make_response(json_dumps(data), code)
+    resp = make_response(json_dumps(data, separators=COMPACT_SEPARATORS), code)
     resp.headers.extend(headers or {})
     return resp
 
@@ -1,20 +1,31 @@
+import base64
+import binascii
+import datetime
+import decimal
 import time
 from inspect import isclass
 
 from flask import Blueprint, current_app, request
 from flask_login import current_user, login_required
 from flask_restful import Resource, abort
-from sqlalchemy import cast
+from sqlalchemy import Float, Numeric, and_, cast, false, or_
 from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import ColumnElement, UnaryExpression
+from sqlalchemy.sql.functions import FunctionElement
 
 from redash import settings
 from redash.authentication import current_org
 from redash.models import db
-from redash.tasks import record_event as record_event_task
-from redash.utils import json_dumps
+from redash.models.base import estimated_count
+from redash.tasks import enqueue_event
+from redash.utils import COMPACT_SEPARATORS, json_dumps, json_loads
 from redash.utils.query_order import sort_query
 
+# Functions that return floats, though SQLAlchemy doesn't know their type.
+FLOAT_FUNCTIONS = ("ts_rank", "ts_rank_cd")
+
 routes = Blueprint("redash", __name__, template_folder=settings.fix_assets_path("templates"))
 
 
@@ -58,7 +69,7 @@ def record_event(org, user, options):
     if "timestamp" not in options:
         options["timestamp"] = int(time.time())
 
-    record_event_task.delay(options)
+    enqueue_event(options)
 
 
 def require_fields(req, fields):
@@ -77,27 +88,144 @@ def get_object_or_404(fn, *args, **kwargs):
     return rv
 
 
-def paginate(query_set, page, page_size, serializer, **kwargs):
-    count = query_set.count()
+def count_results(query_set, estimate=False):
+    """Count the results of a query, or return the planner's estimate of their number when it's too high to count
+    them cheaply. Returns the count and whether it's an estimate."""
+    if estimate:
+        count = estimated_count(query_set)
+        if count > settings.PAGINATION_EXACT_COUNT_LIMIT:
+            return count, True
+
+    return query_set.count(), False
+
+
+def _sort_keys(query_set):
+    """Return the (expression, descending, nulls last) keys a query is ordered by, ending with its primary key."""
+    keys = []
+    for clause in query_set._order_by or ():
+        nulls_last = None
+        if isinstance(clause, UnaryExpression) and clause.modifier in (
+            operators.nullslast_op,
+            operators.nullsfirst_op,
+        ):
+            nulls_last = clause.modifier is operators.nullslast_op
+            clause = clause.element
+
+        descending = isinstance(clause, UnaryExpression) and clause.modifier is operators.desc_op
+        if isinstance(clause, UnaryExpression) and clause.modifier in (operators.asc_op, operators.desc_op):
+            clause = clause.element
+
+        if not isinstance(clause, ColumnElement):
+            abort(400, message="This order can't be paged with a cursor.")
+
+        # Floats (like search ranks, which are reals) don't compare equal to their values once they're round-tripped
+        # through the cursor, so they're compared as the exact numerics they convert to.
+        if isinstance(clause.type, Float) or (isinstance(clause, FunctionElement) and clause.name in FLOAT_FUNCTIONS):
+            clause = cast(clause, Numeric)
+
+        # The order PostgreSQL puts NULLs in by default.
+        keys.append((clause, descending, descending if nulls_last is None else nulls_last))
+
+    # Make the order total, so that every row is after exactly the rows before it.
+    entity = query_set.column_descriptions[0]["entity"]
+    keys.append((entity.id, True, True))
+    return keys
+
+
+def _after(keys, values):
+    """Return the criteria of the rows that come after the row with the given values of the sort keys."""
+    (expression, descending, nulls_last), value = keys[0], values[0]
+    if value is None:
+        later = false() if nulls_last else expression.isnot(None)
+        same = expression.is_(None)
+    else:
+        later = expression < value if descending else expression > value
+        if nulls_last:
+            later = or_(later, expression.is_(None))
+        same = expression == value
+
+    if len(keys) == 1:
+        return later
+    return or_(later, and_(same, _after(keys[1:], values[1:])))
+
+
+def encode_cursor(values):
+    # Datetimes keep their microseconds (which JSON encoding drops), so that rows created within the same millisecond
+    # as the cursor's row aren't skipped or repeated.
+    values = [value.isoformat() if isinstance(value, datetime.datetime) else value for value in values]
+    # Numerics are kept exact as well.
+    values = [str(value) if isinstance(value, decimal.Decimal) else value for value in values]
+    return base64.urlsafe_b64encode(json_dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        return json_loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        abort(400, message="Invalid cursor.")
+
+
+def paginate_with_cursor(query_set, cursor, page_size):
+    """Return a page of results that follow the row the cursor points to (or the first page, when it's empty), and
+    the cursor of the next page (None on the last page).
+
+    Unlike paging with an offset, the database doesn't go through the results before the page to find it.
+    """
+    keys = _sort_keys(query_set)
+    if query_set._distinct is not False:
+        # DISTINCT ON only allows ordering by its own expressions, so page through the distinct rows instead.
+        query_set = query_set.from_self().order_by(*query_set._order_by)
+    query_set = query_set.order_by(keys[-1][0].desc())
+
+    if cursor:
+        values = decode_cursor(cursor)
+        if not isinstance(values, list) or len(values) != len(keys):
+            abort(400, message="Invalid cursor.")
+        query_set = query_set.filter(_after(keys, values))
+
+    rows = query_set.add_columns(*[expression for expression, _, _ in keys]).limit(page_size + 1).all()
+    next_cursor = encode_cursor(list(rows[page_size - 1][1:])) if len(rows) > page_size else None
+    return [row[0] for row in rows[:page_size]], next_cursor
 
-    if page < 1:
-        abort(400, message="Page must be positive integer.")
 
-    if (page - 1) * page_size + 1 > count > 0:
-        abort(400, message="Page is out of range.")
+def paginate(query_set, page, page_size, serializer, cursor=None, estimate_count=False, **kwargs):
+    """Return a page of the results of a query, serialized.
 
+    Pages are picked by number (`page`), unless a `cursor` is given: then the page that follows the cursor's is
+    returned, along with the `next_cursor`. Counts of searches (`estimate_count`), and of lists paged with a cursor,
+    are estimated when they're too large to count cheaply.
+    """
     if page_size > 250 or page_size < 1:
         abort(400, message="Page size is out of range (1-250).")
 
-    results = query_set.paginate(page, page_size)
+    count, count_is_estimate = count_results(query_set, estimate=estimate_count or cursor is not None)
+
+    if cursor is not None:
+        items, next_cursor = paginate_with_cursor(query_set, cursor, page_size)
+    else:
+        if page < 1:
+            abort(400, message="Page must be positive integer.")
+
+        # Estimates are off, so a page past an estimated count may still have results.
+        if (page - 1) * page_size + 1 > count > 0 and not count_is_estimate:
+            abort(400, message="Page is out of range.")
+
+        items = query_set.paginate(page, page_size, error_out=not count_is_estimate).items
 
     # support for old function based serializers
     if isclass(serializer):
-        items = serializer(results.items, **kwargs).serialize()
+        items = serializer(items, **kwargs).serialize()
     else:
-        items = [serializer(result) for result in results.items]
+        items = [serializer(result) for result in items]
 
-    return {"count": count, "page": page, "page_size": page_size, "results": items}
+    response = {"count": count, "page_size": page_size, "results": items}
+    if cursor is not None:
+        response["next_cursor"] = next_cursor
+    else:
+        response["page"] = page
+    if count_is_estimate:
+        response["count_is_estimate"] = True
+    return response
 
 
 def org_scoped_rule(rule):
@@ -108,7 +236,14 @@ def org_scoped_rule(rule):
 
 
 def json_response(response):
-    return current_app.response_class(json_dumps(response), mimetype="application/json")
+    return current_app.response_class(json_dumps(response, separators=COMPACT_SEPARATORS), mimetype="application/json")
+
+
+def conditional_json_response(response):
+    """Return a JSON response tagged with an ETag of its body, or 304 Not Modified if the client already has it."""
+    response = json_response(response)
+    response.add_etag()
+    return response.make_conditional(request)
 
 
 def filter_by_tags(result_set, column):
@@ -6,6 +6,7 @@ from sqlalchemy.orm.exc import StaleDataError
 from redash import models
 from redash.handlers.base import (
     BaseResource,
+    conditional_json_response,
     filter_by_tags,
     get_object_or_404,
     paginate,
@@ -41,6 +42,7 @@ class DashboardListResource(BaseResource):
 
         :qparam number page_size: Number of queries to return per page
         :qparam number page: Page number to retrieve
+        :qparam string cursor: Cursor of the page to retrieve instead (empty for the first one)
         :qparam number order: Name of column to order by
         :qparam number q: Full text search term
 
@@ -74,6 +76,8 @@ class DashboardListResource(BaseResource):
             page=page,
             page_size=page_size,
             serializer=DashboardSerializer,
+            cursor=request.args.get("cursor"),
+            estimate_count=bool(search_term),
         )
 
         if search_term:
@@ -196,7 +200,7 @@ class DashboardResource(BaseResource):
 
         self.record_event({"action": "view", "object_id": dashboard.id, "object_type": "dashboard"})
 
-        return response
+        return conditional_json_response(response)
 
     @require_permission("edit_dashboard")
     def post(self, dashboard_id):
@@ -291,7 +295,7 @@ class PublicDashboardResource(BaseResource):
         else:
             dashboard = self.current_user.object
 
-        return public_dashboard(dashboard)
+        return conditional_json_response(public_dashboard(dashboard))
 
 
 class DashboardShareResource(BaseResource):
@@ -129,6 +129,7 @@ class BaseQueryListResource(BaseResource):
 
         :qparam number page_size: Number of queries to return per page
         :qparam number page: Page number to retrieve
+        :qparam string cursor: Cursor of the page to retrieve instead (empty for the first one)
         :qparam number order: Name of column to order by
         :qparam number q: Full text search term
 
@@ -154,6 +155,8 @@ class BaseQueryListResource(BaseResource):
             page=page,
             page_size=page_size,
             serializer=QuerySerializer,
+            cursor=request.args.get("cursor"),
+            estimate_count=bool(search_term),
             with_stats=True,
             with_last_modified_by=False,
         )
@@ -8,6 +8,7 @@ from flask_restful import abort
 
 from redash import models, settings
 from redash.handlers.base import BaseResource, get_object_or_404, record_event
+from redash.metrics import prometheus
 from redash.models.parameterized_query import (
     InvalidParameterError,
     ParameterizedQuery,
@@ -26,17 +27,21 @@ from redash.serializers import (
     serialize_job,
     serialize_query_result,
     serialize_query_result_to_dsv,
+    serialize_query_result_to_json,
     serialize_query_result_to_xlsx,
 )
 from redash.tasks import Job
 from redash.tasks.queries import enqueue_query
 from redash.utils import (
     collect_parameters_from_request,
-    json_dumps,
     to_filename,
 )
 
 
+def query_result_etag(query_result, filetype):
+    return "query-result-{}-{}".format(query_result.id, filetype)
+
+
 def error_response(message, http_status=400):
     return {"job": {"status": 4, "error": message}}, http_status
 
@@ -82,6 +87,7 @@ def run_query(query, parameters, data_source, query_id, should_apply_auto_limit,
         query_result = None
     else:
         query_result = models.QueryResult.get_latest(data_source, query_text, max_age)
+        prometheus.record_cache_lookup(data_source.type, query_result is not None)
 
     record_event(
         current_user.org,
@@ -310,8 +316,22 @@ class QueryResultResource(BaseResource):
         query_result = None
         query = None
 
+        if request.if_none_match:
+            # The client might have this result already, so load its data only if we end up building a response.
+            load_options = {"load_data": False}
+        elif filetype == "json":
+            # The JSON response embeds the stored data as is, so there's no need to decode it.
+            load_options = {"load_data": False, "load_serialized_data": True}
+        else:
+            load_options = {}
+
         if query_result_id:
-            query_result = get_object_or_404(models.QueryResult.get_by_id_and_org, query_result_id, self.current_org)
+            query_result = get_object_or_404(
+                models.QueryResult.get_by_id_and_org,
+                query_result_id,
+                self.current_org,
+                **load_options,
+            )
 
         if query_id is not None:
             query = get_object_or_404(models.Query.get_by_id_and_org, query_id, self.current_org)
@@ -321,6 +341,7 @@ class QueryResultResource(BaseResource):
                     models.QueryResult.get_by_id_and_org,
                     query.latest_query_data_id,
                     self.current_org,
+                    **load_options,
                 )
 
             if query is not None and query_result is not None and self.current_user.is_api_user():
@@ -350,13 +371,20 @@ class QueryResultResource(BaseResource):
 
                 self.record_event(event)
 
-            response_builders = {
-                "json": self.make_json_response,
-                "xlsx": self.make_excel_response,
-                "csv": self.make_csv_response,
-                "tsv": self.make_tsv_response,
-            }
-            response = response_builders[filetype](query_result)
+            # Query results never change once stored, so the result id and format identify the response body.
+            etag = query_result_etag(query_result, filetype)
+            if request.if_none_match.contains_weak(etag):
+                response = make_response("", 304)
+            else:
+                response_builders = {
+                    "json": self.make_json_response,
+                    "xlsx": self.make_excel_response,
+                    "csv": self.make_csv_response,
+                    "tsv": self.make_tsv_response,
+                }
+                response = response_builders[filetype](query_result)
+
+            response.set_etag(etag)
 
             if len(settings.ACCESS_CONTROL_ALLOW_ORIGIN) > 0:
                 self.add_cors_headers(response.headers)
@@ -376,7 +404,7 @@ class QueryResultResource(BaseResource):
 
     @staticmethod
     def make_json_response(query_result):
-        data = json_dumps({"query_result": query_result.to_dict()})
+        data = serialize_query_result_to_json(query_result)
         headers = {"Content-Type": "application/json"}
         return make_response(data, 200, headers)
 
@@ -125,7 +125,14 @@ class UserListResource(BaseResource):
 
         users = self.get_users(disabled, pending, search_term)
 
-        return paginate(users, page, page_size, serialize_user)
+        return paginate(
+            users,
+            page,
+            page_size,
+            serialize_user,
+            cursor=request.args.get("cursor"),
+            estimate_count=bool(search_term),
+        )
 
     @require_admin
     def post(self):
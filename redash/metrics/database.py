@@ -8,6 +8,7 @@ from sqlalchemy.orm.util import _ORMJoin
 from sqlalchemy.sql.selectable import Alias, Join
 
 from redash import statsd_client
+from redash.metrics import profiling, prometheus
 
 metrics_logger = logging.getLogger("metrics")
 
@@ -32,6 +33,7 @@ def before_execute(conn, elt, multiparams, params):
 @listens_for(Engine, "after_execute")
 def after_execute(conn, elt, multiparams, params, result):
     duration = 1000 * (time.time() - conn.info["query_start_time"].pop(-1))
+    profiling.record_statement(conn, elt, duration)
     action = elt.__class__.__name__
 
     if action == "Select":
@@ -49,6 +51,7 @@ def after_execute(conn, elt, multiparams, params, result):
     action = action.lower()
 
     statsd_client.timing("db.{}.{}".format(name, action), duration)
+    prometheus.record_db_query(name, action, duration / 1000)
     metrics_logger.debug("table=%s query=%s duration=%.2f", name, action, duration)
 
     if has_request_context():
@@ -0,0 +1,172 @@
+"""
+Profiling of requests, for finding out where the time of slow requests goes in production.
+
+When REQUEST_PROFILING_ENABLED is set, the requests of super admins that send the X-Redash-Profile header and a
+REQUEST_PROFILING_SAMPLE_RATE fraction of all requests are profiled: their CPU profile (with cProfile) and the
+statements they executed in Redash's own database are kept in Redis as a report, which super admins can download from
+/api/admin/profiles. The profile is also available in pstats' format, for tools like snakeviz.
+"""
+
+import base64
+import cProfile
+import io
+import marshal
+import pstats
+import random
+import time
+import uuid
+from collections import namedtuple
+
+from flask import g, has_request_context, request
+from flask_login import current_user
+
+from redash import redis_connection, settings
+from redash.utils import json_dumps, json_loads
+
+PROFILE_HEADER = "X-Redash-Profile"
+PROFILES_KEY = "redash:profiles"
+# How many of the (most expensive) functions the reports' profile lists.
+PROFILE_FUNCTIONS_COUNT = 50
+PROFILE_STATEMENTS_LIMIT = 1000
+
+
+def _report_key(profile_id):
+    return "redash:profile:{}".format(profile_id)
+
+
+def _pstats_key(profile_id):
+    return "redash:profile:{}:pstats".format(profile_id)
+
+
+def should_profile():
+    if not settings.REQUEST_PROFILING_ENABLED:
+        return False
+
+    if random.random() < settings.REQUEST_PROFILING_SAMPLE_RATE:
+        return True
+
+    return (
+        PROFILE_HEADER in request.headers
+        and current_user.is_authenticated
+        and current_user.has_permission("super_admin")
+    )
+
+
+def start_profiling():
+    if not should_profile():
+        return
+
+    profiler = cProfile.Profile()
+    g.request_profile = {"profiler": profiler, "started_at": time.time(), "statements": []}
+    profiler.enable()
+
+
+def record_statement(conn, statement, duration):
+    """Record a statement executed in Redash's database, if the current request is profiled."""
+    if not has_request_context() or "request_profile" not in g:
+        return
+
+    statements = g.request_profile["statements"]
+    if len(statements) < PROFILE_STATEMENTS_LIMIT:
+        if hasattr(statement, "compile"):
+            statement = statement.compile(dialect=conn.dialect)
+        statements.append({"statement": str(statement), "duration": duration})
+
+
+def stop_profiling(response):
+    profile = g.pop("request_profile", None)
+    if profile is None:
+        return response
+
+    profiler = profile["profiler"]
+    profiler.disable()
+    profiler.create_stats()
+
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(PROFILE_FUNCTIONS_COUNT)
+
+    statements = profile["statements"]
+    report = {
+        "id": uuid.uuid4().hex,
+        "started_at": profile["started_at"],
+        "duration": (time.time() - profile["started_at"]) * 1000,
+        "method": request.method,
+        "path": _request_path(),
+        "endpoint": request.endpoint,
+        "status": response.status_code,
+        "user_id": current_user.get_id(),
+        "statements_count": len(statements),
+        "statements_duration": sum(statement["duration"] for statement in statements),
+        "statements": statements,
+        "profile": output.getvalue(),
+    }
+    store_report(report, marshal.dumps(profiler.stats))
+
+    return response
+
+
+def _request_path():
+    """The request's path, with the names of its query arguments but not their values (which may be API keys)."""
+    if not request.args:
+        return request.path
+    return "{}?{}".format(request.path, "&".join("{}=".format(name) for name in request.args))
+
+
+MockResponse = namedtuple("MockResponse", ["status_code"])
+
+
+def stop_profiling_on_exception(error):
+    if error is not None:
+        stop_profiling(MockResponse(500))
+
+
+def store_report(report, stats):
+    profile_id = report["id"]
+    ttl = settings.REQUEST_PROFILES_TTL
+
+    pipeline = redis_connection.pipeline()
+    pipeline.set(_report_key(profile_id), json_dumps(report), ex=ttl)
+    pipeline.set(_pstats_key(profile_id), base64.b64encode(stats).decode("ascii"), ex=ttl)
+    pipeline.zadd(PROFILES_KEY, {profile_id: report["started_at"]})
+    pipeline.zremrangebyscore(PROFILES_KEY, 0, time.time() - ttl)
+    pipeline.zrange(PROFILES_KEY, 0, -settings.REQUEST_PROFILES_LIMIT - 1)
+    pipeline.zremrangebyrank(PROFILES_KEY, 0, -settings.REQUEST_PROFILES_LIMIT - 1)
+    dropped = pipeline.execute()[4]
+
+    if dropped:
+        redis_connection.delete(
+            *[key for dropped_id in dropped for key in (_report_key(dropped_id), _pstats_key(dropped_id))]
+        )
+
+
+def list_reports():
+    """Return the kept reports, latest first, without their statements and profile."""
+    profile_ids = redis_connection.zrevrange(PROFILES_KEY, 0, -1)
+    if not profile_ids:
+        return []
+
+    reports = [
+        json_loads(report)
+        for report in redis_connection.mget([_report_key(profile_id) for profile_id in profile_ids])
+        if report
+    ]
+    for report in reports:
+        del report["statements"], report["profile"]
+    return reports
+
+
+def get_report(profile_id):
+    report = redis_connection.get(_report_key(profile_id))
+    return json_loads(report) if report else None
+
+
+def get_pstats(profile_id):
+    """Return the profile of a report in pstats' (marshaled) format, or None if it's gone."""
+    stats = redis_connection.get(_pstats_key(profile_id))
+    return base64.b64decode(stats) if stats else None
+
+
+def init_app(app):
+    app.before_request(start_profiling)
+    app.after_request(stop_profiling)
+    app.teardown_request(stop_profiling_on_exception)
@@ -0,0 +1,158 @@
+"""
+Prometheus metrics, recorded when prometheus_client is installed and PROMETHEUS_METRICS_ENABLED is set.
+
+/metrics serves them to requests with the PROMETHEUS_METRICS_TOKEN bearer token, and the RQ workers serve theirs on
+PROMETHEUS_WORKER_PORT.
+
+The labels of the metrics are bounded: endpoints, tables, queues and data source types, never queries or users.
+
+When PROMETHEUS_MULTIPROC_DIR is set, the metrics are kept in files in that directory, so that the ones of all the
+processes sharing it are served together. RQ's work horses (forked for every job) keep theirs in the same files as the
+previous work horses of their worker, instead of adding files for every job.
+"""
+
+import hmac
+import logging
+import os
+
+from redash import settings
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess, values
+except ImportError:
+    prometheus_client = None
+
+logger = logging.getLogger(__name__)
+
+# The pid of the worker whose work horse this process is.
+_work_horse_of = None
+
+
+def _process_identifier():
+    if _work_horse_of is not None:
+        return "{}-horse".format(_work_horse_of)
+    return os.getpid()
+
+
+def mark_work_horse(worker_pid):
+    global _work_horse_of
+    _work_horse_of = worker_pid
+
+
+def enabled():
+    return prometheus_client is not None and settings.PROMETHEUS_METRICS_ENABLED
+
+
+def served():
+    """Whether /metrics serves the metrics (only to requests with PROMETHEUS_METRICS_TOKEN, see `is_authorized`)."""
+    return enabled() and bool(settings.PROMETHEUS_METRICS_TOKEN)
+
+
+def is_authorized(request):
+    expected = "Bearer {}".format(settings.PROMETHEUS_METRICS_TOKEN).encode()
+    return hmac.compare_digest(request.headers.get("Authorization", "").encode(), expected)
+
+
+if prometheus_client is not None:
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        values.ValueClass = values.MultiProcessValue(_process_identifier)
+
+    request_duration = prometheus_client.Histogram(
+        "redash_request_duration_seconds",
+        "Duration of HTTP requests.",
+        ["endpoint", "method"],
+    )
+    db_query_duration = prometheus_client.Histogram(
+        "redash_db_query_duration_seconds",
+        "Duration of queries of Redash's own database.",
+        ["table", "action"],
+        buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+    )
+    queue_wait = prometheus_client.Histogram(
+        "redash_queue_wait_seconds",
+        "Time jobs wait in their queue before they're started.",
+        ["queue"],
+        buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0),
+    )
+    query_runtime = prometheus_client.Histogram(
+        "redash_query_runtime_seconds",
+        "Runtime of queries of data sources.",
+        ["data_source_type"],
+        buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0),
+    )
+    query_result_size = prometheus_client.Histogram(
+        "redash_query_result_size_bytes",
+        "Size of the results of queries of data sources (in memory).",
+        ["data_source_type"],
+        buckets=[1024 * 4**i for i in range(11)],
+    )
+    query_phase_duration = prometheus_client.Histogram(
+        "redash_query_phase_duration_seconds",
+        "Duration of the phases of executing queries of data sources (see QueryExecutor).",
+        ["data_source_type", "phase"],
+        buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 600.0, 1800.0),
+    )
+    query_result_cache = prometheus_client.Counter(
+        "redash_query_result_cache_lookups",
+        "Lookups of cached query results, by whether they found one.",
+        ["data_source_type", "result"],
+    )
+
+
+def record_request(endpoint, method, duration):
+    if enabled():
+        request_duration.labels(endpoint, method).observe(duration)
+
+
+def record_db_query(table, action, duration):
+    if enabled():
+        db_query_duration.labels(table, action).observe(duration)
+
+
+def record_queue_wait(queue, duration):
+    if enabled():
+        queue_wait.labels(queue).observe(duration)
+
+
+def record_query_execution(data_source_type, runtime, result_size=None):
+    if enabled():
+        query_runtime.labels(data_source_type).observe(runtime)
+        if result_size is not None:
+            query_result_size.labels(data_source_type).observe(result_size)
+
+
+def record_query_phases(data_source_type, timings):
+    if enabled():
+        for name, duration in timings.items():
+            query_phase_duration.labels(data_source_type, name).observe(duration)
+
+
+def record_cache_lookup(data_source_type, hit):
+    if enabled():
+        query_result_cache.labels(data_source_type, "hit" if hit else "miss").inc()
+
+
+def registry():
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return prometheus_client.REGISTRY
+
+
+def latest():
+    """Return the current metrics in Prometheus' text format, and its content type."""
+    return prometheus_client.generate_latest(registry()), prometheus_client.CONTENT_TYPE_LATEST
+
+
+def start_worker_exporter(port):
+    """Serve the metrics over HTTP on `port` from a thread of the (RQ worker) process."""
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        logger.warning("PROMETHEUS_MULTIPROC_DIR isn't set, so the metrics of the work horses won't be served.")
+
+    try:
+        prometheus_client.start_http_server(port, registry=registry())
+    except OSError:
+        # Workers sharing PROMETHEUS_MULTIPROC_DIR serve the same metrics, so one of them serving them is enough.
+        logger.warning("Port %d is in use, so this worker won't serve its metrics.", port)
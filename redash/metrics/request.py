@@ -5,6 +5,7 @@ from collections import namedtuple
 from flask import g, request
 
 from redash import statsd_client
+from redash.metrics import prometheus
 
 metrics_logger = logging.getLogger("metrics")
 
@@ -36,6 +37,7 @@ def calculate_metrics(response):
     )
 
     statsd_client.timing("requests.{}.{}".format(endpoint, request.method.lower()), request_duration)
+    prometheus.record_request(endpoint, request.method, request_duration / 1000)
 
     return response
 
@@ -1,21 +1,42 @@
 import calendar
 import datetime
+import itertools
 import logging
+import math
 import numbers
 import re
 import time
 
+import dateutil.parser
 import pytz
-from sqlalchemy import UniqueConstraint, and_, cast, distinct, func, or_
+from sqlalchemy import (
+    DDL,
+    UniqueConstraint,
+    and_,
+    cast,
+    distinct,
+    exists,
+    func,
+    inspect,
+    or_,
+    select,
+    text,
+    type_coerce,
+)
 from sqlalchemy.dialects.postgresql import ARRAY, DOUBLE_PRECISION, JSONB
-from sqlalchemy.event import listens_for
+from sqlalchemy.event import listen, listens_for
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import (
+    Session,
     backref,
+    column_property,
     contains_eager,
+    defer,
     joinedload,
     load_only,
+    object_session,
     subqueryload,
+    undefer,
 )
 from sqlalchemy.orm.exc import NoResultFound  # noqa: F401
 from sqlalchemy_utils import generic_relationship
@@ -29,6 +50,7 @@ from redash.destinations import (
     get_destination,
 )
 from redash.metrics import database  # noqa: F401
+from redash.models import principals, tags
 from redash.models.base import (
     Column,
     GFKBase,
@@ -80,7 +102,10 @@ from redash.utils import (
     mustache_render_escape,
     sentry,
 )
+from redash.utils.column_stats import compute_column_stats
 from redash.utils.configuration import ConfigurationContainer
+from redash.utils.request_cache import request_cache
+from redash.utils.timing import phase
 
 logger = logging.getLogger(__name__)
 
@@ -258,16 +283,19 @@ class DataSource(BelongsToOrgMixin, db.Model):
     def add_group(self, group, view_only=False):
         dsg = DataSourceGroup(group=group, data_source=self, view_only=view_only)
         db.session.add(dsg)
+        request_cache("data_source_groups").pop(self.id, None)
         return dsg
 
     def remove_group(self, group):
         DataSourceGroup.query.filter(DataSourceGroup.group == group, DataSourceGroup.data_source == self).delete()
         db.session.commit()
+        request_cache("data_source_groups").pop(self.id, None)
 
     def update_group_permission(self, group, view_only):
         dsg = DataSourceGroup.query.filter(DataSourceGroup.group == group, DataSourceGroup.data_source == self).one()
         dsg.view_only = view_only
         db.session.add(dsg)
+        request_cache("data_source_groups").pop(self.id, None)
         return dsg
 
     @property
@@ -290,8 +318,24 @@ class DataSource(BelongsToOrgMixin, db.Model):
     # XXX examine call sites to see if a regular SQLA collection would work better
     @property
     def groups(self):
-        groups = DataSourceGroup.query.filter(DataSourceGroup.data_source == self)
-        return dict([(group.group_id, group.view_only) for group in groups])
+        cache = request_cache("data_source_groups")
+        if self.id not in cache:
+            groups = DataSourceGroup.query.filter(DataSourceGroup.data_source == self)
+            cache[self.id] = dict([(group.group_id, group.view_only) for group in groups])
+        return dict(cache[self.id])
+
+    @classmethod
+    def prefetch_groups(cls, data_source_ids):
+        """Load the groups of several data sources with one query, for the `groups` of the rest of the request."""
+        cache = request_cache("data_source_groups")
+        missing = set(data_source_ids) - set(cache.keys()) - {None}
+        if not missing:
+            return
+
+        groups = {data_source_id: {} for data_source_id in missing}
+        for dsg in DataSourceGroup.query.filter(DataSourceGroup.data_source_id.in_(missing)):
+            groups[dsg.data_source_id][dsg.group_id] = dsg.view_only
+        cache.update(groups)
 
 
 @generic_repr("id", "data_source_id", "group_id", "view_only")
@@ -307,6 +351,11 @@ class DataSourceGroup(db.Model):
     __tablename__ = "data_source_groups"
     __table_args__ = ({"extend_existing": True},)
 
+    @classmethod
+    def data_source_ids(cls, group_ids):
+        """Return an array (SQL expression) of the ids of the data sources that the groups have access to."""
+        return func.array(select([cls.data_source_id]).where(cls.group_id.in_(group_ids)).as_scalar())
+
 
 @generic_repr("id", "org_id", "data_source_id", "query_hash", "runtime", "retrieved_at")
 class QueryResult(db.Model, BelongsToOrgMixin):
@@ -318,6 +367,10 @@ class QueryResult(db.Model, BelongsToOrgMixin):
     query_hash = Column(db.String(32), index=True)
     query_text = Column("query", db.Text)
     data = Column(JSONText, nullable=True)
+    # The stored JSON text of `data`, for passing it on without decoding it.
+    serialized_data = column_property(type_coerce(data, db.Text), deferred=True)
+    # Per-column statistics of `data` (see `redash.utils.column_stats`), readable without decoding the rows.
+    column_stats = Column(JSONB, nullable=True)
     runtime = Column(DOUBLE_PRECISION)
     retrieved_at = Column(db.DateTime(True))
 
@@ -326,17 +379,32 @@ class QueryResult(db.Model, BelongsToOrgMixin):
     def __str__(self):
         return "%d | %s | %s" % (self.id, self.query_hash, self.retrieved_at)
 
-    def to_dict(self):
-        return {
+    def to_dict(self, with_data=True):
+        d = {
             "id": self.id,
             "query_hash": self.query_hash,
             "query": self.query_text,
-            "data": self.data,
             "data_source_id": self.data_source_id,
             "runtime": self.runtime,
             "retrieved_at": self.retrieved_at,
+            "column_stats": self.column_stats,
         }
 
+        if with_data:
+            d["data"] = self.data
+
+        return d
+
+    @classmethod
+    def get_by_id_and_org(cls, object_id, org, load_data=True, load_serialized_data=False):
+        """Load a query result. `data` and `serialized_data` that aren't loaded here are loaded on first access."""
+        query = cls.query.filter(cls.id == object_id, cls.org == org)
+        if not load_data:
+            query = query.options(defer(cls.data))
+        if load_serialized_data:
+            query = query.options(undefer(cls.serialized_data))
+        return query.one()
+
     @classmethod
     def unused(cls, days=7):
         age_threshold = datetime.datetime.now() - datetime.timedelta(days=days)
@@ -344,6 +412,70 @@ class QueryResult(db.Model, BelongsToOrgMixin):
             load_only("id")
         )
 
+    @classmethod
+    def delete_unused(cls, days=7, after_id=0, limit=100):
+        """Delete up to `limit` of the unused query results (see `unused`) with ids above `after_id`, in the order of
+        their ids. Returns the ids of the deleted results."""
+        age_threshold = datetime.datetime.now() - datetime.timedelta(days=days)
+        unused = (
+            select([cls.id])
+            .where(cls.id > after_id)
+            .where(cls.retrieved_at < age_threshold)
+            .where(~exists().where(Query.latest_query_data_id == cls.id))
+            .order_by(cls.id)
+            .limit(limit)
+        )
+        deleted = db.session.execute(cls.__table__.delete().where(cls.id.in_(unused)).returning(cls.id))
+        return [row.id for row in deleted]
+
+    @classmethod
+    def drop_expired_partitions(cls, days=7):
+        """When the query results table is partitioned by range of `retrieved_at`, drop the partitions that only hold
+        results older than `days` days, unless a query still uses one of them. Returns the names of the dropped
+        partitions."""
+        partition_key = db.session.execute(
+            text("""
+                SELECT pg_get_partkeydef(pg_class.oid) FROM pg_class
+                WHERE relname = :table AND relkind = 'p' AND pg_table_is_visible(pg_class.oid)
+                """),
+            {"table": cls.__tablename__},
+        ).scalar()
+        if partition_key != "RANGE (retrieved_at)":
+            return []
+
+        partitions = db.session.execute(
+            text("""
+                SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+                FROM pg_inherits
+                JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+                JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                WHERE parent.relname = :table AND pg_table_is_visible(parent.oid)
+                """),
+            {"table": cls.__tablename__},
+        ).fetchall()
+
+        age_threshold = utils.utcnow() - datetime.timedelta(days=days)
+        dropped = []
+        for name, bound in partitions:
+            # e.g. FOR VALUES FROM ('2024-01-01 00:00:00+00') TO ('2024-02-01 00:00:00+00'), or DEFAULT.
+            upper_bound = re.search(r"TO \('([^']+)'\)", bound)
+            if upper_bound is None or dateutil.parser.parse(upper_bound.group(1)) > age_threshold:
+                continue
+
+            used = db.session.execute(
+                'SELECT EXISTS (SELECT 1 FROM queries JOIN "{}" AS results ON results.id = queries.latest_query_data_id)'.format(
+                    name
+                )
+            ).scalar()
+            if used:
+                continue
+
+            db.session.execute('ALTER TABLE {} DETACH PARTITION "{}"'.format(cls.__tablename__, name))
+            db.session.execute('DROP TABLE "{}"'.format(name))
+            dropped.append(name)
+
+        return dropped
+
     @classmethod
     def get_latest(cls, data_source, query, max_age=0):
         query_hash = gen_query_hash(query)
@@ -367,6 +499,8 @@ class QueryResult(db.Model, BelongsToOrgMixin):
 
     @classmethod
     def store_result(cls, org, data_source, query_hash, query, data, run_time, retrieved_at):
+        with phase("serialize"):
+            column_stats = compute_column_stats(data)
         query_result = cls(
             org_id=org,
             query_hash=query_hash,
@@ -375,6 +509,7 @@ class QueryResult(db.Model, BelongsToOrgMixin):
             data_source=data_source,
             retrieved_at=retrieved_at,
             data=data,
+            column_stats=column_stats,
         )
 
         db.session.add(query_result)
@@ -427,6 +562,27 @@ def should_schedule_next(previous_iteration, now, interval, time=None, day_of_we
     return now > next_iteration
 
 
+def parse_search_term(term, keys):
+    """Split a search term into (key, value) tokens, where key is one of `keys` or None. Term examples:
+    - word
+    - name:word
+    - query:word
+    - "multiple words"
+    - name:"multiple words"
+    - word1 word2 word3
+    - word1 "multiple word" query:"select foo"
+
+    Tokens with other keys (like "10:30" or "http://example.com") are words.
+    """
+    tokens = []
+    for key, quoted, value in re.findall(r'(?:([^:\s]+):)?(?:"([^"]+)"|(\S+))', term):
+        value = quoted or value
+        if key and key not in keys:
+            key, value = None, "{}:{}".format(key, value)
+        tokens.append((key or None, value))
+    return tokens
+
+
 @gfk_type
 @generic_repr(
     "id",
@@ -450,7 +606,9 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
     org = db.relationship(Organization, backref="queries")
     data_source_id = Column(key_type("DataSource"), db.ForeignKey("data_sources.id"), nullable=True)
     data_source = db.relationship(DataSource, backref="queries")
-    latest_query_data_id = Column(key_type("QueryResult"), db.ForeignKey("query_results.id"), nullable=True)
+    latest_query_data_id = Column(
+        key_type("QueryResult"), db.ForeignKey("query_results.id"), nullable=True, index=True
+    )
     latest_query_data = db.relationship(QueryResult)
     name = Column(db.String(255))
     description = Column(db.String(4096), nullable=True)
@@ -556,17 +714,11 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
 
     @classmethod
     def all_tags(cls, user, include_drafts=False):
-        queries = cls.all_queries(group_ids=user.group_ids, user_id=user.id, include_drafts=include_drafts)
-
-        tag_column = func.unnest(cls.tags).label("tag")
-        usage_count = func.count(1).label("usage_count")
+        counts = tags.tag_counts.c
+        query = tag_counts_query(cls, counts.data_source_ids.overlap(DataSourceGroup.data_source_ids(user.group_ids)))
 
-        query = (
-            db.session.query(tag_column, usage_count)
-            .group_by(tag_column)
-            .filter(Query.id.in_(queries.options(load_only("id"))))
-            .order_by(tag_column)
-        )
+        if not include_drafts:
+            query = query.filter(or_(counts.is_draft.is_(False), counts.user_id == user.id))
         return query
 
     @classmethod
@@ -647,26 +799,11 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
 
     @classmethod
     def _do_multi_byte_search(cls, all_queries, term, limit=None):
-        # term examples:
-        #    - word
-        #    - name:word
-        #    - query:word
-        #    - "multiple words"
-        #    - name:"multiple words"
-        #    - word1 word2 word3
-        #    - word1 "multiple word" query:"select foo"
-        tokens = re.findall(r'(?:([^:\s]+):)?(?:"([^"]+)"|(\S+))', term)
+        # The ILIKE conditions are served by the trigram (pg_trgm) indexes of the columns, so they don't scan the
+        # table. Queries that the full text search matches as well are ranked first, the way it ranks them.
+        tokens = parse_search_term(term, ("id", "name", "query", "description"))
         conditions = []
-        for token in tokens:
-            key = None
-            if token[0]:
-                key = token[0]
-
-            if token[1]:
-                value = token[1]
-            else:
-                value = token[2]
-
+        for key, value in tokens:
             pattern = f"%{value}%"
 
             if key == "id" and value.isdigit():
@@ -680,7 +817,12 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
             else:
                 conditions.append(or_(cls.name.ilike(pattern), cls.description.ilike(pattern)))
 
-        return all_queries.filter(and_(*conditions)).order_by(Query.id).limit(limit)
+        words = " ".join(value for key, value in tokens if key != "id")
+        order = [Query.id]
+        if words:
+            order.insert(0, func.ts_rank_cd(cls.search_vector, func.tsq_parse(words)).desc())
+
+        return all_queries.filter(and_(*conditions)).order_by(*order).limit(limit)
 
     @classmethod
     def search(
@@ -716,29 +858,48 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
         return cls.by_user(user).search(term, sort=True).limit(limit)
 
     @classmethod
-    def recent(cls, group_ids, user_id=None, limit=20):
-        query = (
-            cls.query.filter(Event.created_at > (db.func.current_date() - 7))
-            .join(Event, Query.id == Event.object_id.cast(db.Integer))
-            .join(DataSourceGroup, Query.data_source_id == DataSourceGroup.data_source_id)
-            .filter(
-                Event.action.in_(["edit", "execute", "edit_name", "edit_description", "view_source"]),
-                Event.object_id is not None,
-                Event.object_type == "query",
-                DataSourceGroup.group_id.in_(group_ids),
-                or_(Query.is_draft.is_(False), Query.user_id is user_id),
-                Query.is_archived.is_(False),
-            )
-            .group_by(Event.object_id, Query.id)
-            .order_by(db.desc(db.func.count(0)))
-        )
-
-        if user_id:
-            query = query.filter(Event.user_id == user_id)
-
-        query = query.limit(limit)
+    def recent(cls, org, group_ids, user_id=None, limit=20):
+        """Return the organization's queries with the most activity (edits, executions...) in the last week, overall or
+        by a user.
+
+        The activity is counted in Redis as events are recorded (see track_recent_activity), so this only adds up the
+        days' counts in Redis and looks up the top candidate queries by id, in chunks until there are enough the groups
+        have access to.
+        """
+        today = utils.utcnow().date()
+        keys = [
+            _recent_queries_key(org.id, today - datetime.timedelta(days=days_ago), user_id)
+            for days_ago in range(RECENT_ACTIVITY_DAYS + 1)
+        ]
+        activity_key = "{}:{}".format(_recent_queries_key(org.id, today, user_id), "week")
+        with redis_connection.pipeline() as pipe:
+            pipe.zunionstore(activity_key, keys)
+            pipe.expire(activity_key, 60)
+            pipe.execute()
+
+        queries = []
+        chunk_size = max(limit * 2, 100)
+        for offset in itertools.count(0, chunk_size):
+            candidates = redis_connection.zrevrange(activity_key, offset, offset + chunk_size - 1)
+            if not candidates:
+                break
+            chunk = [int(query_id) for query_id in candidates if query_id.isdigit()]
+            found = {
+                query.id: query
+                for query in cls.query.join(
+                    DataSourceGroup, Query.data_source_id == DataSourceGroup.data_source_id
+                ).filter(
+                    Query.id.in_(chunk),
+                    DataSourceGroup.group_id.in_(group_ids),
+                    or_(Query.is_draft.is_(False), Query.user_id is user_id),
+                    Query.is_archived.is_(False),
+                )
+            }
+            queries.extend(found[query_id] for query_id in chunk if query_id in found)
+            if len(queries) >= limit:
+                break
 
-        return query
+        return queries[:limit]
 
     @classmethod
     def get_by_id(cls, _id):
@@ -854,17 +1015,32 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
 
     @property
     def dashboard_api_keys(self):
-        query = """SELECT api_keys.api_key
+        api_keys = self.prefetch_dashboard_api_keys([self.id])
+        return list(api_keys[self.id])
+
+    @classmethod
+    def prefetch_dashboard_api_keys(cls, query_ids):
+        """Load the API keys of the dashboards showing several queries with one query, for the `dashboard_api_keys` of
+        the rest of the request. Returns the API keys by query id."""
+        cache = request_cache("query_dashboard_api_keys")
+        missing = set(query_ids) - set(cache.keys())
+        if not missing:
+            return cache
+
+        query = """SELECT visualizations.query_id, api_keys.api_key
                    FROM api_keys
                    JOIN dashboards ON object_id = dashboards.id
                    JOIN widgets ON dashboards.id = widgets.dashboard_id
                    JOIN visualizations ON widgets.visualization_id = visualizations.id
                    WHERE object_type='dashboards'
                      AND active=true
-                     AND visualizations.query_id = :id"""
+                     AND visualizations.query_id IN :ids"""
 
-        api_keys = db.session.execute(query, {"id": self.id}).fetchall()
-        return [api_key[0] for api_key in api_keys]
+        api_keys = {query_id: [] for query_id in missing}
+        for query_id, api_key in db.session.execute(query, {"ids": tuple(missing)}):
+            api_keys[query_id].append(api_key)
+        cache.update(api_keys)
+        return cache
 
     def update_query_hash(self):
         should_apply_auto_limit = self.options.get("apply_auto_limit", False) if self.options else False
@@ -896,6 +1072,36 @@ def query_last_modified_by(target, val, oldval, initiator):
     target.last_modified_by_id = val
 
 
+@listens_for(Query, "after_update")
+def invalidate_query_api_key_principal(mapper, connection, target):
+    # Query API keys are cached with the groups of the query's data source.
+    state = inspect(target)
+    if state.attrs.data_source_id.history.has_changes():
+        api_keys = [target.api_key]
+    else:
+        api_keys = state.attrs.api_key.history.deleted or []
+
+    for api_key in api_keys:
+        if api_key:
+            principals.invalidate(target, "api_key", principals.api_key_id(target.org_id, api_key))
+
+
+@listens_for(Query, "after_delete")
+def invalidate_deleted_query_api_key_principal(mapper, connection, target):
+    principals.invalidate(target, "api_key", principals.api_key_id(target.org_id, target.api_key))
+
+
+def tag_counts_query(model, *criteria):
+    """Return the (tag, usage count) of the tags of `model`'s objects that match the criteria on tags.tag_counts."""
+    counts = tags.tag_counts.c
+    return (
+        db.session.query(counts.tag, cast(func.sum(counts.count), db.Integer).label("usage_count"))
+        .filter(counts.object_type == model.__name__, *criteria)
+        .group_by(counts.tag)
+        .order_by(counts.tag)
+    )
+
+
 @generic_repr("id", "object_type", "object_id", "user_id", "org_id")
 class Favorite(TimestampMixin, db.Model):
     id = primary_key("Favorite")
@@ -946,6 +1152,42 @@ OPERATORS = {
 }
 
 
+def _as_stored(value):
+    """Return a query result value the way it reads back once the result is stored (JSON encoded)."""
+    if value is None or isinstance(value, (str, int)):
+        return value
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    return json_loads(json_dumps(value))
+
+
+def _select_values(data, selections):
+    """Return the values of the given (column, selector) pairs in the rows of a query result's data.
+
+    The value is None when it can't be determined: no rows, the column is missing from the first row, or (for the max
+    and min selectors) some value isn't a number.
+    """
+    rows = data["rows"] if data else None
+    values = {}
+    extremes = {}
+
+    for column, selector in selections:
+        if not rows or column not in rows[0]:
+            values[(column, selector)] = None
+        elif selector not in ("max", "min"):
+            values[(column, selector)] = _as_stored(rows[0][column])
+        else:
+            if column not in extremes:
+                try:
+                    column_values = [float(_as_stored(row[column])) for row in rows]
+                    extremes[column] = {"min": min(column_values), "max": max(column_values)}
+                except (KeyError, TypeError, ValueError):
+                    extremes[column] = None
+            values[(column, selector)] = extremes[column] and extremes[column][selector]
+
+    return values
+
+
 def next_state(op, value, threshold):
     if isinstance(value, bool):
         # If it's a boolean cast to string and lower case, because upper cased
@@ -1012,41 +1254,62 @@ class Alert(TimestampMixin, BelongsToOrgMixin, db.Model):
     def get_by_id_and_org(cls, object_id, org):
         return super(Alert, cls).get_by_id_and_org(object_id, org, Query)
 
+    def _value_from_column_stats(self, query_result, selector):
+        # Only numeric columns without nulls give the same value as scanning the rows (which fails on nulls).
+        stats = (query_result.column_stats or {}).get(self.options.get("column"))
+        if stats and "sum" in stats and stats["null_count"] == 0:
+            return stats[selector]
+        return None
+
     def evaluate(self):
-        data = self.query_rel.latest_query_data.data if self.query_rel.latest_query_data else None
-        new_state = self.UNKNOWN_STATE
+        query_result_id = self.query_rel.latest_query_data_id
+        if query_result_id is None:
+            return self.UNKNOWN_STATE
 
-        if data and data["rows"] and self.options["column"] in data["rows"][0]:
-            op = OPERATORS.get(self.options["op"], lambda v, t: False)
+        # The rows are only loaded (and decoded) if the value can't be read from the column statistics.
+        query_result = QueryResult.query.options(defer(QueryResult.data)).get(query_result_id)
+        return self.evaluate_batch([self], query_result)[self.id]
 
-            if "selector" not in self.options:
-                selector = "first"
+    @classmethod
+    def evaluate_batch(cls, alerts, query_result):
+        """Evaluate alerts against the same query result and return their new states by alert id.
+
+        Values of the max/min selectors are read from the column statistics where possible. The result's data is
+        accessed (and so decoded, if it's loaded from the database) at most once, and each column is scanned once
+        however many alerts use it. The data may also be the one a query runner just returned.
+        """
+        states = {}
+        selections = {}
+
+        for alert in alerts:
+            if query_result is None:
+                states[alert.id] = cls.UNKNOWN_STATE
+                continue
+
+            selector = alert.options.get("selector", "first")
+            value = None
+            if selector in ("max", "min"):
+                value = alert._value_from_column_stats(query_result, selector)
+
+            if value is None:
+                selections[alert] = (alert.options.get("column"), selector)
             else:
-                selector = self.options["selector"]
-
-            try:
-                if selector == "max":
-                    max_val = float("-inf")
-                    for i in range(len(data["rows"])):
-                        max_val = max(max_val, float(data["rows"][i][self.options["column"]]))
-                    value = max_val
-                elif selector == "min":
-                    min_val = float("inf")
-                    for i in range(len(data["rows"])):
-                        min_val = min(min_val, float(data["rows"][i][self.options["column"]]))
-                    value = min_val
+                states[alert.id] = next_state(alert.operator, value, alert.options["value"])
+
+        if selections:
+            values = _select_values(query_result.data, set(selections.values()))
+            for alert, selection in selections.items():
+                value = values[selection]
+                if value is None:
+                    states[alert.id] = cls.UNKNOWN_STATE
                 else:
-                    value = data["rows"][0][self.options["column"]]
-
-            except ValueError:
-                return self.UNKNOWN_STATE
-
-            threshold = self.options["value"]
+                    states[alert.id] = next_state(alert.operator, value, alert.options["value"])
 
-            if value is not None:
-                new_state = next_state(op, value, threshold)
+        return states
 
-        return new_state
+    @property
+    def operator(self):
+        return OPERATORS.get(self.options["op"], lambda v, t: False)
 
     def subscribers(self):
         return User.query.join(AlertSubscription).filter(AlertSubscription.alert == self)
@@ -1161,29 +1424,31 @@ class Dashboard(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model
 
         return query
 
+    @classmethod
+    def _name_matches(cls, term):
+        # Every word has to be in the name. The ILIKE conditions are served by the trigram (pg_trgm) index of names.
+        return and_(*[cls.name.ilike("%{}%".format(value)) for _, value in parse_search_term(term, ("name",))])
+
     @classmethod
     def search(cls, org, groups_ids, user_id, search_term):
-        # TODO: switch to FTS
-        return cls.all(org, groups_ids, user_id).filter(cls.name.ilike("%{}%".format(search_term)))
+        return cls.all(org, groups_ids, user_id).filter(cls._name_matches(search_term))
 
     @classmethod
     def search_by_user(cls, term, user, limit=None):
-        return cls.by_user(user).filter(cls.name.ilike("%{}%".format(term))).limit(limit)
+        return cls.by_user(user).filter(cls._name_matches(term)).limit(limit)
 
     @classmethod
     def all_tags(cls, org, user):
-        dashboards = cls.all(org, user.group_ids, user.id)
-
-        tag_column = func.unnest(cls.tags).label("tag")
-        usage_count = func.count(1).label("usage_count")
-
-        query = (
-            db.session.query(tag_column, usage_count)
-            .group_by(tag_column)
-            .filter(Dashboard.id.in_(dashboards.options(load_only("id"))))
-            .order_by(tag_column)
+        counts = tags.tag_counts.c
+        return tag_counts_query(
+            cls,
+            counts.org_id == org.id,
+            or_(
+                counts.data_source_ids.overlap(DataSourceGroup.data_source_ids(user.group_ids)),
+                counts.user_id == user.id,
+            ),
+            or_(counts.user_id == user.id, counts.is_draft.is_(False)),
         )
-        return query
 
     @classmethod
     def favorites(cls, user, base_query=None):
@@ -1295,9 +1560,69 @@ class Widget(TimestampMixin, BelongsToOrgMixin, db.Model):
         }
 
 
+RECENT_QUERY_ACTIONS = ("edit", "execute", "edit_name", "edit_description", "view_source")
+RECENT_ACTIVITY_DAYS = 7
+RECENT_ACTIVITY_SESSION_KEY = "recent_query_activity"
+
+
+def _recent_queries_key(org_id, day, user_id=None):
+    key = "recent_queries:{}:{}".format(org_id, day.isoformat())
+    if user_id is None:
+        return key
+    return "{}:{}".format(key, user_id)
+
+
+def track_recent_activity(session, events):
+    """Count the events of activity on queries in Redis sorted sets per organization and day (overall and per user),
+    which Query.recent adds up instead of aggregating the events table.
+
+    The events are counted once `session` commits them, so that events that are rolled back (and maybe recorded again)
+    aren't counted.
+    """
+    today = utils.utcnow().date()
+    increments = session.info.setdefault(RECENT_ACTIVITY_SESSION_KEY, [])
+
+    for event in events:
+        if event.object_type != "query" or event.action not in RECENT_QUERY_ACTIONS or not event.object_id:
+            continue
+        if not event.org_id:
+            continue
+
+        created_at = event.created_at if isinstance(event.created_at, datetime.datetime) else utils.utcnow()
+        expires_at = created_at.date() + datetime.timedelta(days=RECENT_ACTIVITY_DAYS + 1)
+        if expires_at <= today:
+            continue
+
+        keys = [_recent_queries_key(event.org_id, created_at.date())]
+        if event.user_id:
+            keys.append(_recent_queries_key(event.org_id, created_at.date(), event.user_id))
+        for key in keys:
+            increments.append((key, str(event.object_id), calendar.timegm(expires_at.timetuple())))
+
+
+@listens_for(Session, "after_commit")
+def count_committed_activity(session):
+    increments = session.info.pop(RECENT_ACTIVITY_SESSION_KEY, None)
+    if not increments:
+        return
+
+    with redis_connection.pipeline(transaction=False) as pipe:
+        for key, query_id, expires_at in increments:
+            pipe.zincrby(key, 1, query_id)
+            pipe.expireat(key, expires_at)
+        pipe.execute()
+
+
+@listens_for(Session, "after_soft_rollback")
+def forget_rolled_back_activity(session, previous_transaction):
+    session.info.pop(RECENT_ACTIVITY_SESSION_KEY, None)
+
+
 @generic_repr("id", "object_type", "object_id", "action", "user_id", "org_id", "created_at")
 class Event(db.Model):
-    id = primary_key("Event")
+    # The table is partitioned by month of created_at (which so has to be part of the primary key). Events that don't
+    # fall in any of the monthly partitions (see create_partition) are stored in the default partition.
+    id = Column(key_type("Event"), primary_key=True, autoincrement=True)
     org_id = Column(key_type("Organization"), db.ForeignKey("organizations.id"))
     org = db.relationship(Organization, back_populates="events")
     user_id = Column(key_type("User"), db.ForeignKey("users.id"), nullable=True)
@@ -1306,9 +1631,16 @@ class Event(db.Model):
     object_type = Column(db.String(255))
     object_id = Column(db.String(255), nullable=True)
     additional_properties = Column(MutableDict.as_mutable(JSONB), nullable=True, default={})
-    created_at = Column(db.DateTime(True), default=db.func.now())
+    created_at = Column(db.DateTime(True), default=db.func.now(), primary_key=True)
 
     __tablename__ = "events"
+    __table_args__ = (
+        db.Index("ix_events_org_id_created_at", "org_id", "created_at"),
+        db.Index("ix_events_object_type_created_at", "object_type", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    DEFAULT_PARTITION = "events_default"
 
     def __str__(self):
         return "%s,%s,%s,%s" % (
@@ -1329,8 +1661,8 @@ class Event(db.Model):
             "created_at": self.created_at.isoformat(),
         }
 
-    @classmethod
-    def record(cls, event):
+    @staticmethod
+    def _columns(event):
         org_id = event.pop("org_id")
         user_id = event.pop("user_id", None)
         action = event.pop("action")
@@ -1339,7 +1671,7 @@ class Event(db.Model):
 
         created_at = datetime.datetime.utcfromtimestamp(event.pop("timestamp"))
 
-        event = cls(
+        return dict(
             org_id=org_id,
             user_id=user_id,
             action=action,
@@ -1348,9 +1680,107 @@ class Event(db.Model):
             additional_properties=event,
             created_at=created_at,
         )
+
+    @classmethod
+    def record(cls, event):
+        event = cls(**cls._columns(event))
         db.session.add(event)
         return event
 
+    @staticmethod
+    def partition_name(month):
+        return "events_y{:04d}m{:02d}".format(month.year, month.month)
+
+    @staticmethod
+    def range_partitions():
+        """Return the (name, start, end) of the range partitions of the events table. Unbounded (MINVALUE or
+        MAXVALUE) ends are None."""
+        partitions = db.session.execute("""SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+               FROM pg_inherits i
+               JOIN pg_class c ON c.oid = i.inhrelid
+               WHERE i.inhparent = 'events'::regclass""").fetchall()
+
+        def parse_bound(value):
+            return None if value in ("MINVALUE", "MAXVALUE") else dateutil.parser.parse(value.strip("'"))
+
+        ranges = []
+        for name, bound in partitions:
+            match = re.search(r"FROM \((.+)\) TO \((.+)\)", bound)
+            if match:
+                ranges.append((name, parse_bound(match.group(1)), parse_bound(match.group(2))))
+        return ranges
+
+    @classmethod
+    def create_partition(cls, month):
+        """Create the partition of the events of the given month, unless it exists or another partition (like the
+        one of the events from before partitioning) covers part of the month. Returns whether it was created.
+
+        Events of the month already stored in the default partition are moved to the new partition.
+        """
+        name = cls.partition_name(month)
+        if db.session.execute("SELECT to_regclass(:name)", {"name": name}).scalar():
+            return False
+
+        start = datetime.datetime(month.year, month.month, 1, tzinfo=pytz.utc)
+        end = datetime.datetime(month.year + month.month // 12, month.month % 12 + 1, 1, tzinfo=pytz.utc)
+        params = {"start": start, "end": end}
+
+        for _, partition_start, partition_end in cls.range_partitions():
+            if (partition_start is None or partition_start < end) and (partition_end is None or partition_end > start):
+                return False
+
+        db.session.execute(f"CREATE TABLE {name} (LIKE events INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        db.session.execute(
+            f"""WITH moved AS (
+                    DELETE FROM {cls.DEFAULT_PARTITION} WHERE created_at >= :start AND created_at < :end RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved""",
+            params,
+        )
+        db.session.execute(
+            f"ALTER TABLE events ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+        return True
+
+    @classmethod
+    def drop_partitions_before(cls, cutoff):
+        """Drop the partitions holding only events created before cutoff, and delete such events from the default
+        partition. Returns the names of the dropped partitions."""
+        dropped = []
+        for name, _, end in cls.range_partitions():
+            if end is not None and end <= cutoff:
+                db.session.execute(f"DROP TABLE {name}")
+                dropped.append(name)
+
+        db.session.execute(f"DELETE FROM {cls.DEFAULT_PARTITION} WHERE created_at < :cutoff", {"cutoff": cutoff})
+        return dropped
+
+    @classmethod
+    def record_many(cls, events):
+        """Insert events with a single multi-row INSERT.
+
+        Returns (transient) Event objects for the recorded events, which can be serialized but aren't in the session.
+        """
+        rows = [cls._columns(event) for event in events]
+        if rows:
+            db.session.execute(cls.__table__.insert().values(rows))
+        events = [cls(**row) for row in rows]
+        track_recent_activity(db.session, events)
+        return events
+
+
+@listens_for(Event, "after_insert")
+def track_inserted_event(mapper, connection, target):
+    track_recent_activity(object_session(target), [target])
+
+
+listen(
+    Event.__table__,
+    "after_create",
+    DDL(f"CREATE TABLE {Event.DEFAULT_PARTITION} PARTITION OF events DEFAULT"),
+)
+
 
 @generic_repr("id", "created_by_id", "org_id", "active")
 class ApiKey(TimestampMixin, GFKBase, db.Model):
@@ -1386,6 +1816,70 @@ class ApiKey(TimestampMixin, GFKBase, db.Model):
         return k
 
 
+@listens_for(ApiKey, "after_update")
+@listens_for(ApiKey, "after_delete")
+def invalidate_api_key_principal(mapper, connection, target):
+    principals.invalidate(target, "api_key", principals.api_key_id(target.org_id, target.api_key))
+
+
+@listens_for(DataSourceGroup, "after_insert")
+@listens_for(DataSourceGroup, "after_update")
+@listens_for(DataSourceGroup, "after_delete")
+def invalidate_data_source_group_principals(mapper, connection, target):
+    # Query API keys are cached with the groups of the query's data source.
+    principals.invalidate(target)
+
+
+@listens_for(Session, "after_bulk_update")
+@listens_for(Session, "after_bulk_delete")
+def invalidate_bulk_changed_principals(context):
+    if context.mapper.class_ in (User, Group, ApiKey, Query, DataSourceGroup):
+        principals.invalidate(context.session)
+
+
+# The attributes of the models that the tags are counted by (see tags.tag_counts).
+TAG_COUNTS_ATTRIBUTES = {
+    Query: ("tags", "is_archived", "is_draft", "data_source_id", "user_id", "org_id"),
+    Dashboard: ("tags", "is_archived", "is_draft", "user_id", "org_id"),
+    Widget: ("dashboard_id", "visualization_id"),
+    Visualization: ("query_id",),
+}
+
+
+@listens_for(Query, "after_insert")
+@listens_for(Query, "after_delete")
+@listens_for(Dashboard, "after_insert")
+@listens_for(Dashboard, "after_delete")
+def mark_tag_counts_stale(mapper, connection, target):
+    if target.tags:
+        tags.mark_stale(target)
+
+
+@listens_for(Widget, "after_insert")
+@listens_for(Widget, "after_delete")
+@listens_for(Visualization, "after_delete")
+def mark_tag_counts_stale_by_widgets(mapper, connection, target):
+    # Which data sources a dashboard uses depends on its widgets.
+    tags.mark_stale(target)
+
+
+@listens_for(Query, "after_update")
+@listens_for(Dashboard, "after_update")
+@listens_for(Widget, "after_update")
+@listens_for(Visualization, "after_update")
+def mark_updated_tag_counts_stale(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[attr].history.has_changes() for attr in TAG_COUNTS_ATTRIBUTES[mapper.class_]):
+        tags.mark_stale(target)
+
+
+@listens_for(Session, "after_bulk_update")
+@listens_for(Session, "after_bulk_delete")
+def mark_bulk_changed_tag_counts_stale(context):
+    if context.mapper.class_ in TAG_COUNTS_ATTRIBUTES:
+        tags.mark_stale(context.session)
+
+
 @generic_repr("id", "name", "type", "user_id", "org_id", "created_at")
 class NotificationDestination(BelongsToOrgMixin, db.Model):
     id = primary_key("NotificationDestination")
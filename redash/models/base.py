@@ -2,8 +2,11 @@ import functools
 
 from flask_sqlalchemy import BaseQuery, SQLAlchemy
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import object_session
 from sqlalchemy.pool import NullPool
+from sqlalchemy.sql.elements import ClauseElement
+from sqlalchemy.sql.expression import Executable
 from sqlalchemy_searchable import SearchQueryMixin, make_searchable, vectorizer
 
 from redash import settings
@@ -108,3 +111,19 @@ def key_type(name):
 def primary_key(name):
     key_type, kwargs = key_definitions[name]
     return Column(key_type, primary_key=True, **kwargs)
+
+
+class Explain(Executable, ClauseElement):
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def compile_explain(element, compiler, **kwargs):
+    return "EXPLAIN (FORMAT JSON) {}".format(compiler.process(element.statement, **kwargs))
+
+
+def estimated_count(query):
+    """Return the planner's estimate of the number of rows a query returns, without running it."""
+    plan = db.session.execute(Explain(query.statement)).scalar()
+    return plan[0]["Plan"]["Plan Rows"]
@@ -1,9 +1,61 @@
+import difflib
+
 from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.event import listens_for
 from sqlalchemy.inspection import inspect
+from sqlalchemy.orm import Session
 from sqlalchemy_utils.models import generic_repr
 
+from redash import settings
+
 from .base import Column, GFKBase, db, key_type, primary_key
 
+# The changes of columns of these types are recorded as diffs, with a full snapshot every CHANGES_SNAPSHOT_INTERVAL.
+DIFFED_TYPES = (db.Text, JSONB)
+
+
+def diff_values(previous, current):
+    """Return the diff that patch_value turns `previous` into `current` with (changed lines of text, or changed keys
+    of dictionaries), or None when they can't be diffed."""
+    if isinstance(previous, str) and isinstance(current, str):
+        a, b = previous.splitlines(keepends=True), current.splitlines(keepends=True)
+        opcodes = difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes()
+        return [[i1, i2, "".join(b[j1:j2])] for op, i1, i2, j1, j2 in opcodes if op != "equal"]
+
+    if isinstance(previous, dict) and isinstance(current, dict):
+        return {
+            "set": {key: value for key, value in current.items() if key not in previous or previous[key] != value},
+            "unset": [key for key in previous if key not in current],
+        }
+
+    return None
+
+
+def patch_value(previous, diff):
+    if isinstance(diff, dict):
+        value = {key: value for key, value in previous.items() if key not in diff["unset"]}
+        value.update(diff["set"])
+        return value
+
+    lines = previous.splitlines(keepends=True)
+    for i1, i2, text in reversed(diff):
+        lines[i1:i2] = text.splitlines(keepends=True)
+    return "".join(lines)
+
+
+def diffed_entry(previous, current, diffs):
+    """Return how the change of a diffed column from its `previous` recorded value, `diffs` diffs after its last
+    snapshot, to `current` is recorded, or None if it didn't change. `diffs` is None when there's no previous value."""
+    if diffs is not None and previous == current:
+        return None
+
+    if diffs is not None and diffs < settings.CHANGES_SNAPSHOT_INTERVAL:
+        diff = diff_values(previous, current)
+        if diff is not None:
+            return {"diff": diff}
+
+    return {"current": current}
+
 
 @generic_repr("id", "object_type", "object_id", "created_at")
 class Change(GFKBase, db.Model):
@@ -13,10 +65,13 @@ class Change(GFKBase, db.Model):
     object_version = Column(db.Integer, default=0)
     user_id = Column(key_type("User"), db.ForeignKey("users.id"))
     user = db.relationship("User", backref="changes")
+    # The changed columns, by name. A column's change is recorded as {"previous": ..., "current": ...}, or for text
+    # and JSON columns, as its {"current": ...} value (a snapshot) or {"diff": ...} from its previous recorded value.
     change = Column(JSONB)
     created_at = Column(db.DateTime(True), default=db.func.now())
 
     __tablename__ = "changes"
+    __table_args__ = (db.Index("ix_changes_object_type_object_id", "object_type", "object_id", "id"),)
 
     def to_dict(self, full=True):
         d = {
@@ -40,47 +95,119 @@ class Change(GFKBase, db.Model):
     def last_change(cls, obj):
         return (
             cls.query.filter(cls.object_id == obj.id, cls.object_type == obj.__class__.__tablename__)
-            .order_by(cls.object_version.desc())
+            .order_by(cls.object_version.desc(), cls.id.desc())
             .first()
         )
 
+    @classmethod
+    def last_value(cls, obj, column):
+        """Return the last recorded value of an object's (diffed) column and the number of diffs since its last
+        snapshot, or (None, None) when there's none."""
+        entries = (
+            db.session.query(cls.change[column])
+            .filter(
+                cls.object_id == obj.id,
+                cls.object_type == obj.__class__.__tablename__,
+                cls.change[column].isnot(None),
+            )
+            .order_by(cls.id.desc())
+            .limit(settings.CHANGES_SNAPSHOT_INTERVAL + 1)
+        )
+
+        diffs = []
+        for (entry,) in entries:
+            if "current" in entry:
+                value = entry["current"]
+                for diff in reversed(diffs):
+                    value = patch_value(value, diff)
+                return value, len(diffs)
+            diffs.append(entry["diff"])
+
+        return None, None
+
+    @classmethod
+    def compact(cls, changes, model):
+        """Rewrite the changes of an object of `model`, in the order they were recorded, to record only the columns
+        that changed, and diffs of the diffed ones. Returns the changes that were rewritten."""
+        diffed = {name for _, name, is_diffed in model.tracked_columns() if is_diffed}
+        values = {}
+        diffs = {}
+        rewritten = []
+        for change in changes:
+            compacted = {}
+            for name, entry in (change.change or {}).items():
+                current = entry["current"] if "current" in entry else patch_value(values[name], entry["diff"])
+                if name in diffed:
+                    compacted_entry = diffed_entry(values.get(name), current, diffs.get(name))
+                    if compacted_entry is not None:
+                        diffs[name] = diffs[name] + 1 if "diff" in compacted_entry else 0
+                elif name not in values:
+                    compacted_entry = {"previous": entry.get("previous"), "current": current}
+                elif values[name] != current:
+                    compacted_entry = {"previous": values[name], "current": current}
+                else:
+                    compacted_entry = None
+
+                if compacted_entry is not None:
+                    compacted[name] = compacted_entry
+                values[name] = current
+
+            if compacted != change.change:
+                change.change = compacted
+                rewritten.append(change)
+
+        return rewritten
+
 
 class ChangeTrackingMixin:
     skipped_fields = ("id", "created_at", "updated_at", "version")
-    _clean_values = None
 
     def __init__(self, *a, **kw):
         super(ChangeTrackingMixin, self).__init__(*a, **kw)
         self.record_changes(self.user)
 
-    def prep_cleanvalues(self):
-        self.__dict__["_clean_values"] = {}
-        for attr in inspect(self.__class__).column_attrs:
-            (col,) = attr.columns
-            # 'query' is col name but not attr name
-            self._clean_values[col.name] = None
-
-    def __setattr__(self, key, value):
-        if self._clean_values is None:
-            self.prep_cleanvalues()
-        for attr in inspect(self.__class__).column_attrs:
-            (col,) = attr.columns
-            previous = getattr(self, attr.key, None)
-            self._clean_values[col.name] = previous
-
-        super(ChangeTrackingMixin, self).__setattr__(key, value)
+    @classmethod
+    def tracked_columns(cls):
+        """Return the (attribute key, column name, diffed) of the columns whose changes are recorded."""
+        if "_tracked_columns" not in cls.__dict__:
+            cls._tracked_columns = [
+                (attr.key, attr.columns[0].name, isinstance(attr.columns[0].type, DIFFED_TYPES))
+                for attr in inspect(cls).column_attrs
+                if attr.key not in cls.skipped_fields
+            ]
+        return cls._tracked_columns
+
+    def collect_changes(self):
+        """Keep the previous values of the columns changed since the last flush, until the changes are recorded."""
+        state = inspect(self)
+        previous_values = self.__dict__.setdefault("_previous_values", {})
+        for key, _, _ in self.tracked_columns():
+            history = state.attrs[key].history
+            if history.has_changes() and key not in previous_values:
+                previous_values[key] = history.deleted[0] if history.deleted else None
 
     def record_changes(self, changed_by):
+        state = inspect(self)
+        created = state.transient or state.pending
+        self.collect_changes()
         db.session.add(self)
         db.session.flush()
+        previous_values = self.__dict__.pop("_previous_values", {})
+
         changes = {}
-        for attr in inspect(self.__class__).column_attrs:
-            (col,) = attr.columns
-            if attr.key not in self.skipped_fields:
-                changes[col.name] = {
-                    "previous": self._clean_values[col.name],
-                    "current": getattr(self, attr.key),
-                }
+        for key, name, diffed in self.tracked_columns():
+            current = getattr(self, key)
+            if created:
+                changes[name] = {"current": current} if diffed else {"previous": None, "current": current}
+            elif key not in previous_values:
+                continue
+            elif diffed:
+                previous, diffs = Change.last_value(self, name)
+                entry = diffed_entry(previous, current, diffs)
+                if entry is not None:
+                    changes[name] = entry
+            elif previous_values[key] != current:
+                changes[name] = {"previous": previous_values[key], "current": current}
 
         db.session.add(
             Change(
@@ -90,3 +217,11 @@ class ChangeTrackingMixin:
                 change=changes,
             )
         )
+
+
+@listens_for(Session, "before_flush")
+def collect_flushed_changes(session, flush_context, instances):
+    # Flushing resets the history of the attributes, so the previous values are kept until they're recorded.
+    for obj in session.dirty:
+        if isinstance(obj, ChangeTrackingMixin):
+            obj.collect_changes()
@@ -0,0 +1,159 @@
+"""
+A short-lived cache of the principals (users and API keys) that requests authenticate as, so that authenticating a
+request doesn't have to look them up in the database.
+
+Principals are cached in Redis for PRINCIPALS_CACHE_TTL seconds and in each process for PRINCIPALS_CACHE_LOCAL_TTL
+seconds. Changing users, groups or API keys invalidates the principals they affect, both when the change is flushed
+and once it's committed. Other processes see the change when their own copy expires.
+
+Invalidating all of the principals bumps the generation their keys are versioned with, rather than deleting them:
+the keys of former generations expire on their own.
+"""
+
+import hashlib
+import time
+from collections import defaultdict
+
+import dateutil.parser
+from sqlalchemy import DateTime, inspect
+from sqlalchemy.event import listens_for
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+
+from redash import redis_connection, settings
+from redash.utils import json_dumps, json_loads
+
+from .base import db
+
+KEY_PREFIX = "principals:"
+GENERATION_KEY = "principals_generation"
+INVALIDATED_PRINCIPALS = "invalidated_principals"
+
+_local_principals = {}
+# The generation of the principals' keys, and when this process reads it again.
+_local_generation = {"generation": 0, "expires_at": 0}
+
+
+def current_generation():
+    if _local_generation["expires_at"] <= time.time():
+        _local_generation["generation"] = int(redis_connection.get(GENERATION_KEY) or 0)
+        _local_generation["expires_at"] = time.time() + settings.PRINCIPALS_CACHE_LOCAL_TTL
+    return _local_generation["generation"]
+
+
+def principal_key(kind, key):
+    return "{}{}:{}:{}".format(KEY_PREFIX, current_generation(), kind, key)
+
+
+def api_key_id(org_id, api_key):
+    """The key that API keys are cached under (so the keys themselves aren't kept in Redis)."""
+    return "{}:{}".format(org_id, hashlib.sha256(api_key.encode()).hexdigest())
+
+
+def get_principal(kind, key):
+    if not settings.PRINCIPALS_CACHE_TTL:
+        return None
+
+    cache_key = principal_key(kind, key)
+    expires_at, principal = _local_principals.get(cache_key, (0, None))
+    if expires_at > time.time():
+        return principal
+
+    principal = redis_connection.get(cache_key)
+    if principal is None:
+        return None
+
+    principal = json_loads(principal)
+    _local_principals[cache_key] = (time.time() + settings.PRINCIPALS_CACHE_LOCAL_TTL, principal)
+    return principal
+
+
+def cache_principal(kind, key, principal):
+    if not settings.PRINCIPALS_CACHE_TTL:
+        return
+
+    cache_key = principal_key(kind, key)
+    principal = json_dumps(principal)
+    redis_connection.set(cache_key, principal, ex=settings.PRINCIPALS_CACHE_TTL)
+    # Cache a copy, as it would be read from Redis, that doesn't change along with the instances it was dumped from.
+    _local_principals[cache_key] = (time.time() + settings.PRINCIPALS_CACHE_LOCAL_TTL, json_loads(principal))
+
+
+def invalidate_principals(kind, keys):
+    cache_keys = [principal_key(kind, key) for key in keys]
+    if cache_keys:
+        redis_connection.delete(*cache_keys)
+    for cache_key in cache_keys:
+        _local_principals.pop(cache_key, None)
+
+
+def invalidate_all_principals():
+    _local_generation["generation"] = redis_connection.incr(GENERATION_KEY)
+    _local_generation["expires_at"] = time.time() + settings.PRINCIPALS_CACHE_LOCAL_TTL
+    _local_principals.clear()
+
+
+def invalidate(target, kind=None, *keys):
+    """Invalidate the principals (or all of them, when kind is None) that a change of `target` (a model instance or a
+    session) affects, now and again once the change is committed, in case their old state was cached again meanwhile.
+    """
+    if kind is None:
+        invalidate_all_principals()
+        keys = (None,)
+    else:
+        invalidate_principals(kind, keys)
+
+    session = target if isinstance(target, Session) else object_session(target)
+    if session is not None:
+        session.info.setdefault(INVALIDATED_PRINCIPALS, set()).update((kind, key) for key in keys)
+
+
+@listens_for(Session, "after_commit")
+def invalidate_committed_principals(session):
+    invalidated = session.info.pop(INVALIDATED_PRINCIPALS, set())
+    if (None, None) in invalidated:
+        invalidate_all_principals()
+        return
+
+    keys = defaultdict(list)
+    for kind, key in invalidated:
+        keys[kind].append(key)
+    for kind, kind_keys in keys.items():
+        invalidate_principals(kind, kind_keys)
+
+
+@listens_for(Session, "after_soft_rollback")
+def forget_invalidated_principals(session, previous_transaction):
+    session.info.pop(INVALIDATED_PRINCIPALS, None)
+
+
+def dump_instance(instance, exclude=()):
+    """Return the loaded column values of a model instance, for `load_instance` to recreate it."""
+    state = inspect(instance)
+    return {
+        attr.key: getattr(instance, attr.key)
+        for attr in state.mapper.column_attrs
+        if attr.key not in state.unloaded and attr.key not in exclude
+    }
+
+
+def load_instance(model, values):
+    """Recreate a model instance from the values `dump_instance` returned and add it to the session, without querying
+    the database. Columns that weren't dumped are loaded when first accessed."""
+    mapper = inspect(model)
+    identity_key = mapper.identity_key_from_primary_key([values[column.key] for column in mapper.primary_key])
+    instance = db.session.identity_map.get(identity_key)
+    if instance is not None:
+        return instance
+
+    columns = {}
+    for attr in mapper.column_attrs:
+        if attr.key not in values:
+            continue
+        value = values[attr.key]
+        if value is not None and isinstance(attr.columns[0].type, DateTime):
+            value = dateutil.parser.parse(value)
+        columns[attr.key] = value
+
+    instance = model(**columns)
+    make_transient_to_detached(instance)
+    return db.session.merge(instance, load=False)
@@ -0,0 +1,105 @@
+"""
+Counts of the tags of queries and dashboards, kept in a materialized view so that listing the tags doesn't aggregate
+the tags of every query or dashboard a user has access to.
+
+The view counts the tags of the queries (and dashboards) that are visible to the same users: the ones that use the
+same data sources, are owned by the same user (for queries, only drafts' owners matter) and are drafts or not. Which
+of its rows a user can see is decided when they're read, with the data sources the user's groups have access to.
+
+Changing queries, dashboards or widgets in a way that changes the counts marks the view stale once committed, and the
+refresh_tag_counts job refreshes it if it is (every TAG_COUNTS_REFRESH_INTERVAL seconds).
+"""
+
+from sqlalchemy import DDL, Boolean, Column, Integer, MetaData, String, Table, Unicode
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.event import listen, listens_for
+from sqlalchemy.orm import Session, object_session
+
+from redash import redis_connection
+
+from .base import db
+
+STALE_KEY = "tag_counts:stale"
+STALE_SESSION_KEY = "tag_counts_stale"
+
+# Not part of db.metadata, which would create it as a table: the view is created by the DDL below.
+tag_counts = Table(
+    "tag_counts",
+    MetaData(),
+    Column("object_type", String(255)),
+    Column("org_id", Integer),
+    Column("data_source_ids", ARRAY(Integer)),
+    Column("user_id", Integer),
+    Column("is_draft", Boolean),
+    Column("tag", Unicode),
+    Column("count", Integer),
+)
+
+CREATE_VIEW = """
+CREATE MATERIALIZED VIEW IF NOT EXISTS tag_counts AS
+SELECT 'Query'::varchar AS object_type, org_id, ARRAY[data_source_id] AS data_source_ids,
+       CASE WHEN is_draft THEN user_id END AS user_id, is_draft, tag, count(*)::integer AS count
+FROM queries, unnest(tags) AS tag
+WHERE is_archived IS false AND data_source_id IS NOT NULL
+GROUP BY 1, 2, 3, 4, 5, 6
+UNION ALL
+SELECT 'Dashboard', org_id, data_source_ids, user_id, is_draft, tag, count(*)::integer
+FROM (
+    SELECT dashboards.org_id, dashboards.user_id, dashboards.is_draft, dashboards.tags,
+           ARRAY(
+               SELECT DISTINCT queries.data_source_id
+               FROM widgets
+               JOIN visualizations ON visualizations.id = widgets.visualization_id
+               JOIN queries ON queries.id = visualizations.query_id
+               WHERE widgets.dashboard_id = dashboards.id AND queries.data_source_id IS NOT NULL
+               ORDER BY 1
+           ) AS data_source_ids
+    FROM dashboards
+    WHERE is_archived IS false
+) AS dashboards, unnest(tags) AS tag
+GROUP BY 1, 2, 3, 4, 5, 6
+"""
+# Refreshing the view concurrently (without locking out reads) needs a unique index.
+CREATE_INDEX = """
+CREATE UNIQUE INDEX IF NOT EXISTS ix_tag_counts
+ON tag_counts (object_type, org_id, data_source_ids, user_id, is_draft, tag)
+"""
+
+listen(db.metadata, "after_create", DDL(CREATE_VIEW))
+listen(db.metadata, "after_create", DDL(CREATE_INDEX))
+listen(db.metadata, "before_drop", DDL("DROP MATERIALIZED VIEW IF EXISTS tag_counts"))
+
+
+def mark_stale(target):
+    """Mark the tag counts stale once the change of `target` (a model instance or a session) is committed."""
+    session = target if isinstance(target, Session) else object_session(target)
+    if session is not None:
+        session.info[STALE_SESSION_KEY] = True
+
+
+@listens_for(Session, "after_commit")
+def mark_committed_changes_stale(session):
+    if session.info.pop(STALE_SESSION_KEY, False):
+        redis_connection.set(STALE_KEY, 1)
+
+
+@listens_for(Session, "after_soft_rollback")
+def forget_stale_changes(session, previous_transaction):
+    session.info.pop(STALE_SESSION_KEY, None)
+
+
+def refresh(force=False):
+    """Refresh the tag counts if they're stale (or `force` is set), and commit. Returns whether they were refreshed."""
+    # The flag is cleared first, so that changes committed while refreshing mark the counts stale again.
+    if not redis_connection.delete(STALE_KEY) and not force:
+        return False
+
+    try:
+        db.session.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY tag_counts")
+        db.session.commit()
+    except Exception:
+        # Leave the refresh to the next run.
+        db.session.rollback()
+        redis_connection.set(STALE_KEY, 1)
+        raise
+    return True
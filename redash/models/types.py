@@ -3,8 +3,9 @@ from sqlalchemy.ext.mutable import Mutable
 from sqlalchemy.types import TypeDecorator
 from sqlalchemy_utils import EncryptedType
 
-from redash.utils import json_dumps, json_loads
+from redash.utils import COMPACT_SEPARATORS, json_dumps, json_loads
 from redash.utils.configuration import ConfigurationContainer
+from redash.utils.timing import phase
 
 from .base import db
 
@@ -37,7 +38,8 @@ class JSONText(TypeDecorator):
         if value is None:
             return value
 
-        return json_dumps(value)
+        with phase("serialize"):
+            return json_dumps(value, separators=COMPACT_SEPARATORS)
 
     def process_result_value(self, value, dialect):
         if not value:
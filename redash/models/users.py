@@ -9,12 +9,15 @@ from flask import current_app, request_started, url_for
 from flask_login import AnonymousUserMixin, UserMixin, current_user
 from passlib.apps import custom_app_context as pwd_context
 from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from sqlalchemy.event import listens_for
 from sqlalchemy_utils import EmailType
 from sqlalchemy_utils.models import generic_repr
 
 from redash import redis_connection
-from redash.utils import dt_from_timestamp, generate_token
+from redash.utils import dt_from_timestamp, generate_token, json_dumps
+from redash.utils.request_cache import request_cache
 
+from . import principals
 from .base import Column, GFKBase, db, key_type, primary_key
 from .mixins import BelongsToOrgMixin, TimestampMixin
 from .types import MutableDict, MutableList, json_cast_property
@@ -23,24 +26,56 @@ logger = logging.getLogger(__name__)
 
 
 LAST_ACTIVE_KEY = "users:last_active_at"
+SYNC_LAST_ACTIVE_AT_CHUNK_SIZE = 1000
 
 
 def sync_last_active_at():
     """
-    Update User model with the active_at timestamp from Redis. We first fetch
-    all the user_ids to update, and then fetch the timestamp to minimize the
-    time between fetching the value and updating the DB. This is because there
-    might be a more recent update we skip otherwise.
+    Update User model with the active_at timestamps from Redis. The timestamps
+    are read and cleared atomically, so updates made meanwhile are kept for the
+    next sync, and written with one bulk UPDATE per chunk of users.
     """
-    user_ids = redis_connection.hkeys(LAST_ACTIVE_KEY)
-    for user_id in user_ids:
-        timestamp = redis_connection.hget(LAST_ACTIVE_KEY, user_id)
-        active_at = dt_from_timestamp(timestamp)
-        user = User.query.filter(User.id == user_id).first()
-        if user:
-            user.active_at = active_at
-        redis_connection.hdel(LAST_ACTIVE_KEY, user_id)
-    db.session.commit()
+    with redis_connection.pipeline() as pipe:
+        pipe.hgetall(LAST_ACTIVE_KEY)
+        pipe.delete(LAST_ACTIVE_KEY)
+        timestamps, _ = pipe.execute()
+
+    if not timestamps:
+        return
+
+    items = list(timestamps.items())
+    try:
+        for offset in range(0, len(items), SYNC_LAST_ACTIVE_AT_CHUNK_SIZE):
+            _update_active_at(items[offset : offset + SYNC_LAST_ACTIVE_AT_CHUNK_SIZE])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        # Put the timestamps back for the next sync, unless there are newer ones already.
+        with redis_connection.pipeline(transaction=False) as pipe:
+            for user_id, timestamp in items:
+                pipe.hsetnx(LAST_ACTIVE_KEY, user_id, timestamp)
+            pipe.execute()
+        raise
+
+
+def _update_active_at(items):
+    values = []
+    params = {}
+    for i, (user_id, timestamp) in enumerate(items):
+        values.append("(CAST(:id_{i} AS integer), CAST(:active_at_{i} AS jsonb))".format(i=i))
+        params["id_{}".format(i)] = user_id
+        params["active_at_{}".format(i)] = json_dumps(dt_from_timestamp(timestamp))
+
+    db.session.execute(
+        """UPDATE users
+           SET details = jsonb_set(COALESCE(users.details, '{{}}'::jsonb), '{{active_at}}', v.active_at),
+               updated_at = now()
+           FROM (VALUES {}) AS v(id, active_at)
+           WHERE users.id = v.id""".format(", ".join(values)),
+        params,
+    )
+    # The users are updated in bulk, bypassing the session, so their cached principals are invalidated here.
+    principals.invalidate(db.session(), "user", *(user_id for user_id, _ in items))
 
 
 def update_user_active_at(sender, *args, **kwargs):
@@ -171,8 +206,11 @@ class User(TimestampMixin, db.Model, BelongsToOrgMixin, UserMixin, PermissionsCh
 
     @property
     def permissions(self):
-        # TODO: this should be cached.
-        return list(itertools.chain(*[g.permissions for g in Group.query.filter(Group.id.in_(self.group_ids))]))
+        cache = request_cache("group_permissions")
+        key = tuple(sorted(self.group_ids or []))
+        if key not in cache:
+            cache[key] = list(itertools.chain(*[g.permissions for g in Group.query.filter(Group.id.in_(key))]))
+        return list(cache[key])
 
     @classmethod
     def get_by_org(cls, org):
@@ -300,6 +338,19 @@ class Group(db.Model, BelongsToOrgMixin):
         return list(result)
 
 
+@listens_for(User, "after_update")
+@listens_for(User, "after_delete")
+def invalidate_user_principal(mapper, connection, target):
+    principals.invalidate(target, "user", target.id)
+
+
+@listens_for(Group, "after_update")
+@listens_for(Group, "after_delete")
+def invalidate_group_members_principals(mapper, connection, target):
+    # Groups' permissions are cached with their members.
+    principals.invalidate(target)
+
+
 @generic_repr("id", "object_type", "object_id", "access_type", "grantor_id", "grantee_id")
 class AccessPermission(GFKBase, db.Model):
     id = primary_key("AccessPermission")
@@ -1,10 +1,20 @@
-from funcy import flatten
+from funcy import chunks, flatten
 from rq import Queue, Worker
 from rq.job import Job
 from rq.registry import StartedJobRegistry
+from rq.utils import as_text
+from sqlalchemy import bindparam, text
 
 from redash import __version__, redis_connection, rq_redis_connection, settings
-from redash.models import Dashboard, Query, QueryResult, Widget, db
+from redash.models import QueryResult, db
+from redash.models.base import estimated_count
+from redash.utils import json_dumps, json_loads
+
+DATABASE_STATUS_KEY = "redash:status:database"
+# The started jobs of the queues are fetched in batches of this many jobs.
+JOBS_FETCH_BATCH_SIZE = 100
+# Tables with fewer rows than this, as estimated by their last ANALYZE, are counted rather than estimated.
+EXACT_ROW_COUNT_THRESHOLD = 10000
 
 
 def get_redis_status():
@@ -15,14 +25,42 @@ def get_redis_status():
     }
 
 
+def estimated_row_counts(*tables):
+    """Return the number of rows of each table (with its partitions), as estimated by its last ANALYZE. Tables that
+    haven't been analyzed yet, or that are small, are counted instead."""
+    estimates = db.session.execute(
+        text("""
+            SELECT tables.relname, sum(greatest(relations.reltuples, 0))::bigint, bool_or(relations.reltuples < 0)
+            FROM pg_class AS tables
+            JOIN pg_class AS relations
+              ON relations.oid = tables.oid
+              OR relations.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = tables.oid)
+            WHERE tables.relname IN :tables AND pg_table_is_visible(tables.oid)
+            GROUP BY tables.relname
+            """).bindparams(bindparam("tables", expanding=True)),
+        {"tables": list(tables)},
+    )
+
+    counts = {table: 0 for table in tables}
+    for table, estimate, unanalyzed in estimates.fetchall():
+        if unanalyzed or estimate < EXACT_ROW_COUNT_THRESHOLD:
+            quoted_table = db.engine.dialect.identifier_preparer.quote(table)
+            estimate = db.session.execute("SELECT count(*) FROM {}".format(quoted_table)).scalar()
+        counts[table] = estimate
+    return counts
+
+
 def get_object_counts():
+    counts = estimated_row_counts("queries", "query_results", "dashboards", "widgets")
     status = {}
-    status["queries_count"] = Query.query.count()
+    status["queries_count"] = counts["queries"]
     if settings.FEATURE_SHOW_QUERY_RESULTS_COUNT:
-        status["query_results_count"] = QueryResult.query.count()
-        status["unused_query_results_count"] = QueryResult.unused(settings.QUERY_RESULTS_CLEANUP_MAX_AGE).count()
-    status["dashboards_count"] = Dashboard.query.count()
-    status["widgets_count"] = Widget.query.count()
+        status["query_results_count"] = counts["query_results"]
+        status["unused_query_results_count"] = estimated_count(
+            QueryResult.unused(settings.QUERY_RESULTS_CLEANUP_MAX_AGE)
+        )
+    status["dashboards_count"] = counts["dashboards"]
+    status["widgets_count"] = counts["widgets"]
     return status
 
 
@@ -46,14 +84,27 @@ def get_db_sizes():
     return database_metrics
 
 
+def refresh_database_status():
+    """Store a snapshot of the database's status, which get_status reads until the next refresh (or it expires)."""
+    status = get_object_counts()
+    status["database_metrics"] = {"metrics": get_db_sizes()}
+    redis_connection.set(DATABASE_STATUS_KEY, json_dumps(status), ex=settings.STATUS_REFRESH_INTERVAL * 3)
+    return status
+
+
+def get_database_status():
+    status = redis_connection.get(DATABASE_STATUS_KEY)
+    if status is None:
+        return refresh_database_status()
+    return json_loads(status)
+
+
 def get_status():
     status = {"version": __version__, "workers": []}
     status.update(get_redis_status())
-    status.update(get_object_counts())
+    status.update(get_database_status())
     status["manager"] = redis_connection.hgetall("redash:status")
     status["manager"]["queues"] = get_queues_status()
-    status["database_metrics"] = {}
-    status["database_metrics"]["metrics"] = get_db_sizes()
 
     return status
 
@@ -77,19 +128,32 @@ def fetch_jobs(job_ids):
             "started_at": job.started_at,
             "meta": job.meta,
         }
-        for job in Job.fetch_many(job_ids, connection=rq_redis_connection)
+        for batch in chunks(JOBS_FETCH_BATCH_SIZE, job_ids)
+        for job in Job.fetch_many(batch, connection=rq_redis_connection)
         if job is not None
     ]
 
 
 def rq_queues():
+    queues = sorted(Queue.all(connection=rq_redis_connection), key=lambda q: q.name)
+
+    # The queues' lengths and started jobs' ids, in one round trip.
+    pipe = rq_redis_connection.pipeline(transaction=False)
+    for q in queues:
+        pipe.llen(q.key)
+        pipe.zrange(StartedJobRegistry(queue=q).key, 0, -1)
+    results = pipe.execute()
+    queued_counts = results[0::2]
+    started_ids = [[as_text(job_id) for job_id in job_ids] for job_ids in results[1::2]]
+
+    started_jobs = {job["id"]: job for job in fetch_jobs(list(flatten(started_ids)))}
     return {
         q.name: {
             "name": q.name,
-            "started": fetch_jobs(StartedJobRegistry(queue=q).get_job_ids()),
-            "queued": len(q.job_ids),
+            "started": [started_jobs[job_id] for job_id in job_ids if job_id in started_jobs],
+            "queued": queued,
         }
-        for q in sorted(Queue.all(), key=lambda q: q.name)
+        for q, queued, job_ids in zip(queues, queued_counts, started_ids)
     }
 
 
@@ -14,6 +14,7 @@ from redash.utils.requests_session import (
     requests_or_advocate,
     requests_session,
 )
+from redash.utils.timing import phase
 
 logger = logging.getLogger(__name__)
 
@@ -420,6 +421,8 @@ def register(query_runner_class):
             query_runner_class.type(),
         )
         query_runners[query_runner_class.type()] = query_runner_class
+        if hasattr(query_runner_class, "custom_json_encoder"):
+            utils.register_json_encoder(query_runner_class.custom_json_encoder)
     else:
         logger.debug(
             "%s query runner enabled but not supported, not registering. Either disable or install missing "
@@ -505,7 +508,10 @@ def with_ssh_tunnel(query_runner, details):
                     "ssh_username": details["ssh_username"],
                     **settings.dynamic_settings.ssh_tunnel_auth(),
                 }
-                server = stack.enter_context(open_tunnel(bastion_address, remote_bind_address=remote_address, **auth))
+                with phase("ssh_tunnel"):
+                    server = stack.enter_context(
+                        open_tunnel(bastion_address, remote_bind_address=remote_address, **auth)
+                    )
             except Exception as error:
                 raise type(error)("SSH tunnel: {}".format(str(error)))
 
@@ -14,6 +14,7 @@ from redash.query_runner import (
     register,
 )
 from redash.settings import parse_boolean
+from redash.utils.timing import add_timings, phase, timed_phases
 
 try:
     import MySQLdb
@@ -213,12 +214,16 @@ class Mysql(BaseSQLQueryRunner):
         t = None
 
         try:
-            connection = self._connection()
+            with phase("connect"):
+                connection = self._connection()
             thread_id = connection.thread_id()
             t = threading.Thread(target=self._run_query, args=(query, user, connection, r, ev))
             t.start()
             while not ev.wait(1):
                 pass
+            t.join()
+            # The thread times its phases on its own, to be added to this one's once it's done.
+            add_timings(r.timings)
         except (KeyboardInterrupt, InterruptException, JobTimeoutException):
             self._cancel(thread_id)
             t.join()
@@ -227,24 +232,30 @@ class Mysql(BaseSQLQueryRunner):
         return r.data, r.error
 
     def _run_query(self, query, user, connection, r, ev):
+        with timed_phases() as r.timings:
+            self._fetch_query_results(query, user, connection, r, ev)
+
+    def _fetch_query_results(self, query, user, connection, r, ev):
         try:
             cursor = connection.cursor()
             logger.debug("MySQL running query: %s", query)
             cursor.execute(query)
 
-            data = cursor.fetchall()
-            desc = cursor.description
+            with phase("fetch"):
+                data = cursor.fetchall()
+                desc = cursor.description
 
-            while cursor.nextset():
-                if cursor.description is not None:
-                    data = cursor.fetchall()
-                    desc = cursor.description
+                while cursor.nextset():
+                    if cursor.description is not None:
+                        data = cursor.fetchall()
+                        desc = cursor.description
 
-            # TODO - very similar to pg.py
-            if desc is not None:
-                columns = self.fetch_columns([(i[0], types_map.get(i[1], None)) for i in desc])
-                rows = [dict(zip((column["name"] for column in columns), row)) for row in data]
+                # TODO - very similar to pg.py
+                if desc is not None:
+                    columns = self.fetch_columns([(i[0], types_map.get(i[1], None)) for i in desc])
+                    rows = [dict(zip((column["name"] for column in columns), row)) for row in data]
 
+            if desc is not None:
                 data = {"columns": columns, "rows": rows}
                 r.data = data
                 r.error = None
@@ -20,6 +20,7 @@ from redash.query_runner import (
     JobTimeoutException,
     register,
 )
+from redash.utils.timing import phase
 
 logger = logging.getLogger(__name__)
 
@@ -269,8 +270,9 @@ class PostgreSQL(BaseSQLQueryRunner):
         return connection
 
     def run_query(self, query, user):
-        connection = self._get_connection()
-        _wait(connection, timeout=10)
+        with phase("connect"):
+            connection = self._get_connection()
+            _wait(connection, timeout=10)
 
         cursor = connection.cursor()
 
@@ -279,8 +281,9 @@ class PostgreSQL(BaseSQLQueryRunner):
             _wait(connection)
 
             if cursor.description is not None:
-                columns = self.fetch_columns([(i[0], types_map.get(i[1], None)) for i in cursor.description])
-                rows = [dict(zip((column["name"] for column in columns), row)) for row in cursor]
+                with phase("fetch"):
+                    columns = self.fetch_columns([(i[0], types_map.get(i[1], None)) for i in cursor.description])
+                    rows = [dict(zip((column["name"] for column in columns), row)) for row in cursor]
 
                 data = {"columns": columns, "rows": rows}
                 error = None
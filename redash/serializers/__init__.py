@@ -4,10 +4,15 @@ classes we have. This will ensure cleaner code and better
 separation of concerns.
 """
 
+from collections import defaultdict
+
 from flask_login import current_user
 from funcy import project
 from rq.job import JobStatus
 from rq.timeouts import JobTimeoutException
+from sqlalchemy import inspect
+from sqlalchemy.orm import defer
+from sqlalchemy.orm.attributes import set_committed_value
 
 from redash import models
 from redash.models.parameterized_query import ParameterizedQuery
@@ -15,6 +20,7 @@ from redash.permissions import has_access, view_only
 from redash.serializers.query_result import (
     serialize_query_result,
     serialize_query_result_to_dsv,
+    serialize_query_result_to_json,
     serialize_query_result_to_xlsx,
 )
 
@@ -69,6 +75,56 @@ class Serializer:
     pass
 
 
+def prefetch_related(objects, relationship, model, foreign_key, *options):
+    """Load the objects' many-to-one `relationship` (to `model`, through the `foreign_key` column) with one query,
+    instead of a query per object."""
+    pending = [obj for obj in objects if relationship in inspect(obj).unloaded]
+    ids = {getattr(obj, foreign_key) for obj in pending} - {None}
+    if not ids:
+        return
+
+    related = {r.id: r for r in model.query.filter(model.id.in_(ids)).options(*options)}
+    for obj in pending:
+        set_committed_value(obj, relationship, related.get(getattr(obj, foreign_key)))
+
+
+def prefetch_visualizations(queries):
+    pending = [query for query in queries if "visualizations" in inspect(query).unloaded]
+    if not pending:
+        return
+
+    visualizations = defaultdict(list)
+    for vis in models.Visualization.query.filter(models.Visualization.query_id.in_([q.id for q in pending])).order_by(
+        models.Visualization.id
+    ):
+        visualizations[vis.query_id].append(vis)
+
+    for query in pending:
+        set_committed_value(query, "visualizations", visualizations[query.id])
+
+
+SERIALIZE_QUERY_OPTIONS = ("with_stats", "with_visualizations", "with_user", "with_last_modified_by")
+
+
+def prefetch_queries(queries, with_stats=False, with_visualizations=False, with_user=True, with_last_modified_by=True):
+    """Load everything serialize_query needs for the queries with a query per relationship."""
+    queries = list(queries)
+    if not queries:
+        return
+
+    if with_user:
+        prefetch_related(queries, "user", models.User, "user_id")
+    if with_last_modified_by:
+        prefetch_related(queries, "last_modified_by", models.User, "last_modified_by_id")
+    if with_stats:
+        # Only the results' metadata is serialized.
+        prefetch_related(
+            queries, "latest_query_data", models.QueryResult, "latest_query_data_id", defer(models.QueryResult.data)
+        )
+    if with_visualizations:
+        prefetch_visualizations(queries)
+
+
 class QuerySerializer(Serializer):
     def __init__(self, object_or_list, **kwargs):
         self.object_or_list = object_or_list
@@ -80,9 +136,10 @@ class QuerySerializer(Serializer):
             if self.options.get("with_favorite_state", True) and not current_user.is_api_user():
                 result["is_favorite"] = models.Favorite.is_favorite(current_user.id, self.object_or_list)
         else:
-            result = [serialize_query(query, **self.options) for query in self.object_or_list]
+            queries = list(self.object_or_list)
+            prefetch_queries(queries, **project(self.options, SERIALIZE_QUERY_OPTIONS))
+            result = [serialize_query(query, **self.options) for query in queries]
             if self.options.get("with_favorite_state", True):
-                queries = list(self.object_or_list)
                 favorites = models.Favorite.query.filter(
                     models.Favorite.object_id.in_([o.id for o in queries]),
                     models.Favorite.object_type == "Query",
@@ -206,13 +263,30 @@ def serialize_alert(alert, full=True):
     return d
 
 
+def prefetch_access(queries, user):
+    """Load what checking the user's access to each of the queries needs with a query or two, instead of one or two
+    per query checked."""
+    if user.is_api_user():
+        models.Query.prefetch_dashboard_api_keys([q.id for q in queries])
+    models.DataSource.prefetch_groups([q.data_source_id for q in queries])
+
+
 def serialize_dashboard(obj, with_widgets=False, user=None, with_favorite_state=True):
     layout = obj.layout
 
     widgets = []
 
     if with_widgets:
-        for w in obj.widgets:
+        dashboard_widgets = obj.widgets.all()
+        prefetch_related(dashboard_widgets, "visualization", models.Visualization, "visualization_id")
+        visualizations = [w.visualization for w in dashboard_widgets if w.visualization is not None]
+        prefetch_related(visualizations, "query_rel", models.Query, "query_id")
+        queries = [vis.query_rel for vis in visualizations]
+        prefetch_queries(queries)
+        if user:
+            prefetch_access(queries, user)
+
+        for w in dashboard_widgets:
             if w.visualization_id is None:
                 widgets.append(serialize_widget(w))
             elif user and has_access(w.visualization.query_rel, user, view_only):
@@ -271,9 +345,10 @@ class DashboardSerializer(Serializer):
             if self.options.get("with_favorite_state", True) and not current_user.is_api_user():
                 result["is_favorite"] = models.Favorite.is_favorite(current_user.id, self.object_or_list)
         else:
-            result = [serialize_dashboard(obj, **self.options) for obj in self.object_or_list]
+            dashboards = list(self.object_or_list)
+            prefetch_related(dashboards, "user", models.User, "user_id")
+            result = [serialize_dashboard(obj, **self.options) for obj in dashboards]
             if self.options.get("with_favorite_state", True):
-                dashboards = list(self.object_or_list)
                 favorites = models.Favorite.query.filter(
                     models.Favorite.object_id.in_([o.id for o in dashboards]),
                     models.Favorite.object_type == "Dashboard",
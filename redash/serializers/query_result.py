@@ -4,9 +4,11 @@ import io
 import xlsxwriter
 from dateutil.parser import isoparse as parse_date
 from funcy import project, rpartial
+from sqlalchemy import inspect
 
 from redash.authentication.org_resolving import current_org
 from redash.query_runner import TYPE_BOOLEAN, TYPE_DATE, TYPE_DATETIME
+from redash.utils import COMPACT_SEPARATORS, json_dumps
 
 
 def _convert_format(fmt):
@@ -72,6 +74,20 @@ def _get_column_lists(columns):
     return fieldnames, special_columns
 
 
+def serialize_query_result_to_json(query_result):
+    """Serialize a query result to the `{"query_result": {...}}` JSON document returned by the API.
+
+    Unless the result's data was already loaded and decoded, the stored JSON text is spliced into the document instead
+    of being decoded and encoded again.
+    """
+    if "data" not in inspect(query_result).unloaded:
+        return json_dumps({"query_result": query_result.to_dict()}, separators=COMPACT_SEPARATORS)
+
+    metadata = json_dumps(query_result.to_dict(with_data=False), separators=COMPACT_SEPARATORS)
+    serialized_data = query_result.serialized_data or "null"
+    return '{{"query_result":{},"data":{}}}}}'.format(metadata[:-1], serialized_data)
+
+
 def serialize_query_result(query_result, is_api_user):
     if is_api_user:
         publicly_needed_keys = ["data", "retrieved_at"]
@@ -27,6 +27,23 @@ STATSD_PORT = int(os.environ.get("REDASH_STATSD_PORT", "8125"))
 STATSD_PREFIX = os.environ.get("REDASH_STATSD_PREFIX", "redash")
 STATSD_USE_TAGS = parse_boolean(os.environ.get("REDASH_STATSD_USE_TAGS", "false"))
 
+# Record Prometheus metrics (when prometheus_client is installed) and serve them at /metrics, and from the RQ workers
+# on PROMETHEUS_WORKER_PORT (when it's set). Processes that fork (gunicorn workers, RQ work horses) need
+# PROMETHEUS_MULTIPROC_DIR set to a directory they share, so that their metrics are served together.
+# /metrics is only served when PROMETHEUS_METRICS_TOKEN is set, to requests with an "Authorization: Bearer <token>"
+# header. The workers' port has no authentication, so it shouldn't be reachable from outside of the deployment.
+PROMETHEUS_METRICS_ENABLED = parse_boolean(os.environ.get("REDASH_PROMETHEUS_METRICS_ENABLED", "false"))
+PROMETHEUS_METRICS_TOKEN = os.environ.get("REDASH_PROMETHEUS_METRICS_TOKEN", "")
+PROMETHEUS_WORKER_PORT = int(os.environ.get("REDASH_PROMETHEUS_WORKER_PORT", "0"))
+
+# Profile (CPU and Redash's own SQL statements) the requests of super admins that send the X-Redash-Profile header,
+# and a REQUEST_PROFILING_SAMPLE_RATE fraction of all requests. The last REQUEST_PROFILES_LIMIT reports are kept for
+# REQUEST_PROFILES_TTL seconds, for download from /api/admin/profiles.
+REQUEST_PROFILING_ENABLED = parse_boolean(os.environ.get("REDASH_REQUEST_PROFILING_ENABLED", "false"))
+REQUEST_PROFILING_SAMPLE_RATE = float(os.environ.get("REDASH_REQUEST_PROFILING_SAMPLE_RATE", "0"))
+REQUEST_PROFILES_LIMIT = int(os.environ.get("REDASH_REQUEST_PROFILES_LIMIT", "100"))
+REQUEST_PROFILES_TTL = int(os.environ.get("REDASH_REQUEST_PROFILES_TTL", 60 * 60 * 24))
+
 # Connection settings for Redash's own database (where we store the queries, results, etc)
 SQLALCHEMY_DATABASE_URI = os.environ.get(
     "REDASH_DATABASE_URL", os.environ.get("DATABASE_URL", "postgresql:///postgres")
@@ -42,18 +59,29 @@ RQ_REDIS_URL = os.environ.get("RQ_REDIS_URL", _REDIS_URL)
 
 # The following enables periodic job (every 5 minutes) of removing unused query results.
 QUERY_RESULTS_CLEANUP_ENABLED = parse_boolean(os.environ.get("REDASH_QUERY_RESULTS_CLEANUP_ENABLED", "true"))
+# The number of results the job deletes in its first batch (it then adapts the batches' size to how long they take).
 QUERY_RESULTS_CLEANUP_COUNT = int(os.environ.get("REDASH_QUERY_RESULTS_CLEANUP_COUNT", "100"))
 QUERY_RESULTS_CLEANUP_MAX_AGE = int(os.environ.get("REDASH_QUERY_RESULTS_CLEANUP_MAX_AGE", "7"))
+# How long (in seconds) each run of the job keeps deleting results for.
+QUERY_RESULTS_CLEANUP_TIME_BUDGET = int(os.environ.get("REDASH_QUERY_RESULTS_CLEANUP_TIME_BUDGET", "60"))
 
 QUERY_RESULTS_EXPIRED_TTL_ENABLED = parse_boolean(os.environ.get("REDASH_QUERY_RESULTS_EXPIRED_TTL_ENABLED", "false"))
 # default set query results expired ttl 86400 seconds
 QUERY_RESULTS_EXPIRED_TTL = int(os.environ.get("REDASH_QUERY_RESULTS_EXPIRED_TTL", "86400"))
 
+# Use orjson (when it's installed) for json_dumps calls that don't pass custom encoding options.
+JSON_FAST_ENCODER_ENABLED = parse_boolean(os.environ.get("REDASH_JSON_FAST_ENCODER_ENABLED", "true"))
+
 SCHEMAS_REFRESH_SCHEDULE = int(os.environ.get("REDASH_SCHEMAS_REFRESH_SCHEDULE", 30))
 SCHEMAS_REFRESH_TIMEOUT = int(os.environ.get("REDASH_SCHEMAS_REFRESH_TIMEOUT", 300))
 
 AUTH_TYPE = os.environ.get("REDASH_AUTH_TYPE", "api_key")
 INVITATION_TOKEN_MAX_AGE = int(os.environ.get("REDASH_INVITATION_TOKEN_MAX_AGE", 60 * 60 * 24 * 7))
+# The users and API keys requests authenticate as are cached for this many seconds in Redis (and
+# PRINCIPALS_CACHE_LOCAL_TTL seconds in each process), instead of being looked up in the database on every request.
+# Caching is disabled when it's 0.
+PRINCIPALS_CACHE_TTL = int(os.environ.get("REDASH_PRINCIPALS_CACHE_TTL", 60))
+PRINCIPALS_CACHE_LOCAL_TTL = int(os.environ.get("REDASH_PRINCIPALS_CACHE_LOCAL_TTL", 5))
 
 # The secret key to use in the Flask app for various cryptographic features
 SECRET_KEY = os.environ.get("REDASH_COOKIE_SECRET")
@@ -263,6 +291,18 @@ REDASH_ALERTS_DEFAULT_MAIL_BODY_TEMPLATE_FILE = os.environ.get(
     "REDASH_ALERTS_DEFAULT_MAIL_BODY_TEMPLATE_FILE", fix_assets_path("templates/emails/alert.html")
 )
 
+# Alert notifications are queued in a Redis outbox and sent by jobs on the "notifications" queue, which retry failed
+# deliveries with exponential backoff. When disabled, notifications are sent by the job checking the alerts.
+# Before enabling it, make sure a worker consumes the "notifications" queue (workers started with an explicit list of
+# queues, e.g. with QUEUES, only consume the queues listed).
+NOTIFICATIONS_OUTBOX_ENABLED = parse_boolean(os.environ.get("REDASH_NOTIFICATIONS_OUTBOX_ENABLED", "false"))
+NOTIFICATIONS_MAX_CONCURRENCY_PER_DESTINATION = int(
+    os.environ.get("REDASH_NOTIFICATIONS_MAX_CONCURRENCY_PER_DESTINATION", 2)
+)
+NOTIFICATIONS_BATCH_SIZE = int(os.environ.get("REDASH_NOTIFICATIONS_BATCH_SIZE", 100))
+NOTIFICATIONS_MAX_ATTEMPTS = int(os.environ.get("REDASH_NOTIFICATIONS_MAX_ATTEMPTS", 5))
+NOTIFICATIONS_RETRY_BACKOFF = int(os.environ.get("REDASH_NOTIFICATIONS_RETRY_BACKOFF", 15))
+
 # How many requests are allowed per IP to the login page before
 # being throttled?
 # See https://flask-limiter.readthedocs.io/en/stable/#rate-limit-string-notation
@@ -389,6 +429,15 @@ DESTINATIONS = distinct(enabled_destinations + additional_destinations)
 
 EVENT_REPORTING_WEBHOOKS = array_from_string(os.environ.get("REDASH_EVENT_REPORTING_WEBHOOKS", ""))
 
+# Events are buffered in Redis and recorded in bulk (and forwarded to the webhooks above as JSON arrays) every
+# EVENTS_FLUSH_INTERVAL seconds. When disabled, every event is recorded (and forwarded) by its own job.
+EVENTS_BUFFER_ENABLED = parse_boolean(os.environ.get("REDASH_EVENTS_BUFFER_ENABLED", "true"))
+EVENTS_FLUSH_INTERVAL = int(os.environ.get("REDASH_EVENTS_FLUSH_INTERVAL", 10))
+EVENTS_FLUSH_BATCH_SIZE = int(os.environ.get("REDASH_EVENTS_FLUSH_BATCH_SIZE", 1000))
+# Events older than this many days are removed, by dropping whole monthly partitions of the events table. Events are
+# kept forever when it's 0.
+EVENTS_RETENTION_DAYS = int(os.environ.get("REDASH_EVENTS_RETENTION_DAYS", 0))
+
 # Support for Sentry (https://getsentry.com/). Just set your Sentry DSN to enable it:
 SENTRY_DSN = os.environ.get("REDASH_SENTRY_DSN", "")
 SENTRY_ENVIRONMENT = os.environ.get("REDASH_SENTRY_ENVIRONMENT")
@@ -420,6 +469,18 @@ PAGE_SIZE_OPTIONS = list(
     )
 )
 TABLE_CELL_MAX_JSON_SIZE = int(os.environ.get("REDASH_TABLE_CELL_MAX_JSON_SIZE", 50000))
+# Searches, and lists paged with a cursor, report the planner's estimate of their size instead of counting them when
+# it's above this many rows.
+PAGINATION_EXACT_COUNT_LIMIT = int(os.environ.get("REDASH_PAGINATION_EXACT_COUNT_LIMIT", 10000))
+# The tag counts of queries and dashboards are refreshed (when they changed) every TAG_COUNTS_REFRESH_INTERVAL seconds,
+# so new tags can take that long to be listed.
+TAG_COUNTS_REFRESH_INTERVAL = int(os.environ.get("REDASH_TAG_COUNTS_REFRESH_INTERVAL", 30))
+# The database's status (estimated object counts and sizes) shown by /status.json is refreshed every
+# STATUS_REFRESH_INTERVAL seconds.
+STATUS_REFRESH_INTERVAL = int(os.environ.get("REDASH_STATUS_REFRESH_INTERVAL", 60))
+# The change history records the changes of text and JSON columns as diffs, with a full copy of the column every
+# CHANGES_SNAPSHOT_INTERVAL changes, so that reading its last value doesn't apply more diffs than that.
+CHANGES_SNAPSHOT_INTERVAL = int(os.environ.get("REDASH_CHANGES_SNAPSHOT_INTERVAL", 10))
 
 # Features:
 VERSION_CHECK = parse_boolean(os.environ.get("REDASH_VERSION_CHECK", "true"))
@@ -4,11 +4,20 @@ from redash import rq_redis_connection
 from redash.tasks.alerts import check_alerts_for_query
 from redash.tasks.failure_report import send_aggregated_errors
 from redash.tasks.general import (
+    enqueue_event,
+    flush_events,
+    manage_event_partitions,
     record_event,
+    refresh_database_status,
+    refresh_tag_counts,
     send_mail,
     sync_user_details,
     version_check,
 )
+from redash.tasks.notifications import (
+    deliver_channel_notifications,
+    deliver_notifications,
+)
 from redash.tasks.queries import (
     cleanup_query_results,
     empty_schedules,
@@ -2,13 +2,18 @@ import datetime
 
 from flask import current_app
 
-from redash import models, utils
+from redash import models, settings, utils
+from redash.tasks.notifications import queue_notifications
 from redash.worker import get_job_logger, job
 
 logger = get_job_logger(__name__)
 
 
 def notify_subscriptions(alert, new_state, metadata):
+    if settings.NOTIFICATIONS_OUTBOX_ENABLED:
+        queue_notifications(alert, new_state, metadata)
+        return
+
     host = utils.base_url(alert.query_rel.org)
     for subscription in alert.subscriptions:
         try:
@@ -26,14 +31,20 @@ def should_notify(alert, new_state):
 
 
 @job("default", timeout=300)
-def check_alerts_for_query(query_id, metadata):
+def check_alerts_for_query(query_id, metadata, alert_states=None):
+    """Update the state of the query's alerts and notify their subscribers.
+
+    `alert_states` holds states (by alert id) already evaluated against the query's latest result, usually by the
+    query executor right after storing it. Alerts without a state there are evaluated here.
+    """
     logger.debug("Checking query %d for alerts", query_id)
 
     query = models.Query.query.get(query_id)
+    alert_states = alert_states or {}
 
     for alert in query.alerts:
         logger.info("Checking alert (%d) of query %d.", alert.id, query_id)
-        new_state = alert.evaluate()
+        new_state = alert_states.get(alert.id) or alert.evaluate()
 
         if should_notify(alert, new_state):
             logger.info("Alert %d new state: %s", alert.id, new_state)
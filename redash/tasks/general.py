@@ -1,15 +1,25 @@
+import datetime
+
 import requests
 from flask_mail import Message
+from sqlalchemy.exc import DataError, IntegrityError
 
-from redash import mail, models, settings
+from redash import mail, models, monitor, redis_connection, settings
 from redash.models import users
 from redash.query_runner import NotSupported
 from redash.tasks.worker import Queue
+from redash.utils import json_dumps, json_loads, utcnow
 from redash.version_check import run_version_check
 from redash.worker import get_job_logger, job
 
 logger = get_job_logger(__name__)
 
+EVENTS_BUFFER_KEY = "events:buffer"
+EVENT_SCHEMA = "iglu:io.redash.webhooks/event/jsonschema/1-0-0"
+# The errors of events that can never be recorded (malformed, or of deleted organizations or users), as opposed to
+# errors of the database (say, it being down), which the events are recorded again after.
+EVENT_DATA_ERRORS = (ValueError, KeyError, TypeError, DataError, IntegrityError)
+
 
 @job("default")
 def record_event(raw_event):
@@ -20,7 +30,7 @@ def record_event(raw_event):
         logger.debug("Forwarding event to: %s", hook)
         try:
             data = {
-                "schema": "iglu:io.redash.webhooks/event/jsonschema/1-0-0",
+                "schema": EVENT_SCHEMA,
                 "data": event.to_dict(),
             }
             response = requests.post(hook, json=data)
@@ -30,6 +40,110 @@ def record_event(raw_event):
             logger.exception("Failed posting to %s", hook)
 
 
+def enqueue_event(raw_event):
+    """Record an event: add it to the events buffer, or enqueue a job recording it if buffering is disabled."""
+    if settings.EVENTS_BUFFER_ENABLED:
+        redis_connection.rpush(EVENTS_BUFFER_KEY, json_dumps(raw_event))
+    else:
+        record_event.delay(raw_event)
+
+
+def _record_events(raw_events):
+    """Record buffered events, dropping the ones that can't be recorded.
+
+    On errors other than the events' own, the events that weren't recorded are put back at the head of the buffer and
+    the error is raised.
+    """
+    try:
+        events = models.Event.record_many([json_loads(e) for e in raw_events])
+        models.db.session.commit()
+        return events
+    except EVENT_DATA_ERRORS:
+        # Don't let one bad event (say, of a deleted organization) fail all the others.
+        logger.exception("Failed recording %d events in bulk, recording them one by one.", len(raw_events))
+        models.db.session.rollback()
+    except Exception:
+        models.db.session.rollback()
+        _requeue_events(raw_events)
+        raise
+
+    events = []
+    for i, raw_event in enumerate(raw_events):
+        try:
+            events.extend(models.Event.record_many([json_loads(raw_event)]))
+            models.db.session.commit()
+        except EVENT_DATA_ERRORS:
+            logger.exception("Failed recording event: %s", raw_event)
+            models.db.session.rollback()
+        except Exception:
+            models.db.session.rollback()
+            _requeue_events(raw_events[i:])
+            raise
+    return events
+
+
+def _requeue_events(raw_events):
+    logger.warning("Putting %d events back in the buffer.", len(raw_events))
+    redis_connection.lpush(EVENTS_BUFFER_KEY, *reversed(raw_events))
+
+
+def _forward_events(session, events):
+    data = [{"schema": EVENT_SCHEMA, "data": event.to_dict()} for event in events]
+    for hook in settings.EVENT_REPORTING_WEBHOOKS:
+        logger.debug("Forwarding %d events to: %s", len(events), hook)
+        try:
+            response = session.post(hook, data=json_dumps(data), headers={"Content-Type": "application/json"})
+            if response.status_code != 200:
+                logger.error("Failed posting to %s: %s", hook, response.content)
+        except Exception:
+            logger.exception("Failed posting to %s", hook)
+
+
+def flush_events():
+    """Record the buffered events in bulk, and forward them to the event reporting webhooks in batches."""
+    batch_size = settings.EVENTS_FLUSH_BATCH_SIZE
+
+    with requests.Session() as session:
+        while True:
+            with redis_connection.pipeline() as pipe:
+                pipe.lrange(EVENTS_BUFFER_KEY, 0, batch_size - 1)
+                pipe.ltrim(EVENTS_BUFFER_KEY, batch_size, -1)
+                raw_events, _ = pipe.execute()
+
+            if raw_events:
+                events = _record_events(raw_events)
+                if events and settings.EVENT_REPORTING_WEBHOOKS:
+                    _forward_events(session, events)
+
+            if len(raw_events) < batch_size:
+                break
+
+
+def manage_event_partitions():
+    """Create the events table partitions of this month and the next, and drop the ones past the retention period."""
+    now = utcnow()
+    next_month = (now.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+    for month in [now, next_month]:
+        if models.Event.create_partition(month):
+            logger.info("Created events partition %s.", models.Event.partition_name(month))
+
+    if settings.EVENTS_RETENTION_DAYS:
+        cutoff = now - datetime.timedelta(days=settings.EVENTS_RETENTION_DAYS)
+        for partition in models.Event.drop_partitions_before(cutoff):
+            logger.info("Dropped events partition %s.", partition)
+
+    models.db.session.commit()
+
+
+def refresh_tag_counts():
+    if models.tags.refresh():
+        logger.info("Refreshed tag counts.")
+
+
+def refresh_database_status():
+    monitor.refresh_database_status()
+
+
 def version_check():
     run_version_check()
 
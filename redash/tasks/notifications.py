@@ -0,0 +1,266 @@
+import time
+import uuid
+
+from flask import current_app
+
+from redash import models, redis_connection, settings, statsd_client, utils
+from redash.utils import json_dumps, json_loads
+from redash.worker import get_job_logger, job
+
+logger = get_job_logger(__name__)
+
+OUTBOX_KEY_PREFIX = "notification_outbox:channel:"
+PROCESSING_KEY_PREFIX = "notification_outbox:processing:"
+RETRIES_KEY = "notification_outbox:retries"
+# The channels with notifications in their outbox or processing lists, for deliver_notifications to look after.
+CHANNELS_KEY = "notification_outbox:channels"
+DELIVERY_TIMEOUT = 600
+
+# Releases a channel's delivery slot if the job releasing it still holds it (it might have expired and been taken by
+# another job).
+#
+# KEYS: the slot. ARGV: the token of the job releasing it.
+RELEASE_SLOT_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+release_slot_script = redis_connection.register_script(RELEASE_SLOT_SCRIPT)
+
+# Moves the notifications a job popped but didn't get to acknowledge (because it crashed or was killed) back to the
+# head of their outbox, unless the job's slot is still held.
+#
+# KEYS: the slot, its processing list and the channel's outbox.
+# Returns the number of notifications moved back.
+REQUEUE_UNACKNOWLEDGED_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+local entries = redis.call('LRANGE', KEYS[2], 0, -1)
+for i = 1, #entries do
+    redis.call('RPUSH', KEYS[3], entries[i])
+end
+redis.call('DEL', KEYS[2])
+return #entries
+"""
+requeue_unacknowledged_script = redis_connection.register_script(REQUEUE_UNACKNOWLEDGED_SCRIPT)
+
+# Removes a channel from the active channels, unless notifications were added to its outbox or processing lists
+# meanwhile.
+#
+# KEYS: the active channels, the channel's outbox and its processing lists. ARGV: the channel.
+# Returns whether the channel was removed.
+REMOVE_IDLE_CHANNEL_SCRIPT = """
+if redis.call('EXISTS', unpack(KEYS, 2)) > 0 then
+    return 0
+end
+return redis.call('SREM', KEYS[1], ARGV[1])
+"""
+remove_idle_channel_script = redis_connection.register_script(REMOVE_IDLE_CHANNEL_SCRIPT)
+
+
+def outbox_key(channel):
+    # Notifications are pushed on the left of the outbox and popped from its right, with RPOPLPUSH (which, unlike
+    # LMOVE, Redis versions before 6.2 have).
+    return "{}{}".format(OUTBOX_KEY_PREFIX, channel)
+
+
+def slot_key(channel, slot):
+    return "notification_outbox:slot:{}:{}".format(channel, slot)
+
+
+def processing_key(channel, slot):
+    # The notifications the job holding a slot popped from the channel's outbox and didn't acknowledge yet.
+    return "{}{}:{}".format(PROCESSING_KEY_PREFIX, channel, slot)
+
+
+def channel_for(subscription):
+    # Notifications of subscriptions without a destination are emailed to the subscribed user.
+    if subscription.destination_id:
+        return "destination-{}".format(subscription.destination_id)
+    return "user-{}".format(subscription.user_id)
+
+
+def queue_notifications(alert, new_state, metadata):
+    """Add the notifications of an alert's new state to its subscriptions' outboxes and start delivering them."""
+    channels = set()
+    queued_at = time.time()
+
+    with redis_connection.pipeline(transaction=False) as pipe:
+        for subscription in alert.subscriptions:
+            channel = channel_for(subscription)
+            entry = {
+                "subscription_id": subscription.id,
+                "alert_id": alert.id,
+                "state": new_state,
+                "metadata": metadata,
+                "queued_at": queued_at,
+                "attempts": 0,
+            }
+            pipe.lpush(outbox_key(channel), json_dumps(entry))
+            channels.add(channel)
+        if channels:
+            pipe.sadd(CHANNELS_KEY, *channels)
+        pipe.execute()
+
+    for channel in channels:
+        deliver_channel_notifications.delay(channel)
+
+
+def _acquire_slot(channel, token):
+    for slot in range(settings.NOTIFICATIONS_MAX_CONCURRENCY_PER_DESTINATION):
+        if redis_connection.set(slot_key(channel, slot), token, nx=True, ex=DELIVERY_TIMEOUT):
+            return slot
+    return None
+
+
+def _release_slot(channel, slot, token):
+    release_slot_script(keys=[slot_key(channel, slot)], args=[token])
+
+
+def _pop_batch(channel, slot):
+    """Move a batch of notifications from the channel's outbox to the slot's processing list, and return them.
+
+    Notifications left in the processing list by a previous job holding the slot are delivered again with the batch.
+    """
+    processing = processing_key(channel, slot)
+    # The processing list has the latest notifications on the left, like the outbox.
+    unacknowledged = redis_connection.lrange(processing, 0, -1)[::-1]
+
+    with redis_connection.pipeline(transaction=False) as pipe:
+        for _ in range(settings.NOTIFICATIONS_BATCH_SIZE - len(unacknowledged)):
+            pipe.rpoplpush(outbox_key(channel), processing)
+        moved = pipe.execute()
+
+    return [json_loads(entry) for entry in unacknowledged + moved if entry is not None]
+
+
+def _acknowledge_batch(channel, slot):
+    redis_connection.delete(processing_key(channel, slot))
+
+
+def coalesce(entries):
+    """Keep only the latest notification of each alert for each subscription.
+
+    Alerts that change state several times before their notifications go out only notify of the state they ended up
+    in, once.
+    """
+    latest = {}
+    for entry in entries:
+        key = (entry["subscription_id"], entry["alert_id"])
+        latest.pop(key, None)
+        latest[key] = entry
+    return list(latest.values())
+
+
+def _schedule_retry(channel, entry):
+    attempts = entry["attempts"] + 1
+    if attempts >= settings.NOTIFICATIONS_MAX_ATTEMPTS:
+        logger.error(
+            "Giving up on notifying subscription %d of alert %d after %d attempts.",
+            entry["subscription_id"],
+            entry["alert_id"],
+            attempts,
+        )
+        return False
+
+    entry = dict(entry, attempts=attempts, channel=channel)
+    retry_at = time.time() + settings.NOTIFICATIONS_RETRY_BACKOFF * 2 ** (attempts - 1)
+    redis_connection.zadd(RETRIES_KEY, {json_dumps(entry): retry_at})
+    return True
+
+
+def _deliver(channel, entries):
+    subscription_ids = {entry["subscription_id"] for entry in entries}
+    alert_ids = {entry["alert_id"] for entry in entries}
+    subscriptions = {
+        s.id: s for s in models.AlertSubscription.query.filter(models.AlertSubscription.id.in_(subscription_ids))
+    }
+    alerts = {a.id: a for a in models.Alert.query.filter(models.Alert.id.in_(alert_ids))}
+
+    for entry in entries:
+        subscription = subscriptions.get(entry["subscription_id"])
+        alert = alerts.get(entry["alert_id"])
+        if subscription is None or alert is None:
+            logger.info("Skipping notification (alert or subscription was deleted).")
+            continue
+
+        destination_type = subscription.destination.type if subscription.destination else "email"
+        started_at = time.time()
+        try:
+            subscription.notify(
+                alert,
+                alert.query_rel,
+                subscription.user,
+                entry["state"],
+                current_app,
+                utils.base_url(alert.query_rel.org),
+                entry["metadata"],
+            )
+        except Exception:
+            logger.exception("Error with processing destination")
+            statsd_client.incr("notifications.{}.failed".format(destination_type))
+            if _schedule_retry(channel, entry):
+                statsd_client.incr("notifications.{}.retried".format(destination_type))
+            else:
+                statsd_client.incr("notifications.{}.dropped".format(destination_type))
+        else:
+            finished_at = time.time()
+            statsd_client.incr("notifications.{}.delivered".format(destination_type))
+            statsd_client.timing(
+                "notifications.{}.delivery".format(destination_type), (finished_at - started_at) * 1000
+            )
+            statsd_client.timing(
+                "notifications.{}.latency".format(destination_type), (finished_at - entry["queued_at"]) * 1000
+            )
+
+
+@job("notifications", timeout=DELIVERY_TIMEOUT)
+def deliver_channel_notifications(channel):
+    """Send a batch of the notifications pending in a channel's outbox.
+
+    Only NOTIFICATIONS_MAX_CONCURRENCY_PER_DESTINATION jobs send to the same channel at a time; the others leave their
+    notifications to the jobs already sending.
+    """
+    token = uuid.uuid4().hex
+    slot = _acquire_slot(channel, token)
+    if slot is None:
+        logger.debug("Channel %s is busy, leaving its notifications to the running jobs.", channel)
+        return
+
+    try:
+        entries = _pop_batch(channel, slot)
+        if entries:
+            _deliver(channel, coalesce(entries))
+            _acknowledge_batch(channel, slot)
+    finally:
+        _release_slot(channel, slot, token)
+
+    if redis_connection.exists(outbox_key(channel)):
+        deliver_channel_notifications.delay(channel)
+
+
+def deliver_notifications():
+    """Requeue notifications due for another attempt or left unacknowledged, and deliver all outboxes with pending
+    notifications."""
+    for member in redis_connection.zrangebyscore(RETRIES_KEY, "-inf", time.time()):
+        # Only the run that removes the retry requeues it.
+        if redis_connection.zrem(RETRIES_KEY, member):
+            entry = json_loads(member)
+            channel = entry.pop("channel")
+            with redis_connection.pipeline(transaction=False) as pipe:
+                pipe.lpush(outbox_key(channel), json_dumps(entry))
+                pipe.sadd(CHANNELS_KEY, channel)
+                pipe.execute()
+
+    for channel in redis_connection.smembers(CHANNELS_KEY):
+        processing_keys = []
+        for slot in range(settings.NOTIFICATIONS_MAX_CONCURRENCY_PER_DESTINATION):
+            processing_keys.append(processing_key(channel, slot))
+            requeue_unacknowledged_script(keys=[slot_key(channel, slot), processing_keys[-1], outbox_key(channel)])
+
+        if redis_connection.exists(outbox_key(channel)):
+            deliver_channel_notifications.delay(channel)
+        else:
+            remove_idle_channel_script(keys=[CHANNELS_KEY, outbox_key(channel)] + processing_keys, args=[channel])
@@ -2,19 +2,21 @@ import signal
 import sys
 import time
 from collections import deque
+from uuid import uuid4
 
-import redis
 from rq import get_current_job
 from rq.exceptions import NoSuchJobError
-from rq.job import JobStatus
 from rq.timeouts import JobTimeoutException
+from rq.utils import as_text
 
-from redash import models, redis_connection, settings
+from redash import models, rq_redis_connection, settings, statsd_client
+from redash.metrics import prometheus
 from redash.query_runner import InterruptException
 from redash.tasks.alerts import check_alerts_for_query
 from redash.tasks.failure_report import track_failure
 from redash.tasks.worker import Job, Queue
 from redash.utils import gen_query_hash, utcnow
+from redash.utils.timing import current_timings, phase, timed_phases
 from redash.worker import get_job_logger
 
 logger = get_job_logger(__name__)
@@ -26,101 +28,140 @@ def _job_lock_id(query_hash, data_source_id):
 
 
 def _unlock(query_hash, data_source_id):
-    redis_connection.delete(_job_lock_id(query_hash, data_source_id))
+    rq_redis_connection.delete(_job_lock_id(query_hash, data_source_id))
+
+
+# How long the placeholder of a job that is being enqueued is kept, if enqueuing it never finishes.
+PENDING_JOB_TTL = 60
+
+# The statuses of jobs that a query's lock keeps other jobs of the query from being enqueued in.
+IS_ACTIVE_JOB = """
+local function is_active_job(key)
+    local status = redis.call('HGET', key, 'status')
+    return status == 'queued' or status == 'started' or status == 'deferred' or status == 'scheduled'
+end
+"""
+
+# Takes a query's lock for a new job, unless the lock points at a job that is still queued or running, in one step, so
+# that concurrent submitters don't race. The new job is then enqueued through its queue; until then, a
+# queued placeholder of it (which expires, in case enqueuing it never finishes) keeps the lock from being taken again.
+#
+# KEYS: the query's lock and the new job's key. ARGV: the lock's TTL, the jobs' keys' prefix, the new job's id and the
+# placeholder's TTL.
+# Returns whether the lock was taken, and the id of the job the lock pointed at (if any).
+LOCK_JOB_SCRIPT = IS_ACTIVE_JOB + """
+local job_id = redis.call('GET', KEYS[1])
+if job_id and is_active_job(ARGV[2] .. job_id) then
+    return {0, job_id}
+end
+
+redis.call('HSET', KEYS[2], 'status', 'queued')
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+redis.call('SET', KEYS[1], ARGV[3], 'EX', ARGV[1])
+return {1, job_id or ''}
+"""
+lock_job_script = rq_redis_connection.register_script(LOCK_JOB_SCRIPT)
+
+# Deletes the locks that still point at the jobs they were found pointing at, unless those are queued or running.
+#
+# KEYS: the locks. ARGV: the jobs' keys' prefix, then the id of the job each lock was found pointing at.
+# Returns the number of locks deleted.
+REMOVE_STALE_LOCKS_SCRIPT = IS_ACTIVE_JOB + """
+local removed = 0
+for i, lock in ipairs(KEYS) do
+    local job_id = ARGV[i + 1]
+    if redis.call('GET', lock) == job_id and not is_active_job(ARGV[1] .. job_id) then
+        removed = removed + redis.call('DEL', lock)
+    end
+end
+return removed
+"""
+remove_stale_locks_script = rq_redis_connection.register_script(REMOVE_STALE_LOCKS_SCRIPT)
+
+
+def _lock_job(lock_id, job_id):
+    locked, locked_job_id = lock_job_script(
+        keys=[lock_id, Job.key_for(job_id)],
+        args=[settings.JOB_EXPIRY_TIME, Job.redis_job_namespace_prefix, job_id, PENDING_JOB_TTL],
+        client=rq_redis_connection,
+    )
+    return bool(locked), as_text(locked_job_id) or None
+
+
+def remove_stale_locks(locks):
+    """Remove the (lock, job id) locks that still point at those jobs, unless they're queued or running. Returns the
+    number of locks removed."""
+    if not locks:
+        return 0
+    return remove_stale_locks_script(
+        keys=[lock for lock, _ in locks],
+        args=[Job.redis_job_namespace_prefix] + [job_id for _, job_id in locks],
+        client=rq_redis_connection,
+    )
 
 
 def enqueue_query(query, data_source, user_id, is_api_key=False, scheduled_query=None, metadata={}):
     query_hash = gen_query_hash(query)
     logger.info("Inserting job for %s with metadata=%s", query_hash, metadata)
-    try_count = 0
-    job = None
 
-    while try_count < 5:
-        try_count += 1
+    if scheduled_query:
+        queue_name = data_source.scheduled_queue_name
+        scheduled_query_id = scheduled_query.id
+    else:
+        queue_name = data_source.queue_name
+        scheduled_query_id = None
 
-        pipe = redis_connection.pipeline()
-        try:
-            pipe.watch(_job_lock_id(query_hash, data_source.id))
-            job_id = pipe.get(_job_lock_id(query_hash, data_source.id))
+    time_limit = settings.dynamic_settings.query_time_limit(scheduled_query, user_id, data_source.org_id)
+    metadata["Queue"] = queue_name
+
+    queue = Queue(queue_name)
+    lock_id = _job_lock_id(query_hash, data_source.id)
+
+    for try_count in range(5):
+        new_job_id = str(uuid4())
+        locked, job_id = _lock_job(lock_id, new_job_id)
+        if locked:
             if job_id:
-                logger.info("[%s] Found existing job: %s", query_hash, job_id)
-                job_complete = None
-                job_cancelled = None
-
-                try:
-                    job = Job.fetch(job_id)
-                    job_exists = True
-                    status = job.get_status()
-                    job_complete = status in [JobStatus.FINISHED, JobStatus.FAILED]
-                    job_cancelled = job.is_cancelled
-
-                    if job_complete:
-                        message = "job found is complete (%s)" % status
-                    elif job_cancelled:
-                        message = "job found has been cancelled"
-                except NoSuchJobError:
-                    message = "job found has expired"
-                    job_exists = False
-
-                lock_is_irrelevant = job_complete or job_cancelled or not job_exists
-
-                if lock_is_irrelevant:
-                    logger.info("[%s] %s, removing lock", query_hash, message)
-                    redis_connection.delete(_job_lock_id(query_hash, data_source.id))
-                    job = None
-
-            if not job:
-                pipe.multi()
-
-                if scheduled_query:
-                    queue_name = data_source.scheduled_queue_name
-                    scheduled_query_id = scheduled_query.id
-                else:
-                    queue_name = data_source.queue_name
-                    scheduled_query_id = None
-
-                time_limit = settings.dynamic_settings.query_time_limit(scheduled_query, user_id, data_source.org_id)
-                metadata["Queue"] = queue_name
-
-                queue = Queue(queue_name)
-                enqueue_kwargs = {
+                logger.info("[%s] Job found is complete, cancelled or has expired: %s", query_hash, job_id)
+
+            job = queue.create_job(
+                execute_query,
+                args=(query, data_source.id, metadata),
+                kwargs={
                     "user_id": user_id,
                     "scheduled_query_id": scheduled_query_id,
                     "is_api_key": is_api_key,
-                    "job_timeout": time_limit,
-                    "failure_ttl": settings.JOB_DEFAULT_FAILURE_TTL,
-                    "meta": {
-                        "data_source_id": data_source.id,
-                        "org_id": data_source.org_id,
-                        "scheduled": scheduled_query_id is not None,
-                        "query_id": metadata.get("query_id"),
-                        "user_id": user_id,
-                    },
-                }
-
-                if not scheduled_query:
-                    enqueue_kwargs["result_ttl"] = settings.JOB_EXPIRY_TIME
-
-                job = queue.enqueue(execute_query, query, data_source.id, metadata, **enqueue_kwargs)
-
-                logger.info("[%s] Created new job: %s", query_hash, job.id)
-                pipe.set(
-                    _job_lock_id(query_hash, data_source.id),
-                    job.id,
-                    settings.JOB_EXPIRY_TIME,
-                )
-                pipe.execute()
-            break
-
-        except redis.WatchError:
-            continue
-        finally:
-            pipe.reset()
+                },
+                timeout=time_limit,
+                result_ttl=None if scheduled_query else settings.JOB_EXPIRY_TIME,
+                failure_ttl=settings.JOB_DEFAULT_FAILURE_TTL,
+                job_id=new_job_id,
+                meta={
+                    "data_source_id": data_source.id,
+                    "org_id": data_source.org_id,
+                    "scheduled": scheduled_query_id is not None,
+                    "query_id": metadata.get("query_id"),
+                    "user_id": user_id,
+                },
+            )
+            with queue.connection.pipeline() as pipeline:
+                job = queue.enqueue_job(job, pipeline=pipeline)
+                # The job replaces its placeholder, so it mustn't expire with it.
+                pipeline.persist(job.key)
+                pipeline.execute()
+            logger.info("[%s] Created new job: %s", query_hash, job.id)
+            return job
 
-    if not job:
-        logger.error("[Manager][%s] Failed adding job for query.", query_hash)
+        try:
+            existing_job = Job.fetch(job_id, connection=queue.connection)
+            logger.info("[%s] Found existing job: %s", query_hash, job_id)
+            return existing_job
+        except NoSuchJobError:
+            # It's still being enqueued, or it expired since; either way, the next attempt finds out.
+            time.sleep(0.1 * (try_count + 1))
 
-    return job
+    logger.error("[Manager][%s] Failed adding job for query.", query_hash)
+    return None
 
 
 def signal_handler(*args):
@@ -177,14 +218,15 @@ class QueryExecutor:
         self.query = query
         self.data_source_id = data_source_id
         self.metadata = metadata
-        self.data_source = self._load_data_source()
-        self.query_id = metadata.get("query_id")
-        self.user = _resolve_user(user_id, is_api_key, metadata.get("query_id"))
-        self.query_model = (
-            models.Query.query.get(self.query_id)
-            if self.query_id and self.query_id != "adhoc"
-            else None
-        )  # fmt: skip
+        with phase("load_data_source"):
+            self.data_source = self._load_data_source()
+            self.query_id = metadata.get("query_id")
+            self.user = _resolve_user(user_id, is_api_key, metadata.get("query_id"))
+            self.query_model = (
+                models.Query.query.get(self.query_id)
+                if self.query_id and self.query_id != "adhoc"
+                else None
+            )  # fmt: skip
 
         # Close DB connection to prevent holding a connection for a long time while the query is executing.
         models.db.session.close()
@@ -195,6 +237,12 @@ class QueryExecutor:
             models.scheduled_queries_executions.update(self.query_model.id)
 
     def run(self):
+        try:
+            return self._run()
+        finally:
+            self._record_timings()
+
+    def _run(self):
         signal.signal(signal.SIGINT, signal_handler)
         started_at = time.time()
 
@@ -205,7 +253,8 @@ class QueryExecutor:
         annotated_query = self._annotate_query(query_runner)
 
         try:
-            data, error = query_runner.run_query(annotated_query, self.user)
+            with phase("execute"):
+                data, error = query_runner.run_query(annotated_query, self.user)
         except Exception as e:
             if isinstance(e, JobTimeoutException):
                 error = TIMEOUT_MESSAGE
@@ -216,14 +265,16 @@ class QueryExecutor:
             logger.warning("Unexpected error while running query:", exc_info=1)
 
         run_time = time.time() - started_at
+        data_length = data and _get_size_iterative(data)
 
         logger.info(
             "job=execute_query query_hash=%s ds_id=%d data_length=%s error=[%s]",
             self.query_hash,
             self.data_source_id,
-            data and _get_size_iterative(data),
+            data_length,
             error,
         )
+        prometheus.record_query_execution(self.data_source.type, run_time, data_length or None)
 
         _unlock(self.query_hash, self.data_source.id)
 
@@ -240,28 +291,81 @@ class QueryExecutor:
                 self.query_model.skip_updated_at = True
                 models.db.session.add(self.query_model)
 
-            query_result = models.QueryResult.store_result(
-                self.data_source.org_id,
-                self.data_source,
-                self.query_hash,
-                self.query,
-                data,
-                run_time,
-                utcnow(),
-            )
+            with phase("store"):
+                query_result = models.QueryResult.store_result(
+                    self.data_source.org_id,
+                    self.data_source,
+                    self.query_hash,
+                    self.query,
+                    data,
+                    run_time,
+                    utcnow(),
+                )
+                models.db.session.flush()
 
-            updated_query_ids = models.Query.update_latest_result(query_result)
+            with phase("update_latest_result"):
+                updated_query_ids = models.Query.update_latest_result(query_result)
 
-            models.db.session.commit()  # make sure that alert sees the latest query result
+            with phase("store"):
+                models.db.session.commit()  # make sure that alert sees the latest query result
             self._log_progress("checking_alerts")
-            for query_id in updated_query_ids:
-                check_alerts_for_query.delay(query_id, self.metadata)
+            with phase("enqueue_alerts"):
+                self._check_alerts(query_result, updated_query_ids)
             self._log_progress("finished")
 
             result = query_result.id
             models.db.session.commit()
             return result
 
+    def _check_alerts(self, query_result, query_ids):
+        if not query_ids:
+            return
+
+        # All the updated queries share the result we have in memory, so evaluate all of their alerts against it in
+        # one go, and leave only the state updates and notifications to the alert checking jobs.
+        alerts = models.Alert.query.filter(models.Alert.query_id.in_(query_ids)).all()
+        try:
+            alert_states = models.Alert.evaluate_batch(alerts, query_result)
+        except Exception:
+            # Alerts that can't be evaluated (e.g. with incomplete options) fail only their alert checking jobs, which
+            # evaluate the alerts on their own without the states evaluated here.
+            logger.exception("Failed evaluating the alerts of queries %s.", query_ids)
+            alert_states = {}
+
+        for query_id in query_ids:
+            query_alerts = [alert for alert in alerts if alert.query_id == query_id]
+            if query_alerts:
+                query_alert_states = {
+                    alert.id: alert_states[alert.id] for alert in query_alerts if alert.id in alert_states
+                }
+                check_alerts_for_query.delay(query_id, self.metadata, query_alert_states)
+
+    def _record_timings(self):
+        timings = current_timings()
+        if not timings:
+            return
+
+        # Recording the timings mustn't get in the way of the query's result (or error).
+        try:
+            self._report_timings(timings)
+        except Exception:
+            logger.exception("Failed recording the timings of query %s.", self.query_hash)
+
+    def _report_timings(self, timings):
+        logger.info(
+            "job=execute_query query_hash=%s ds_id=%d timings=[%s]",
+            self.query_hash,
+            self.data_source.id,
+            " ".join("{}={:.3f}".format(name, duration) for name, duration in timings.items()),
+        )
+        self.job.meta["timings"] = timings
+        self.job.save_meta()
+
+        with statsd_client.pipeline() as pipeline:
+            for name, duration in timings.items():
+                pipeline.timing("query_phases.{}.{}".format(self.data_source.type, name), duration * 1000)
+        prometheus.record_query_phases(self.data_source.type, timings)
+
     def _annotate_query(self, query_runner):
         self.metadata["Job ID"] = self.job.id
         self.metadata["Query Hash"] = self.query_hash
@@ -299,14 +403,15 @@ def execute_query(
     is_api_key=False,
 ):
     try:
-        return QueryExecutor(
-            query,
-            data_source_id,
-            user_id,
-            is_api_key,
-            metadata,
-            scheduled_query_id is not None,
-        ).run()
+        with timed_phases():
+            return QueryExecutor(
+                query,
+                data_source_id,
+                user_id,
+                is_api_key,
+                metadata,
+                scheduled_query_id is not None,
+            ).run()
     except QueryExecutionError as e:
         models.db.session.rollback()
         return e
@@ -2,8 +2,16 @@ import logging
 import time
 
 from rq.timeouts import JobTimeoutException
-
-from redash import models, redis_connection, settings, statsd_client
+from rq.utils import as_text
+
+from redash import (
+    models,
+    redis_connection,
+    rq_redis_connection,
+    settings,
+    statsd_client,
+)
+from redash.models.base import estimated_count
 from redash.models.parameterized_query import (
     InvalidParameterError,
     QueryDetachedFromDataSourceError,
@@ -13,7 +21,7 @@ from redash.tasks.failure_report import track_failure
 from redash.utils import json_dumps, sentry
 from redash.worker import get_job_logger, job
 
-from .execution import enqueue_query
+from .execution import enqueue_query, remove_stale_locks
 
 logger = get_job_logger(__name__)
 
@@ -116,45 +124,110 @@ def refresh_queries():
     logger.info("Done refreshing queries: %s" % status)
 
 
+# The cleanup deletes unused query results in batches, whose size it adapts so that each takes about this long.
+CLEANUP_BATCH_DURATION = 1.0
+CLEANUP_MAX_BATCH_SIZE = 10000
+
+
 def cleanup_query_results():
     """
     Job to cleanup unused query results -- such that no query links to them anymore, and older than
     settings.QUERY_RESULTS_CLEANUP_MAX_AGE (a week by default, so it's less likely to be open in someone's browser and be used).
 
-    Each time the job deletes only settings.QUERY_RESULTS_CLEANUP_COUNT (100 by default) query results so it won't choke
-    the database in case of many such results.
+    When the query results table is partitioned by `retrieved_at`, partitions that only hold such results are dropped.
+    The rest are deleted in batches, in the order of their ids, until there are none left or the job has run for
+    settings.QUERY_RESULTS_CLEANUP_TIME_BUDGET seconds. Batches start at settings.QUERY_RESULTS_CLEANUP_COUNT results,
+    and grow or shrink so that each takes about CLEANUP_BATCH_DURATION, and each is committed on its own so it won't
+    choke the database in case of many such results.
     """
 
     logger.info(
-        "Running query results clean up (removing maximum of %d unused results, that are %d days old or more)",
-        settings.QUERY_RESULTS_CLEANUP_COUNT,
+        "Running query results clean up (removing unused results that are %d days old or more, for up to %d seconds)",
         settings.QUERY_RESULTS_CLEANUP_MAX_AGE,
+        settings.QUERY_RESULTS_CLEANUP_TIME_BUDGET,
     )
 
-    unused_query_results = models.QueryResult.unused(settings.QUERY_RESULTS_CLEANUP_MAX_AGE)
-    deleted_count = models.QueryResult.query.filter(
-        models.QueryResult.id.in_(unused_query_results.limit(settings.QUERY_RESULTS_CLEANUP_COUNT).subquery())
-    ).delete(synchronize_session=False)
+    started_at = time.time()
+    dropped_partitions = models.QueryResult.drop_expired_partitions(settings.QUERY_RESULTS_CLEANUP_MAX_AGE)
     models.db.session.commit()
-    logger.info("Deleted %d unused query results.", deleted_count)
+    if dropped_partitions:
+        logger.info("Dropped unused query results partitions: %s", ", ".join(dropped_partitions))
+
+    batch_size = settings.QUERY_RESULTS_CLEANUP_COUNT
+    deleted_count = 0
+    last_id = 0
+    done = False
+    while not done and time.time() - started_at < settings.QUERY_RESULTS_CLEANUP_TIME_BUDGET:
+        batch_started_at = time.time()
+        deleted = models.QueryResult.delete_unused(settings.QUERY_RESULTS_CLEANUP_MAX_AGE, last_id, batch_size)
+        models.db.session.commit()
+
+        deleted_count += len(deleted)
+        done = len(deleted) < batch_size
+        if deleted:
+            last_id = max(deleted)
+
+        batch_duration = time.time() - batch_started_at
+        if batch_duration < CLEANUP_BATCH_DURATION / 2:
+            batch_size = min(batch_size * 2, CLEANUP_MAX_BATCH_SIZE)
+        elif batch_duration > CLEANUP_BATCH_DURATION:
+            batch_size = max(batch_size // 2, 1)
+
+    # What's left for the next runs, estimated so as not to count the results this job couldn't get to.
+    backlog = 0
+    if not done:
+        unused = models.QueryResult.unused(settings.QUERY_RESULTS_CLEANUP_MAX_AGE)
+        backlog = estimated_count(unused.filter(models.QueryResult.id > last_id))
+
+    status = {
+        "query_results_cleanup_deleted_count": deleted_count,
+        "query_results_cleanup_dropped_partitions": len(dropped_partitions),
+        "query_results_cleanup_backlog": backlog,
+        "last_query_results_cleanup_at": time.time(),
+    }
+    redis_connection.hset("redash:status", mapping=status)
+    logger.info("Deleted %d unused query results, about %d left.", deleted_count, backlog)
+
+
+# remove_ghost_locks scans Redis' keys for locks in batches of about this many keys, and scans up to
+# GHOST_LOCKS_SCAN_LIMIT keys (locks or not) in each run, picking up where the previous run stopped.
+GHOST_LOCKS_SCAN_BATCH_SIZE = 1000
+GHOST_LOCKS_SCAN_LIMIT = 10000
+GHOST_LOCKS_CURSOR_KEY = "redash:ghost_locks:cursor"
 
 
 def remove_ghost_locks():
     """
     Removes query locks that reference a non existing RQ job.
-    """
-    keys = redis_connection.keys("query_hash_job:*")
-    locks = {k: redis_connection.get(k) for k in keys}
-    jobs = list(rq_job_ids())
 
-    count = 0
-
-    for lock, job_id in locks.items():
-        if job_id not in jobs:
-            redis_connection.delete(lock)
-            count += 1
-
-    logger.info("Locks found: {}, Locks removed: {}".format(len(locks), count))
+    Locks expire after settings.JOB_EXPIRY_TIME, are removed when their job finishes, and enqueue_query ignores the ones
+    whose job isn't queued or running anymore, so this only frees the memory of the ones left behind sooner.
+    """
+    cursor = int(rq_redis_connection.get(GHOST_LOCKS_CURSOR_KEY) or 0)
+    jobs = None
+    scanned = 0
+    found = 0
+    removed = 0
+
+    while True:
+        cursor, keys = rq_redis_connection.scan(cursor, match="query_hash_job:*", count=GHOST_LOCKS_SCAN_BATCH_SIZE)
+        if keys:
+            job_ids = [as_text(job_id) for job_id in rq_redis_connection.mget(keys)]
+            if jobs is None:
+                jobs = set(rq_job_ids())
+            # Jobs enqueued after listing them aren't in `jobs`, so the locks are only removed if their job still
+            # isn't queued or running when they are.
+            ghosts = [(key, job_id) for key, job_id in zip(keys, job_ids) if job_id and job_id not in jobs]
+            removed += remove_stale_locks(ghosts)
+            found += len(keys)
+
+        # SCAN's COUNT bounds the keys it looks at (rather than the locks it finds), so count those.
+        scanned += GHOST_LOCKS_SCAN_BATCH_SIZE
+        if cursor == 0 or scanned >= GHOST_LOCKS_SCAN_LIMIT:
+            break
+
+    rq_redis_connection.set(GHOST_LOCKS_CURSOR_KEY, cursor)
+    logger.info("Locks found: {}, Locks removed: {}".format(found, removed))
 
 
 @job("schemas", timeout=settings.SCHEMAS_REFRESH_TIMEOUT)
@@ -8,7 +8,15 @@ from rq_scheduler import Scheduler
 
 from redash import rq_redis_connection, settings
 from redash.tasks.failure_report import send_aggregated_errors
-from redash.tasks.general import sync_user_details, version_check
+from redash.tasks.general import (
+    flush_events,
+    manage_event_partitions,
+    refresh_database_status,
+    refresh_tag_counts,
+    sync_user_details,
+    version_check,
+)
+from redash.tasks.notifications import deliver_notifications
 from redash.tasks.queries import (
     cleanup_query_results,
     empty_schedules,
@@ -59,7 +67,7 @@ def periodic_job_definitions():
         {"func": refresh_queries, "timeout": 600, "interval": 30, "result_ttl": 600},
         {
             "func": remove_ghost_locks,
-            "interval": timedelta(minutes=1),
+            "interval": timedelta(minutes=5),
             "result_ttl": 600,
         },
         {"func": empty_schedules, "interval": timedelta(minutes=60)},
@@ -73,6 +81,11 @@ def periodic_job_definitions():
             "interval": timedelta(minutes=1),
             "result_ttl": 600,
         },
+        {"func": deliver_notifications, "interval": 30, "result_ttl": 600},
+        {"func": flush_events, "interval": settings.EVENTS_FLUSH_INTERVAL, "result_ttl": 600},
+        {"func": manage_event_partitions, "interval": timedelta(hours=1)},
+        {"func": refresh_tag_counts, "interval": settings.TAG_COUNTS_REFRESH_INTERVAL, "result_ttl": 600},
+        {"func": refresh_database_status, "interval": settings.STATUS_REFRESH_INTERVAL, "result_ttl": 600},
         {
             "func": send_aggregated_errors,
             "interval": timedelta(minutes=settings.SEND_FAILURE_EMAIL_INTERVAL),
@@ -14,6 +14,7 @@ from rq.worker import (
 )
 
 from redash import statsd_client
+from redash.metrics import prometheus
 
 # HerokuWorker does not work in OSX https://github.com/getredash/redash/issues/5413
 if sys.platform == "darwin":
@@ -71,6 +72,22 @@ class StatsdRecordingWorker(BaseWorker):
                 statsd_client.incr("rq.jobs.failed.{}".format(queue.name))
 
 
+class PrometheusRecordingWorker(BaseWorker):
+    """
+    RQ Worker Mixin that records how long jobs waited in their queues, and marks its work horses so that their
+    metrics are kept together (see redash.metrics.prometheus)
+    """
+
+    def execute_job(self, job, queue):
+        if job.enqueued_at is not None:
+            prometheus.record_queue_wait(queue.name, (utcnow() - job.enqueued_at).total_seconds())
+        super().execute_job(job, queue)
+
+    def main_work_horse(self, job, queue):
+        prometheus.mark_work_horse(os.getppid())
+        super().main_work_horse(job, queue)
+
+
 class HardLimitingWorker(BaseWorker):
     """
     RQ's work horses enforce time limits by setting a timed alarm and stopping jobs
@@ -191,7 +208,7 @@ class HardLimitingWorker(BaseWorker):
             self.handle_job_failure(job, queue=queue, exc_string=exc_string)
 
 
-class RedashWorker(StatsdRecordingWorker, HardLimitingWorker):
+class RedashWorker(StatsdRecordingWorker, PrometheusRecordingWorker, HardLimitingWorker):
     queue_class = RedashQueue
 
 
@@ -24,6 +24,11 @@ from redash import settings
 
 from .human_time import parse_human_time
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 COMMENTS_REGEX = re.compile(r"/\*.*?\*/")
 WRITER_ENCODING = os.environ.get("REDASH_CSV_WRITER_ENCODING", "utf-8")
 WRITER_ERRORS = os.environ.get("REDASH_CSV_WRITER_ERRORS", "strict")
@@ -71,48 +76,108 @@ def generate_token(length):
     return "".join(rand.choice(chars) for x in range(length))
 
 
-class JSONEncoder(json.JSONEncoder):
-    """Adapter for `json.dumps`."""
+def _encode_query(encoder, o):
+    return list(o)
+
+
+def _encode_decimal(encoder, o):
+    return float(o)
+
+
+def _encode_as_str(encoder, o):
+    return str(o)
+
+
+# See "Date Time String Format" in the ECMA-262 specification.
+def _encode_datetime(encoder, o):
+    result = o.isoformat()
+    if o.microsecond:
+        result = result[:23] + result[26:]
+    if result.endswith("+00:00"):
+        result = result[:-6] + "Z"
+    return result
+
+
+def _encode_date(encoder, o):
+    return o.isoformat()
+
+
+def _encode_time(encoder, o):
+    if o.utcoffset() is not None:
+        raise ValueError("JSON can't represent timezone-aware times.")
+    result = o.isoformat()
+    if o.microsecond:
+        result = result[:12]
+    return result
+
+
+def _encode_binary(encoder, o):
+    return binascii.hexlify(o).decode()
+
+
+# Order matters: the first matching entry wins (datetime.datetime is a subclass of datetime.date).
+_builtin_json_encoders = (
+    (Query, _encode_query),
+    (decimal.Decimal, _encode_decimal),
+    ((datetime.timedelta, uuid.UUID), _encode_as_str),
+    (datetime.datetime, _encode_datetime),
+    (datetime.date, _encode_date),
+    (datetime.time, _encode_time),
+    ((memoryview, bytes), _encode_binary),
+)
+
+# Returned by a cached encoder when it can't handle the given value.
+_UNHANDLED = object()
+
+# Hooks registered by query runners (their `custom_json_encoder` class method). A hook is called as `hook(encoder, o)`
+# and returns a falsy value when it doesn't handle `o`.
+_custom_json_encoders = []
+
+# type -> encoding function, filled lazily by `JSONEncoder.default` as it meets new types.
+_json_encoders_by_type = {}
+
+
+def _custom_json_encoder(hook):
+    def encode(encoder, o):
+        result = hook(encoder, o)
+        return result if result else _UNHANDLED
+
+    return encode
 
-    def __init__(self, **kwargs):
-        from redash.query_runner import query_runners
 
-        self.encoders = [r.custom_json_encoder for r in query_runners.values() if hasattr(r, "custom_json_encoder")]
-        super().__init__(**kwargs)
+def register_json_encoder(hook):
+    """Register a `custom_json_encoder` hook to be used by `JSONEncoder` for types it doesn't know about."""
+    if hook not in _custom_json_encoders:
+        _custom_json_encoders.append(hook)
+        _json_encoders_by_type.clear()
+
+
+class JSONEncoder(json.JSONEncoder):
+    """Adapter for `json.dumps`.
+
+    The function used to encode a type is resolved once (custom hooks first, then the builtin encoders) and cached by
+    type, so encoding a value doesn't require trying every registered hook.
+    """
 
     def default(self, o):
-        for encoder in self.encoders:
-            result = encoder(self, o)
+        encode = _json_encoders_by_type.get(type(o))
+        if encode is not None:
+            result = encode(self, o)
+            if result is not _UNHANDLED:
+                return result
+
+        for hook in _custom_json_encoders:
+            result = hook(self, o)
             if result:
+                _json_encoders_by_type[type(o)] = _custom_json_encoder(hook)
                 return result
-        if isinstance(o, Query):
-            result = list(o)
-        elif isinstance(o, decimal.Decimal):
-            result = float(o)
-        elif isinstance(o, (datetime.timedelta, uuid.UUID)):
-            result = str(o)
-        # See "Date Time String Format" in the ECMA-262 specification.
-        elif isinstance(o, datetime.datetime):
-            result = o.isoformat()
-            if o.microsecond:
-                result = result[:23] + result[26:]
-            if result.endswith("+00:00"):
-                result = result[:-6] + "Z"
-        elif isinstance(o, datetime.date):
-            result = o.isoformat()
-        elif isinstance(o, datetime.time):
-            if o.utcoffset() is not None:
-                raise ValueError("JSON can't represent timezone-aware times.")
-            result = o.isoformat()
-            if o.microsecond:
-                result = result[:12]
-        elif isinstance(o, memoryview):
-            result = binascii.hexlify(o).decode()
-        elif isinstance(o, bytes):
-            result = binascii.hexlify(o).decode()
-        else:
-            result = super().default(o)
-        return result
+
+        for types, encode in _builtin_json_encoders:
+            if isinstance(o, types):
+                _json_encoders_by_type[type(o)] = encode
+                return encode(self, o)
+
+        return super().default(o)
 
 
 def json_loads(data, *args, **kwargs):
@@ -132,14 +197,56 @@ def _sanitize_data(data):
     return data
 
 
+def _is_out_of_range_float_error(e):
+    return str(e).startswith("Out of range float values are not JSON compliant")
+
+
+COMPACT_SEPARATORS = (",", ":")
+
+if orjson is not None:
+    # orjson renders NaN and Inf as null on its own, and the passthrough options hand dates and dataclasses over to
+    # `JSONEncoder.default` so they get the same representation as with the standard library encoder.
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+    _orjson_default = JSONEncoder().default
+
+
+def _use_fast_json_dumps():
+    return orjson is not None and settings.JSON_FAST_ENCODER_ENABLED
+
+
 def json_dumps(data, *args, **kwargs):
     """A custom JSON dumping function which passes all parameters to the
-    json.dumps function."""
+    json.dumps function.
+
+    NaN, Inf and -Inf are rendered as null. The data is first encoded as is (with `allow_nan=False`), and only when
+    the encoder rejects a non-finite float do we fall back to building a sanitized copy, so the common case of clean
+    data doesn't pay for copying the whole payload.
+
+    Calls asking for compact output (`separators=COMPACT_SEPARATORS` and no other options) are served by orjson when
+    it's installed and `REDASH_JSON_FAST_ENCODER_ENABLED` isn't turned off.
+    """
+    if not args and kwargs == {"separators": COMPACT_SEPARATORS} and _use_fast_json_dumps():
+        try:
+            return orjson.dumps(data, default=_orjson_default, option=_ORJSON_OPTIONS).decode("utf-8")
+        except orjson.JSONEncodeError:
+            # Values orjson can't handle (e.g. integers over 64 bit or invalid unicode) go through the standard
+            # encoder, which also raises the same errors callers would get without orjson.
+            pass
+
     kwargs.setdefault("cls", JSONEncoder)
     kwargs.setdefault("ensure_ascii", False)
     # Float value nan or inf in Python should be render to None or null in json.
     # Using allow_nan = True will make Python render nan as NaN, leading to parse error in front-end
     kwargs.setdefault("allow_nan", False)
+    if kwargs["allow_nan"]:
+        return json.dumps(_sanitize_data(data), *args, **kwargs)
+
+    try:
+        return json.dumps(data, *args, **kwargs)
+    except ValueError as e:
+        if not _is_out_of_range_float_error(e):
+            raise
+
     return json.dumps(_sanitize_data(data), *args, **kwargs)
 
 
@@ -0,0 +1,80 @@
+import decimal
+import math
+import numbers
+
+from redash.utils import json_dumps
+
+# Columns with more distinct values than this have no distinct_count, so that counting them doesn't keep that many
+# values in memory.
+DISTINCT_COUNT_LIMIT = 10000
+
+
+def _is_number(value):
+    return isinstance(value, numbers.Number) and not isinstance(value, bool)
+
+
+def _has_nul(value):
+    # Postgres' JSONB can't store strings with NUL characters, including those in lists and dictionaries.
+    return "\\u0000" in json_dumps(value)
+
+
+def _column_stats(values):
+    null_count = 0
+    non_null = []
+    for value in values:
+        if value is None or (isinstance(value, float) and not math.isfinite(value)):
+            null_count += 1
+        else:
+            non_null.append(value)
+
+    stats = {"null_count": null_count}
+    if not non_null:
+        return stats
+
+    try:
+        distinct = set()
+        for value in non_null:
+            distinct.add(value)
+            if len(distinct) > DISTINCT_COUNT_LIMIT:
+                break
+        else:
+            stats["distinct_count"] = len(distinct)
+    except TypeError:
+        # Unhashable values (lists and dicts returned by document stores).
+        pass
+
+    if all(_is_number(v) for v in non_null):
+        total = math.fsum(float(v) if isinstance(v, decimal.Decimal) else v for v in non_null)
+        stats["min"] = min(non_null)
+        stats["max"] = max(non_null)
+        stats["sum"] = total
+        stats["mean"] = total / len(non_null)
+    else:
+        value_type = type(non_null[0])
+        if all(type(v) is value_type for v in non_null):
+            try:
+                minimum, maximum = min(non_null), max(non_null)
+            except TypeError:
+                # The type doesn't support ordering.
+                pass
+            else:
+                if not _has_nul(minimum) and not _has_nul(maximum):
+                    stats["min"] = minimum
+                    stats["max"] = maximum
+
+    return stats
+
+
+def compute_column_stats(data):
+    """Compute per-column statistics of a query result's data.
+
+    Returns a dictionary keyed by column name, with `null_count` for every column, `distinct_count` when the values are
+    hashable and there are at most DISTINCT_COUNT_LIMIT of them, `min` and `max` when all values are of the same
+    (ordered) type or numeric (unless they contain NUL characters), and `sum` and `mean` for numeric columns. NaN and
+    Inf are counted as nulls, as they are stored as null.
+    """
+    if not data or not data.get("columns"):
+        return None
+
+    rows = data.get("rows") or []
+    return {column["name"]: _column_stats([row.get(column["name"]) for row in rows]) for column in data["columns"]}
@@ -0,0 +1,15 @@
+from flask import has_request_context, request
+
+CACHES_KEY = "redash.request_caches"
+
+
+def request_cache(name):
+    """Return the dictionary named `name` that caches values for the rest of the current request.
+
+    The caches live in the request's WSGI environment, so they're gone once the request is over. Outside of a request
+    there's nothing to scope them to, and a new (empty) dictionary is returned every time.
+    """
+    if not has_request_context():
+        return {}
+
+    return request.environ.setdefault(CACHES_KEY, {}).setdefault(name, {})
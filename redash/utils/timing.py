@@ -0,0 +1,64 @@
+"""
+Timing of the phases of a piece of work (like executing a query), to tell where its time goes.
+
+Code marks its phases with `with phase("name"):`, which does nothing unless it runs within `timed_phases()`. The time
+of a phase excludes the time of the phases nested in it, so that the timings add up to the time spent in phases, and
+the time of phases with the same name adds up.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# The timings (phase name to seconds) being recorded, and the time of the phases nested in each running phase.
+_current = ContextVar("timed_phases", default=None)
+
+
+@contextmanager
+def timed_phases():
+    """Record the timings of the phases within the block, into the dictionary it yields."""
+    timings = {}
+    token = _current.set((timings, []))
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def current_timings():
+    """Return the timings being recorded, or None outside of `timed_phases()`."""
+    current = _current.get()
+    return current[0] if current is not None else None
+
+
+def add_timings(timings):
+    """Add timings recorded elsewhere (like in another thread) to the ones being recorded, as phases nested in the
+    running phase."""
+    current = _current.get()
+    if current is None:
+        return
+
+    current_timings, nested = current
+    for name, duration in timings.items():
+        current_timings[name] = current_timings.get(name, 0.0) + duration
+    if nested:
+        nested[-1] += sum(timings.values())
+
+
+@contextmanager
+def phase(name):
+    current = _current.get()
+    if current is None:
+        yield
+        return
+
+    timings, nested = current
+    nested.append(0.0)
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started_at
+        timings[name] = timings.get(name, 0.0) + duration - nested.pop()
+        if nested:
+            nested[-1] += duration
@@ -7,7 +7,7 @@ from rq.decorators import job as rq_job
 from redash import rq_redis_connection, settings
 from redash.tasks.worker import Queue as RedashQueue
 
-default_operational_queues = ["periodic", "emails", "default"]
+default_operational_queues = ["periodic", "emails", "default", "notifications"]
 default_query_queues = ["scheduled_queries", "queries", "schemas"]
 default_queues = default_operational_queues + default_query_queues
 
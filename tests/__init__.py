@@ -2,8 +2,11 @@ import datetime
 import logging
 import os
 from contextlib import contextmanager
+from types import SimpleNamespace
 from unittest import TestCase
 
+from sqlalchemy import event
+
 os.environ["REDASH_REDIS_URL"] = os.environ.get("REDASH_REDIS_URL", "redis://localhost:6379/0").replace("/0", "/5")
 # Use different url for RQ to avoid DB being cleaned up:
 os.environ["RQ_REDIS_URL"] = os.environ.get("REDASH_REDIS_URL", "redis://localhost:6379/0").replace("/5", "/6")
@@ -18,9 +21,9 @@ os.environ["REDASH_RATELIMIT_ENABLED"] = "true"
 
 os.environ["REDASH_ENFORCE_CSRF"] = "false"
 
-from redash import limiter, redis_connection  # noqa: E402
+from redash import limiter, redis_connection, rq_redis_connection  # noqa: E402
 from redash.app import create_app  # noqa: E402
-from redash.models import db  # noqa: E402
+from redash.models import db, principals  # noqa: E402
 from redash.utils import json_dumps  # noqa: E402
 from tests.factories import Factory, user_factory  # noqa: E402
 
@@ -43,6 +46,21 @@ def authenticated_user(c, user=None):
     yield user
 
 
+@contextmanager
+def count_queries():
+    """Count the SQL statements executed in Redash's database within the block."""
+    counter = SimpleNamespace(count=0)
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        counter.count += 1
+
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        yield counter
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+
+
 class BaseTestCase(TestCase):
     def setUp(self):
         self.app = create_app()
@@ -62,6 +80,8 @@ class BaseTestCase(TestCase):
         db.get_engine(self.app).dispose()
         self.app_ctx.pop()
         redis_connection.flushdb()
+        rq_redis_connection.flushdb()
+        principals.invalidate_all_principals()
 
     def make_request(
         self,
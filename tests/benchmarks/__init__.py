@@ -0,0 +1,22 @@
+import os
+import time
+from contextlib import contextmanager
+
+import pytest
+
+# Benchmarks are slow and their numbers are only meaningful on a quiet machine, so they don't run as part of the
+# regular test suite. Run them with: REDASH_RUN_BENCHMARKS=true pytest tests/benchmarks -s
+benchmark = pytest.mark.skipif(
+    os.environ.get("REDASH_RUN_BENCHMARKS", "false").lower() not in ("true", "1", "yes"),
+    reason="benchmarks are enabled with REDASH_RUN_BENCHMARKS",
+)
+
+
+@contextmanager
+def timed(name, results=None):
+    started_at = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - started_at
+    if results is not None:
+        results[name] = elapsed
+    print("{}: {:.3f}s".format(name, elapsed))
@@ -0,0 +1,76 @@
+import datetime
+import json
+from unittest import TestCase
+
+import mock
+
+from redash.utils import (
+    COMPACT_SEPARATORS,
+    JSONEncoder,
+    _sanitize_data,
+    json_dumps,
+    json_loads,
+)
+from tests.benchmarks import benchmark, timed
+
+
+def _large_result(rows=200000, with_nan=False):
+    now = datetime.datetime(2024, 1, 1, 12, 30)
+    return {
+        "columns": [
+            {"name": "id", "type": "integer"},
+            {"name": "value", "type": "float"},
+            {"name": "name", "type": "string"},
+            {"name": "created_at", "type": "datetime"},
+        ],
+        "rows": [
+            {
+                "id": i,
+                "value": float("nan") if with_nan and i % 1000 == 0 else i * 1.5,
+                "name": "row {}".format(i),
+                "created_at": now,
+            }
+            for i in range(rows)
+        ],
+    }
+
+
+def _sanitize_and_dump(data):
+    return json.dumps(_sanitize_data(data), cls=JSONEncoder, ensure_ascii=False, allow_nan=False)
+
+
+@benchmark
+class TestJsonDumpsBenchmark(TestCase):
+    def test_large_result_without_nan(self):
+        data = _large_result()
+        results = {}
+
+        with timed("sanitize + dumps", results):
+            expected = _sanitize_and_dump(data)
+        with timed("json_dumps", results):
+            actual = json_dumps(data)
+
+        self.assertEqual(json_loads(expected), json_loads(actual))
+        self.assertLess(results["json_dumps"], results["sanitize + dumps"])
+
+    def test_large_result_with_nan(self):
+        data = _large_result(with_nan=True)
+
+        with timed("sanitize + dumps"):
+            expected = _sanitize_and_dump(data)
+        with timed("json_dumps"):
+            actual = json_dumps(data)
+
+        self.assertEqual(json_loads(expected), json_loads(actual))
+
+    def test_large_result_standard_encoder(self):
+        data = _large_result()
+        results = {}
+
+        with timed("json_dumps (fast encoder)", results):
+            fast = json_dumps(data, separators=COMPACT_SEPARATORS)
+        with mock.patch("redash.utils._use_fast_json_dumps", return_value=False):
+            with timed("json_dumps (standard encoder)", results):
+                standard = json_dumps(data, separators=COMPACT_SEPARATORS)
+
+        self.assertEqual(json_loads(fast), json_loads(standard))
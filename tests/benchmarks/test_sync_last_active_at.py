@@ -0,0 +1,65 @@
+import time
+
+from redash import redis_connection
+from redash.models import User, db
+from redash.models.users import LAST_ACTIVE_KEY, sync_last_active_at
+from redash.utils import dt_from_timestamp
+from tests import BaseTestCase
+from tests.benchmarks import benchmark, timed
+
+
+def _sync_one_by_one():
+    # What sync_last_active_at used to do: a few round trips to Redis and a SELECT per user.
+    for user_id in redis_connection.hkeys(LAST_ACTIVE_KEY):
+        timestamp = redis_connection.hget(LAST_ACTIVE_KEY, user_id)
+        user = User.query.filter(User.id == user_id).first()
+        if user:
+            user.active_at = dt_from_timestamp(timestamp)
+        redis_connection.hdel(LAST_ACTIVE_KEY, user_id)
+    db.session.commit()
+
+
+@benchmark
+class TestSyncLastActiveAtBenchmark(BaseTestCase):
+    users_count = 10000
+
+    def setUp(self):
+        super(TestSyncLastActiveAtBenchmark, self).setUp()
+        org = self.factory.org
+        db.session.execute(
+            User.__table__.insert(),
+            [
+                {
+                    "org_id": org.id,
+                    "name": "User {}".format(i),
+                    "email": "user{}@example.com".format(i),
+                    "group_ids": [org.default_group.id],
+                    "details": {},
+                }
+                for i in range(self.users_count)
+            ],
+        )
+        db.session.commit()
+        self.user_ids = [user_id for user_id, in db.session.query(User.id)]
+
+    def mark_active(self):
+        now = int(time.time())
+        redis_connection.hset(LAST_ACTIVE_KEY, mapping={user_id: now for user_id in self.user_ids})
+        return dt_from_timestamp(now)
+
+    def test_sync_10k_users(self):
+        results = {}
+
+        self.mark_active()
+        with timed("one by one", results):
+            _sync_one_by_one()
+
+        active_at = self.mark_active()
+        with timed("bulk", results):
+            sync_last_active_at()
+
+        self.assertEqual(
+            len(self.user_ids),
+            User.query.filter(User.active_at == active_at).count(),
+        )
+        self.assertLess(results["bulk"], results["one by one"])
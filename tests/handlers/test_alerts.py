@@ -122,6 +122,17 @@ class TestAlertListGet(BaseTestCase):
         self.assertIn(alert.id, alert_ids)
         self.assertNotIn(alert2.id, alert_ids)
 
+    def test_pages_with_cursor(self):
+        alerts = [self.factory.create_alert() for _ in range(3)]
+
+        rv = self.make_request("get", "/api/alerts?page_size=2&cursor=")
+        ids = [a["id"] for a in rv.json["results"]]
+        rv = self.make_request("get", "/api/alerts?page_size=2&cursor={}".format(rv.json["next_cursor"]))
+        ids.extend(a["id"] for a in rv.json["results"])
+
+        self.assertIsNone(rv.json["next_cursor"])
+        self.assertEqual(ids, [a.id for a in reversed(alerts)])
+
 
 class TestAlertListPost(BaseTestCase):
     def test_returns_200_if_has_access_to_query(self):
@@ -2,7 +2,7 @@ from redash.models import AccessPermission, ApiKey, Dashboard, db
 from redash.permissions import ACCESS_TYPE_MODIFY
 from redash.serializers import serialize_dashboard
 from redash.utils import json_loads
-from tests import BaseTestCase
+from tests import BaseTestCase, authenticate_request, count_queries
 
 
 class TestDashboardListResource(BaseTestCase):
@@ -44,6 +44,17 @@ class TestDashboardListGetResource(BaseTestCase):
         assert len(rv.json["results"]) == 2
         assert set([result["id"] for result in rv.json["results"]]) == set([d1.id, d2.id])
 
+    def test_pages_with_cursor(self):
+        dashboards = [self.factory.create_dashboard(name="Sales {}".format(i)) for i in range(3)]
+
+        rv = self.make_request("get", "/api/dashboards?page_size=2&cursor=")
+        ids = [result["id"] for result in rv.json["results"]]
+        rv = self.make_request("get", "/api/dashboards?page_size=2&cursor={}".format(rv.json["next_cursor"]))
+        ids.extend(result["id"] for result in rv.json["results"])
+
+        self.assertIsNone(rv.json["next_cursor"])
+        self.assertEqual(ids, [d.id for d in reversed(dashboards)])
+
 
 class TestDashboardResourceGet(BaseTestCase):
     def test_get_dashboard(self):
@@ -82,10 +93,65 @@ class TestDashboardResourceGet(BaseTestCase):
         self.assertTrue(rv.json["widgets"][0]["restricted"])
         self.assertNotIn("restricted", rv.json["widgets"][1])
 
+    def test_runs_the_same_number_of_sql_queries_for_any_number_of_widgets(self):
+        dashboards = []
+        for widgets_count in (1, 5):
+            dashboard = self.factory.create_dashboard()
+            for _ in range(widgets_count):
+                query = self.factory.create_query(user=self.factory.create_user())
+                vis = self.factory.create_visualization(query_rel=query)
+                self.factory.create_widget(visualization=vis, dashboard=dashboard)
+            dashboards.append(dashboard.id)
+        db.session.commit()
+        self.make_request("get", "/api/dashboards/{0}".format(dashboards[0]))
+
+        counts = []
+        for dashboard_id in dashboards:
+            db.session.expunge_all()
+            with count_queries() as counter:
+                rv = self.make_request("get", "/api/dashboards/{0}".format(dashboard_id))
+            self.assertEqual(200, rv.status_code)
+            counts.append(counter.count)
+
+        self.assertGreater(counts[0], 0)
+        self.assertEqual(counts[0], counts[1])
+
     def test_get_non_existing_dashboard(self):
         rv = self.make_request("get", "/api/dashboards/-1")
         self.assertEqual(rv.status_code, 404)
 
+    def test_returns_not_modified_for_matching_etag(self):
+        dashboard = self.factory.create_dashboard()
+        rv = self.make_request("get", "/api/dashboards/{0}".format(dashboard.id))
+        etag = rv.headers["ETag"]
+
+        rv = self.get_request(
+            "/api/dashboards/{0}".format(dashboard.id),
+            org=self.factory.org,
+            headers={"If-None-Match": etag},
+        )
+        self.assertEqual(rv.status_code, 304)
+        self.assertEqual(rv.headers["ETag"], etag)
+        self.assertEqual(rv.data, b"")
+
+    def test_etag_changes_when_widgets_change(self):
+        dashboard = self.factory.create_dashboard()
+        rv = self.make_request("get", "/api/dashboards/{0}".format(dashboard.id))
+        etag = rv.headers["ETag"]
+
+        self.factory.create_widget(dashboard=dashboard)
+        db.session.commit()
+
+        authenticate_request(self.client, self.factory.user)
+        rv = self.get_request(
+            "/api/dashboards/{0}".format(dashboard.id),
+            org=self.factory.org,
+            headers={"If-None-Match": etag},
+        )
+        self.assertEqual(rv.status_code, 200)
+        self.assertNotEqual(rv.headers["ETag"], etag)
+        self.assertEqual(len(rv.json["widgets"]), 1)
+
 
 class TestDashboardResourcePost(BaseTestCase):
     def test_update_dashboard(self):
@@ -2,6 +2,9 @@ import json
 import textwrap
 from unittest import mock
 
+import pytest
+
+from redash.destinations import DeliveryError
 from redash.destinations.asana import Asana
 from redash.destinations.datadog import Datadog
 from redash.destinations.discord import Discord
@@ -222,7 +225,7 @@ def test_slack_notify_calls_requests_post():
     new_state = Alert.TRIGGERED_STATE
     destination = Slack(options)
 
-    with mock.patch("redash.destinations.slack.requests.post") as mock_post:
+    with mock.patch.object(Slack, "post") as mock_post:
         mock_response = mock.Mock()
         mock_response.status_code = 204
         mock_post.return_value = mock_response
@@ -518,3 +521,15 @@ def test_datadog_notify_calls_requests_post():
         )
 
         assert mock_response.status_code == 202
+
+
+def test_destination_post_raises_delivery_error_when_it_should_be_retried():
+    destination = Slack({"url": "https://slack.com/api/api.test"})
+
+    with mock.patch("redash.destinations.http_session") as http_session:
+        http_session.return_value.post.return_value = mock.Mock(status_code=503)
+        with pytest.raises(DeliveryError):
+            destination.post("https://slack.com/api/api.test", data="{}", timeout=5.0)
+
+        http_session.return_value.post.return_value = mock.Mock(status_code=404)
+        assert destination.post("https://slack.com/api/api.test", data="{}", timeout=5.0).status_code == 404
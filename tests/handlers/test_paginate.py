@@ -1,9 +1,12 @@
 from unittest import TestCase
 
-from mock import MagicMock
+from mock import MagicMock, patch
+from sqlalchemy import nullslast
 from werkzeug.exceptions import BadRequest
 
+from redash import models, settings
 from redash.handlers.base import paginate
+from tests import BaseTestCase
 
 
 class DummyResults:
@@ -33,3 +36,102 @@ class TestPaginate(TestCase):
     def test_raises_error_for_bad_page_size(self):
         self.assertRaises(BadRequest, lambda: paginate(self.query_set, 1, 251, lambda x: x))
         self.assertRaises(BadRequest, lambda: paginate(self.query_set, 1, -1, lambda x: x))
+
+
+class TestPaginateWithCursor(BaseTestCase):
+    def setUp(self):
+        super(TestPaginateWithCursor, self).setUp()
+        self.queries = [self.factory.create_query(name="query {}".format(i % 3)) for i in range(7)]
+        # A NULL in the middle of the order, which NULLS LAST puts at the end.
+        self.queries[3].schedule = None
+        models.db.session.commit()
+
+    def paginate_all(self, query_set, page_size=2):
+        pages = []
+        cursor = ""
+        while cursor is not None:
+            self.assertLess(len(pages), 20, "The cursor doesn't advance.")
+            page = paginate(query_set, None, page_size, lambda q: q.id, cursor=cursor)
+            pages.append(page["results"])
+            cursor = page["next_cursor"]
+        return pages
+
+    def test_pages_through_all_the_results_in_order(self):
+        query_set = models.Query.query.order_by(models.Query.name.desc())
+        expected = [q.id for q in sorted(self.queries, key=lambda q: (q.name, q.id), reverse=True)]
+
+        pages = self.paginate_all(query_set)
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_orders_by_id_when_there_is_no_order(self):
+        pages = self.paginate_all(models.Query.query, page_size=3)
+        self.assertEqual(sum(pages, []), sorted([q.id for q in self.queries], reverse=True))
+
+    def test_pages_through_nulls(self):
+        self.queries[1].description = None
+        self.queries[4].description = None
+        models.db.session.commit()
+        query_set = models.Query.query.order_by(nullslast(models.Query.description.asc()))
+        expected = [
+            q.id
+            for q in models.Query.query.order_by(nullslast(models.Query.description.asc()), models.Query.id.desc())
+        ]
+
+        self.assertEqual(sum(self.paginate_all(query_set), []), expected)
+
+    def test_pages_through_rows_created_within_the_same_millisecond(self):
+        created_at = self.queries[0].created_at.replace(microsecond=123000)
+        for i, query in enumerate(self.queries):
+            query.created_at = created_at.replace(microsecond=123000 + i * 100)
+        models.db.session.commit()
+        ids = [q.id for q in self.queries]
+
+        pages = self.paginate_all(models.Query.query.order_by(models.Query.created_at.desc()))
+        self.assertEqual(sum(pages, []), ids[::-1])
+        pages = self.paginate_all(models.Query.query.order_by(models.Query.created_at.asc()))
+        self.assertEqual(sum(pages, []), ids)
+
+    def test_pages_through_search_results_with_tied_ranks(self):
+        for query in self.queries:
+            query.name = "archive"
+        # Matches in descriptions rank 0.2, which isn't exact as a real.
+        queries = [self.factory.create_query(name="report {}".format(i), description="sales") for i in range(5)]
+        queries += [self.factory.create_query(name="sales") for _ in range(3)]
+        models.db.session.commit()
+        query_set = models.Query.search("sales", [self.factory.default_group.id])
+
+        pages = self.paginate_all(query_set)
+
+        self.assertEqual(sorted(sum(pages, [])), sorted(q.id for q in queries))
+        self.assertEqual(sum(pages, []), [q.id for q in query_set.order_by(models.Query.id.desc())])
+
+    def test_raises_error_for_bad_cursor(self):
+        query_set = models.Query.query.order_by(models.Query.name)
+        self.assertRaises(BadRequest, lambda: paginate(query_set, None, 25, lambda x: x, cursor="not a cursor"))
+        cursor = paginate(query_set, None, 1, lambda x: x, cursor="")["next_cursor"]
+        other_order = models.Query.query.order_by(models.Query.name, models.Query.created_at)
+        self.assertRaises(BadRequest, lambda: paginate(other_order, None, 25, lambda x: x, cursor=cursor))
+
+
+class TestEstimatedCount(BaseTestCase):
+    def setUp(self):
+        super(TestEstimatedCount, self).setUp()
+        for _ in range(3):
+            self.factory.create_query()
+        models.db.session.commit()
+
+    def test_counts_results_when_there_are_few(self):
+        page = paginate(models.Query.query, 1, 25, lambda q: q.id, estimate_count=True)
+        self.assertEqual(page["count"], 3)
+        self.assertNotIn("count_is_estimate", page)
+
+    def test_estimates_count_when_there_are_many(self):
+        with patch.object(settings, "PAGINATION_EXACT_COUNT_LIMIT", -1):
+            page = paginate(models.Query.query, 2, 25, lambda q: q.id, estimate_count=True)
+            self.assertTrue(page["count_is_estimate"])
+            self.assertEqual(page["results"], [])
+
+            page = paginate(models.Query.query, 1, 25, lambda q: q.id)
+            self.assertEqual(page["count"], 3)
@@ -251,6 +251,20 @@ class TestQueryListResourceGet(BaseTestCase):
         assert len(rv.json["results"]) == 2
         assert set([result["id"] for result in rv.json["results"]]) == {q1.id, q2.id}
 
+    def test_pages_with_cursor(self):
+        queries = [self.factory.create_query(name="Sales {}".format(i)) for i in range(3)]
+
+        ids = []
+        rv = self.make_request("get", "/api/queries?order=name&page_size=2&cursor=")
+        ids.extend(result["id"] for result in rv.json["results"])
+        self.assertIsNotNone(rv.json["next_cursor"])
+        rv = self.make_request("get", "/api/queries?order=name&page_size=2&cursor={}".format(rv.json["next_cursor"]))
+        ids.extend(result["id"] for result in rv.json["results"])
+
+        self.assertEqual(rv.json["count"], 3)
+        self.assertIsNone(rv.json["next_cursor"])
+        self.assertEqual(ids, [q.id for q in queries])
+
 
 class TestQueryListResourcePost(BaseTestCase):
     def test_create_query(self):
@@ -1,6 +1,8 @@
+import mock
+
 from redash.handlers.query_results import error_messages, run_query
 from redash.models import db
-from tests import BaseTestCase
+from tests import BaseTestCase, authenticate_request
 
 
 class TestRunQuery(BaseTestCase):
@@ -32,6 +34,85 @@ class TestQueryResultsCacheHeaders(BaseTestCase):
         self.assertEqual(404, rv.status_code)
 
 
+class TestQueryResultsJsonResponse(BaseTestCase):
+    def test_returns_stored_data_without_decoding_it(self):
+        data = {"rows": [{"a": 1, "b": "עברית"}], "columns": [{"name": "a"}, {"name": "b"}]}
+        query_result = self.factory.create_query_result(data=data)
+        query = self.factory.create_query(latest_query_data=query_result)
+        db.session.commit()
+        db.session.expunge_all()
+
+        with mock.patch("redash.models.types.json_loads") as json_loads:
+            rv = self.make_request("get", "/api/queries/{}/results/{}.json".format(query.id, query_result.id))
+
+        json_loads.assert_not_called()
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.json["query_result"]["id"], query_result.id)
+        self.assertEqual(rv.json["query_result"]["query_hash"], query_result.query_hash)
+        self.assertEqual(rv.json["query_result"]["data"], data)
+
+    def test_returns_latest_query_result_data(self):
+        query_result = self.factory.create_query_result()
+        query = self.factory.create_query(latest_query_data=query_result)
+
+        rv = self.make_request("get", "/api/queries/{}/results.json".format(query.id))
+
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.json["query_result"]["data"], query_result.data)
+
+
+class TestQueryResultsConditionalRequests(BaseTestCase):
+    def get_with_etag(self, path, etag):
+        authenticate_request(self.client, self.factory.user)
+        return self.get_request(path, org=self.factory.org, headers={"If-None-Match": etag})
+
+    def test_sets_etag_for_result_and_format(self):
+        query_result = self.factory.create_query_result()
+        query = self.factory.create_query(latest_query_data=query_result)
+
+        json_rv = self.make_request("get", "/api/queries/{}/results/{}.json".format(query.id, query_result.id))
+        csv_rv = self.make_request("get", "/api/queries/{}/results/{}.csv".format(query.id, query_result.id))
+        latest_rv = self.make_request("get", "/api/queries/{}/results.json".format(query.id))
+
+        self.assertEqual(json_rv.headers["ETag"], '"query-result-{}-json"'.format(query_result.id))
+        self.assertEqual(csv_rv.headers["ETag"], '"query-result-{}-csv"'.format(query_result.id))
+        self.assertEqual(latest_rv.headers["ETag"], json_rv.headers["ETag"])
+
+    def test_returns_not_modified_without_loading_data(self):
+        query_result = self.factory.create_query_result()
+        query = self.factory.create_query(latest_query_data=query_result)
+        db.session.commit()
+        db.session.expunge_all()
+        path = "/api/queries/{}/results.json".format(query.id)
+
+        with mock.patch("redash.models.types.json_loads") as json_loads:
+            rv = self.get_with_etag(path, '"query-result-{}-json"'.format(query_result.id))
+
+        json_loads.assert_not_called()
+        self.assertEqual(rv.status_code, 304)
+        self.assertEqual(rv.data, b"")
+
+    def test_returns_result_when_etag_doesnt_match(self):
+        old_query_result = self.factory.create_query_result()
+        query_result = self.factory.create_query_result()
+        query = self.factory.create_query(latest_query_data=query_result)
+        path = "/api/queries/{}/results.json".format(query.id)
+
+        rv = self.get_with_etag(path, '"query-result-{}-json"'.format(old_query_result.id))
+
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.json["query_result"]["id"], query_result.id)
+
+    def test_checks_access_before_returning_not_modified(self):
+        ds = self.factory.create_data_source(group=self.factory.create_group())
+        query_result = self.factory.create_query_result(data_source=ds)
+        path = "/api/query_results/{}".format(query_result.id)
+
+        rv = self.get_with_etag(path, '"query-result-{}-json"'.format(query_result.id))
+
+        self.assertEqual(rv.status_code, 403)
+
+
 class TestQueryResultsContentDispositionHeaders(BaseTestCase):
     def test_supports_unicode(self):
         query_result = self.factory.create_query_result()
@@ -137,6 +137,19 @@ class TestUserListGet(BaseTestCase):
         user_ids = self.make_request_and_return_ids("get", "/api/users")
         self.assertUsersListMatches(user_ids, [user1.id, user2.id], [user3.id])
 
+    def test_estimates_count_of_large_search_results(self):
+        self.factory.create_user(name="Sales One")
+        self.factory.create_user(name="Sales Two")
+
+        rv = self.make_request("get", "/api/users?q=sales")
+        self.assertEqual(rv.json["count"], 2)
+        self.assertNotIn("count_is_estimate", rv.json)
+
+        with patch("redash.settings.PAGINATION_EXACT_COUNT_LIMIT", 0):
+            rv = self.make_request("get", "/api/users?q=sales")
+        self.assertTrue(rv.json["count_is_estimate"])
+        self.assertEqual(len(rv.json["results"]), 2)
+
     def test_gets_all_enabled(self):
         users = self.create_filters_fixtures()
         user_ids = self.make_request_and_return_ids("get", "/api/users")
@@ -0,0 +1,100 @@
+import marshal
+
+from mock import patch
+
+from redash import redis_connection
+from redash.metrics import profiling
+from tests import BaseTestCase, authenticate_request
+
+
+@patch("redash.settings.REQUEST_PROFILING_ENABLED", True)
+class TestRequestProfiling(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = self.factory.create_admin()
+
+    def get_profiled(self, path, user):
+        authenticate_request(self.client, user)
+        return self.client.get(path, headers={profiling.PROFILE_HEADER: "1"})
+
+    def test_profiles_super_admins_requests_with_header(self):
+        self.get_profiled("/default/api/dashboards", self.admin)
+
+        (summary,) = profiling.list_reports()
+        self.assertEqual(summary["endpoint"], "dashboards")
+        self.assertEqual(summary["status"], 200)
+        self.assertEqual(summary["user_id"], self.admin.get_id())
+        self.assertGreater(summary["statements_count"], 0)
+
+        report = profiling.get_report(summary["id"])
+        self.assertEqual(len(report["statements"]), summary["statements_count"])
+        self.assertTrue(any("FROM dashboards" in statement["statement"] for statement in report["statements"]))
+        self.assertIn("function calls", report["profile"])
+        self.assertIsInstance(marshal.loads(profiling.get_pstats(summary["id"])), dict)
+
+    def test_keeps_query_argument_values_out_of_reports(self):
+        self.get_profiled("/default/api/dashboards?page=2&api_key=secret", self.admin)
+
+        (summary,) = profiling.list_reports()
+        self.assertEqual(summary["path"], "/default/api/dashboards?page=&api_key=")
+
+    def test_ignores_header_of_other_users(self):
+        self.get_profiled("/default/api/dashboards", self.factory.user)
+
+        self.assertEqual(profiling.list_reports(), [])
+
+    def test_ignores_header_when_disabled(self):
+        with patch("redash.settings.REQUEST_PROFILING_ENABLED", False):
+            self.get_profiled("/default/api/dashboards", self.admin)
+
+        self.assertEqual(profiling.list_reports(), [])
+
+    def test_profiles_sampled_requests(self):
+        with patch("redash.settings.REQUEST_PROFILING_SAMPLE_RATE", 1.0):
+            self.client.get("/ping")
+
+        (summary,) = profiling.list_reports()
+        self.assertEqual(summary["endpoint"], "redash.ping")
+        self.assertIsNone(summary["user_id"])
+
+    @patch("redash.settings.REQUEST_PROFILES_LIMIT", 2)
+    def test_keeps_the_latest_reports(self):
+        for _ in range(3):
+            self.get_profiled("/default/api/dashboards", self.admin)
+
+        reports = profiling.list_reports()
+        self.assertEqual(len(reports), 2)
+        self.assertEqual(len(redis_connection.keys("redash:profile:*")), 4)
+
+
+class TestRequestProfilesAPI(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = self.factory.create_admin()
+        authenticate_request(self.client, self.admin)
+        with patch("redash.settings.REQUEST_PROFILING_ENABLED", True):
+            self.client.get("/default/api/dashboards", headers={profiling.PROFILE_HEADER: "1"})
+        (self.summary,) = profiling.list_reports()
+
+    def test_lists_and_downloads_reports(self):
+        rv = self.make_request("get", "/api/admin/profiles", org=False, user=self.admin)
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.json["profiles"][0]["id"], self.summary["id"])
+
+        rv = self.make_request("get", "/api/admin/profiles/{}".format(self.summary["id"]), org=False, user=self.admin)
+        self.assertEqual(rv.status_code, 200)
+        self.assertIn("profile", rv.json)
+
+        rv = self.make_request(
+            "get", "/api/admin/profiles/{}.prof".format(self.summary["id"]), org=False, user=self.admin
+        )
+        self.assertEqual(rv.status_code, 200)
+        self.assertIsInstance(marshal.loads(rv.data), dict)
+
+    def test_returns_404_for_missing_reports(self):
+        rv = self.make_request("get", "/api/admin/profiles/missing", org=False, user=self.admin)
+        self.assertEqual(rv.status_code, 404)
+
+    def test_returns_403_for_non_admin(self):
+        rv = self.make_request("get", "/api/admin/profiles", org=False)
+        self.assertEqual(rv.status_code, 403)
@@ -0,0 +1,107 @@
+from datetime import timedelta
+
+import pytest
+from mock import patch
+from rq.utils import utcnow
+
+from redash import rq_redis_connection
+from redash.metrics import prometheus
+from redash.tasks.worker import Queue, Worker
+from tests import BaseTestCase
+
+
+def sample(name, **labels):
+    return prometheus.registry().get_sample_value(name, labels) or 0
+
+
+def noop():
+    pass
+
+
+class TestMetricsEndpoint(BaseTestCase):
+    def test_not_found_when_disabled(self):
+        with patch("redash.settings.PROMETHEUS_METRICS_ENABLED", False):
+            rv = self.client.get("/metrics")
+        self.assertEqual(404, rv.status_code)
+
+    @pytest.mark.skipif(prometheus.prometheus_client is None, reason="prometheus_client is not installed")
+    def test_not_found_without_token(self):
+        with patch("redash.settings.PROMETHEUS_METRICS_ENABLED", True):
+            rv = self.client.get("/metrics", headers={"Authorization": "Bearer "})
+        self.assertEqual(404, rv.status_code)
+
+    @pytest.mark.skipif(prometheus.prometheus_client is None, reason="prometheus_client is not installed")
+    @patch("redash.settings.PROMETHEUS_METRICS_ENABLED", True)
+    @patch("redash.settings.PROMETHEUS_METRICS_TOKEN", "secret")
+    def test_requires_token(self):
+        self.assertEqual(401, self.client.get("/metrics").status_code)
+        rv = self.client.get("/metrics", headers={"Authorization": "Bearer wrong"})
+        self.assertEqual(401, rv.status_code)
+
+    @pytest.mark.skipif(prometheus.prometheus_client is None, reason="prometheus_client is not installed")
+    @patch("redash.settings.PROMETHEUS_METRICS_ENABLED", True)
+    @patch("redash.settings.PROMETHEUS_METRICS_TOKEN", "secret")
+    def test_serves_metrics(self):
+        self.client.get("/ping")
+        rv = self.client.get("/metrics", headers={"Authorization": "Bearer secret"})
+        self.assertEqual(200, rv.status_code)
+        self.assertIn(b'redash_request_duration_seconds_count{endpoint="redash_ping",method="GET"}', rv.data)
+
+
+@pytest.mark.skipif(prometheus.prometheus_client is None, reason="prometheus_client is not installed")
+@patch("redash.settings.PROMETHEUS_METRICS_ENABLED", True)
+class TestPrometheusMetrics(BaseTestCase):
+    def test_records_requests(self):
+        before = sample("redash_request_duration_seconds_count", endpoint="redash_ping", method="GET")
+        self.client.get("/ping")
+        after = sample("redash_request_duration_seconds_count", endpoint="redash_ping", method="GET")
+        self.assertEqual(before + 1, after)
+
+    def test_records_db_queries_by_table(self):
+        before = sample("redash_db_query_duration_seconds_count", table="queries", action="insert")
+        self.factory.create_query()
+        after = sample("redash_db_query_duration_seconds_count", table="queries", action="insert")
+        self.assertEqual(before + 1, after)
+
+    def test_records_cache_lookups(self):
+        query_result = self.factory.create_query_result()
+        data_source_type = query_result.data_source.type
+        hits = sample("redash_query_result_cache_lookups_total", data_source_type=data_source_type, result="hit")
+        misses = sample("redash_query_result_cache_lookups_total", data_source_type=data_source_type, result="miss")
+
+        for query in (query_result.query_text, "SELECT 'uncached'"):
+            self.make_request(
+                "post",
+                "/api/query_results",
+                data={"data_source_id": query_result.data_source.id, "query": query, "max_age": -1},
+            )
+
+        self.assertEqual(
+            hits + 1,
+            sample("redash_query_result_cache_lookups_total", data_source_type=data_source_type, result="hit"),
+        )
+        self.assertEqual(
+            misses + 1,
+            sample("redash_query_result_cache_lookups_total", data_source_type=data_source_type, result="miss"),
+        )
+
+    def test_records_queue_wait(self):
+        queue = Queue("prometheus", connection=rq_redis_connection)
+        job = queue.enqueue(noop)
+        job.enqueued_at = utcnow() - timedelta(seconds=42)
+        job.save()
+
+        before = sample("redash_queue_wait_seconds_sum", queue="prometheus")
+        with patch.object(Worker, "fork_work_horse"), patch.object(Worker, "monitor_work_horse"):
+            Worker([queue], connection=rq_redis_connection).execute_job(job, queue)
+        wait = sample("redash_queue_wait_seconds_sum", queue="prometheus") - before
+
+        self.assertGreaterEqual(wait, 42)
+        self.assertLess(wait, 60)
+
+    def test_records_query_runtime_and_result_size(self):
+        prometheus.record_query_execution("test_type", 2.5, 2048)
+        prometheus.record_query_execution("test_type", 0.5)
+
+        self.assertEqual(1, sample("redash_query_result_size_bytes_bucket", data_source_type="test_type", le="4096.0"))
+        self.assertEqual(2, sample("redash_query_runtime_seconds_bucket", data_source_type="test_type", le="2.5"))
@@ -1,7 +1,11 @@
 import textwrap
 from unittest import TestCase
 
-from redash.models import OPERATORS, Alert, db, next_state
+import mock
+
+from redash.models import OPERATORS, Alert, QueryResult, db, next_state
+from redash.utils import json_loads
+from redash.utils.column_stats import compute_column_stats
 from tests import BaseTestCase
 
 
@@ -118,10 +122,94 @@ class TestAlertEvaluate(BaseTestCase):
         )
         self.assertEqual(alert.evaluate(), Alert.UNKNOWN_STATE)
 
+    def test_evaluates_max_and_min_selectors_from_column_stats(self):
+        results = {"rows": [{"foo": 1}, {"foo": 3}], "columns": [{"name": "foo", "type": "INTEGER"}]}
+        alert = self.create_alert(results, value="2")
+        alert.query_rel.latest_query_data.column_stats = compute_column_stats(results)
+        db.session.commit()
+        db.session.expunge_all()
+        alert = Alert.query.get(alert.id)
+
+        with mock.patch("redash.models.types.json_loads") as json_loads:
+            alert.options["op"] = ">"
+            alert.options["selector"] = "max"
+            self.assertEqual(alert.evaluate(), Alert.TRIGGERED_STATE)
+            alert.options["selector"] = "min"
+            self.assertEqual(alert.evaluate(), Alert.OK_STATE)
+
+        json_loads.assert_not_called()
+
+    def test_evaluate_falls_back_to_rows_when_column_stats_are_not_numeric(self):
+        results = {"rows": [{"foo": "1"}, {"foo": "3"}], "columns": [{"name": "foo", "type": "STRING"}]}
+        alert = self.create_alert(results, value="2")
+        alert.query_rel.latest_query_data.column_stats = compute_column_stats(results)
+        alert.options["op"] = ">"
+        alert.options["selector"] = "max"
+
+        self.assertEqual(alert.evaluate(), Alert.TRIGGERED_STATE)
+
     def test_evaluate_return_unknown_when_value_is_none(self):
         alert = self.create_alert(get_results(None))
         self.assertEqual(alert.evaluate(), Alert.UNKNOWN_STATE)
 
+    def test_evaluate_return_unknown_when_max_column_has_nulls(self):
+        results = {"rows": [{"foo": 1}, {"foo": None}], "columns": [{"name": "foo", "type": "INTEGER"}]}
+        alert = self.create_alert(results)
+        alert.options["selector"] = "max"
+        self.assertEqual(alert.evaluate(), Alert.UNKNOWN_STATE)
+
+
+class TestAlertEvaluateBatch(BaseTestCase):
+    def create_alert(self, query_result, **options):
+        query = self.factory.create_query(latest_query_data_id=query_result.id)
+        options = dict({"op": ">", "column": "foo", "value": "2"}, **options)
+        return self.factory.create_alert(query_rel=query, options=options)
+
+    def test_evaluates_all_alerts(self):
+        results = {"rows": [{"foo": 1, "bar": 3}, {"foo": 3, "bar": 1}], "columns": [{"name": "foo"}, {"name": "bar"}]}
+        query_result = self.factory.create_query_result(data=results)
+        first = self.create_alert(query_result, selector="first")
+        max_foo = self.create_alert(query_result, selector="max")
+        min_foo = self.create_alert(query_result, selector="min")
+        first_bar = self.create_alert(query_result, selector="first", column="bar")
+        missing = self.create_alert(query_result, column="baz")
+
+        states = Alert.evaluate_batch([first, max_foo, min_foo, first_bar, missing], query_result)
+
+        self.assertEqual(
+            states,
+            {
+                first.id: Alert.OK_STATE,
+                max_foo.id: Alert.TRIGGERED_STATE,
+                min_foo.id: Alert.OK_STATE,
+                first_bar.id: Alert.TRIGGERED_STATE,
+                missing.id: Alert.UNKNOWN_STATE,
+            },
+        )
+
+    def test_decodes_data_once(self):
+        results = {"rows": [{"foo": 1}, {"foo": 3}], "columns": [{"name": "foo"}]}
+        query_result = self.factory.create_query_result(data=results)
+        alerts = [self.create_alert(query_result, selector=selector) for selector in ("first", "max", "min", "max")]
+        db.session.commit()
+        db.session.expunge_all()
+        alerts = [Alert.query.get(alert.id) for alert in alerts]
+
+        with mock.patch("redash.models.types.json_loads", wraps=json_loads) as loads:
+            query_result = QueryResult.query.get(query_result.id)
+            states = Alert.evaluate_batch(alerts, query_result)
+
+        self.assertEqual(1, loads.call_count)
+        self.assertEqual(
+            [states[alert.id] for alert in alerts],
+            [Alert.OK_STATE, Alert.TRIGGERED_STATE, Alert.OK_STATE, Alert.TRIGGERED_STATE],
+        )
+
+    def test_evaluates_unknown_without_query_result(self):
+        query_result = self.factory.create_query_result()
+        alert = self.create_alert(query_result)
+        self.assertEqual(Alert.evaluate_batch([alert], None), {alert.id: Alert.UNKNOWN_STATE})
+
 
 class TestNextState(TestCase):
     def test_numeric_value(self):
@@ -1,4 +1,6 @@
+from redash import settings
 from redash.models import Change, ChangeTrackingMixin, Query, db
+from redash.models.changes import diff_values, patch_value
 from tests import BaseTestCase
 
 
@@ -84,3 +86,79 @@ class TestLogChange(BaseTestCase):
 
         self.assertIsNotNone(change)
         self.assertEqual(q.user, change.user)
+
+    def test_logs_only_changed_columns(self):
+        obj = create_object(self.factory)
+        obj.name = "Query 2"
+        obj.description = "description"
+        db.session.flush()
+        obj.name = "Query 3"
+        obj.record_changes(changed_by=self.factory.user)
+
+        change = Change.last_change(obj)
+        self.assertEqual(
+            change.change,
+            {
+                "name": {"previous": "Query", "current": "Query 3"},
+                "description": {"previous": "", "current": "description"},
+            },
+        )
+
+    def test_logs_diffs_of_text_and_json_columns(self):
+        obj = create_object(self.factory)
+        obj.query_text = "SELECT 1\nFROM table"
+        obj.options = {"parameters": []}
+        obj.record_changes(changed_by=self.factory.user)
+
+        change = Change.last_change(obj)
+        self.assertEqual(change.change["query"], {"diff": [[0, 1, "SELECT 1\nFROM table"]]})
+        self.assertEqual(change.change["options"], {"diff": {"set": {"parameters": []}, "unset": []}})
+        self.assertEqual(Change.last_value(obj, "query"), ("SELECT 1\nFROM table", 1))
+        self.assertEqual(Change.last_value(obj, "options"), ({"parameters": []}, 1))
+
+    def test_logs_snapshots_periodically(self):
+        obj = create_object(self.factory)
+        for i in range(settings.CHANGES_SNAPSHOT_INTERVAL + 1):
+            obj.query_text = "SELECT {}".format(i)
+            obj.record_changes(changed_by=self.factory.user)
+
+        self.assertEqual(Change.last_change(obj).change["query"], {"current": obj.query_text})
+        obj.query_text = "SELECT 1\nFROM table"
+        obj.record_changes(changed_by=self.factory.user)
+        self.assertEqual(Change.last_value(obj, "query"), (obj.query_text, 1))
+
+
+class TestDiffValues(BaseTestCase):
+    def test_patches_text(self):
+        previous = "SELECT a,\n  b\nFROM table\nWHERE a > 1\n"
+        current = "SELECT a,\n  c,\n  d\nFROM table\n"
+        self.assertEqual(patch_value(previous, diff_values(previous, current)), current)
+
+    def test_patches_dictionaries(self):
+        previous = {"a": 1, "b": 2}
+        current = {"b": 3, "c": 4}
+        self.assertEqual(diff_values(previous, current), {"set": {"b": 3, "c": 4}, "unset": ["a"]})
+        self.assertEqual(patch_value(previous, diff_values(previous, current)), current)
+
+    def test_does_not_diff_other_values(self):
+        self.assertIsNone(diff_values(None, "SELECT 1"))
+        self.assertIsNone(diff_values(["a"], ["b"]))
+
+
+class TestCompact(BaseTestCase):
+    def test_compacts_full_changes(self):
+        obj = create_object(self.factory)
+        db.session.flush()
+        legacy = [
+            {"name": {"previous": None, "current": "Query"}, "query": {"previous": None, "current": "SELECT 1"}},
+            {
+                "name": {"previous": "Query", "current": "Query"},
+                "query": {"previous": "SELECT 1", "current": "SELECT 2"},
+            },
+        ]
+        changes = [Change(object=obj, object_version=1, user=self.factory.user, change=change) for change in legacy]
+
+        self.assertEqual(Change.compact(changes, Query), changes)
+        self.assertEqual(changes[0].change, {"name": legacy[0]["name"], "query": {"current": "SELECT 1"}})
+        self.assertEqual(changes[1].change, {"query": {"diff": [[0, 1, "SELECT 2"]]}})
+        self.assertEqual(Change.compact(changes, Query), [])
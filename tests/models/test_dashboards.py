@@ -1,4 +1,4 @@
-from redash.models import Dashboard, db
+from redash.models import Dashboard, db, tags
 from tests import BaseTestCase
 
 
@@ -23,6 +23,8 @@ class DashboardTest(BaseTestCase):
         self.create_tagged_dashboard(tags=["tag1"])
         self.create_tagged_dashboard(tags=["tag1", "tag2"])
         self.create_tagged_dashboard(tags=["tag1", "tag2", "tag3"])
+        db.session.commit()
+        tags.refresh()
 
         self.assertEqual(
             list(Dashboard.all_tags(self.factory.org, self.factory.user)),
@@ -82,3 +84,37 @@ class TestDashboardsByUser(BaseTestCase):
         results = Dashboard.all(self.factory.org, usr.group_ids, usr.id)
 
         self.assertEqual(2, results.count(), "The incorrect number of dashboards were returned")
+
+
+class TestDashboardSearch(BaseTestCase):
+    def search(self, term):
+        return Dashboard.search(self.factory.org, self.factory.user.group_ids, self.factory.user.id, term).all()
+
+    def test_finds_dashboards_with_every_word_in_name(self):
+        d1 = self.factory.create_dashboard(name="Sales by region")
+        d2 = self.factory.create_dashboard(name="Regional sales")
+        d3 = self.factory.create_dashboard(name="Sales")
+
+        dashboards = self.search("sales region")
+
+        self.assertIn(d1, dashboards)
+        self.assertIn(d2, dashboards)
+        self.assertNotIn(d3, dashboards)
+
+    def test_finds_quoted_phrases(self):
+        d1 = self.factory.create_dashboard(name="日本語の売上 ダッシュボード")
+        d2 = self.factory.create_dashboard(name="売上の日本語")
+
+        dashboards = self.search('"日本語の売上"')
+
+        self.assertIn(d1, dashboards)
+        self.assertNotIn(d2, dashboards)
+
+    def test_finds_words_with_colons(self):
+        d1 = self.factory.create_dashboard(name="Standup 10:30")
+        d2 = self.factory.create_dashboard(name="Top 30")
+        d3 = self.factory.create_dashboard(name="Sales")
+
+        self.assertEqual([d1], self.search("10:30"))
+        self.assertNotIn(d2, self.search("10:30"))
+        self.assertEqual([d3], self.search("name:sales"))
@@ -1,7 +1,7 @@
 import mock
 from mock import patch
 
-from redash.models import DataSource, Query, QueryResult
+from redash.models import DataSource, DataSourceGroup, Query, QueryResult, db
 from redash.utils.configuration import ConfigurationContainer
 from tests import BaseTestCase
 
@@ -168,3 +168,47 @@ class TestDataSourceDelete(BaseTestCase):
         data_source.delete()
 
         mock_redis.assert_called_with(data_source._schema_key)
+
+
+class TestDataSourceGroups(BaseTestCase):
+    def test_caches_groups_for_the_request(self):
+        data_source = self.factory.create_data_source()
+        group = self.factory.create_group()
+
+        with self.app.test_request_context("/"):
+            groups = data_source.groups
+            db.session.add(DataSourceGroup(group=group, data_source=data_source))
+            db.session.flush()
+            self.assertEqual(groups, data_source.groups)
+
+        with self.app.test_request_context("/"):
+            self.assertIn(group.id, data_source.groups)
+
+    def test_adding_and_removing_groups_clears_cache(self):
+        data_source = self.factory.create_data_source()
+        group = self.factory.create_group()
+
+        with self.app.test_request_context("/"):
+            data_source.groups
+            data_source.add_group(group, view_only=True)
+            self.assertTrue(data_source.groups[group.id])
+
+            data_source.update_group_permission(group, False)
+            self.assertFalse(data_source.groups[group.id])
+
+            data_source.remove_group(group)
+            self.assertNotIn(group.id, data_source.groups)
+
+    def test_prefetch_groups(self):
+        data_source = self.factory.create_data_source(group=self.factory.default_group)
+        other_data_source = self.factory.create_data_source(group=self.factory.create_group(), view_only=True)
+        data_source_without_groups = self.factory.create_data_source()
+
+        with self.app.test_request_context("/"):
+            DataSource.prefetch_groups([data_source.id, other_data_source.id, data_source_without_groups.id])
+
+            with mock.patch.object(DataSourceGroup, "query") as query:
+                self.assertEqual({self.factory.default_group.id: False}, data_source.groups)
+                self.assertEqual(list(other_data_source.groups.values()), [True])
+                self.assertEqual({}, data_source_without_groups.groups)
+                query.filter.assert_not_called()
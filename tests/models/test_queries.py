@@ -3,7 +3,7 @@ import datetime
 import mock
 import pytest
 
-from redash.models import Event, Group, Query, QueryResult, db
+from redash.models import Event, Group, Query, QueryResult, db, tags
 from redash.utils import gen_query_hash, utcnow
 from tests import BaseTestCase
 
@@ -26,6 +26,8 @@ class QueryTest(BaseTestCase):
         self.create_tagged_query(tags=["tag1"])
         self.create_tagged_query(tags=["tag1", "tag2"])
         self.create_tagged_query(tags=["tag1", "tag2", "tag3"])
+        db.session.commit()
+        tags.refresh()
 
         self.assertEqual(
             list(Query.all_tags(self.factory.user)),
@@ -64,6 +66,22 @@ class QueryTest(BaseTestCase):
         self.assertIn(q2, queries)
         self.assertNotIn(q3, queries)
 
+    def test_multi_byte_search_treats_unknown_keys_as_words(self):
+        q1 = self.factory.create_query(name="Report of 10:30")
+        self.factory.create_query(name="Report of 30")
+
+        queries = list(Query.search("10:30", [self.factory.default_group.id], multi_byte_search=True))
+
+        self.assertEqual([q1], queries)
+
+    def test_multi_byte_search_ranks_full_text_matches_first(self):
+        q1 = self.factory.create_query(name="Wholesales")
+        q2 = self.factory.create_query(name="Sales report")
+
+        queries = list(Query.search("sales", [self.factory.default_group.id], multi_byte_search=True))
+
+        self.assertEqual(queries, [q2, q1])
+
     def test_search_by_id_returns_query(self):
         q1 = self.factory.create_query(description="Testing search")
         q2 = self.factory.create_query(description="Testing searching")
@@ -240,7 +258,7 @@ class QueryRecentTest(BaseTestCase):
     def test_global_recent(self):
         q1 = self.factory.create_query()
         q2 = self.factory.create_query()
-        db.session.flush()
+        db.session.commit()
         e = Event(
             org=self.factory.org,
             user=self.factory.user,
@@ -249,7 +267,8 @@ class QueryRecentTest(BaseTestCase):
             object_id=q1.id,
         )
         db.session.add(e)
-        recent = Query.recent([self.factory.default_group.id])
+        db.session.commit()
+        recent = Query.recent(self.factory.org, [self.factory.default_group.id])
         self.assertIn(q1, recent)
         self.assertNotIn(q2, recent)
 
@@ -275,7 +294,8 @@ class QueryRecentTest(BaseTestCase):
                 ),
             ]
         )
-        recent = Query.recent([self.factory.default_group.id])
+        db.session.commit()
+        recent = Query.recent(self.factory.org, [self.factory.default_group.id])
 
         self.assertIn(q1, recent)
         self.assertNotIn(q2, recent)
@@ -283,7 +303,7 @@ class QueryRecentTest(BaseTestCase):
     def test_recent_for_user(self):
         q1 = self.factory.create_query()
         q2 = self.factory.create_query()
-        db.session.flush()
+        db.session.commit()
         e = Event(
             org=self.factory.org,
             user=self.factory.user,
@@ -292,12 +312,13 @@ class QueryRecentTest(BaseTestCase):
             object_id=q1.id,
         )
         db.session.add(e)
-        recent = Query.recent([self.factory.default_group.id], user_id=self.factory.user.id)
+        db.session.commit()
+        recent = Query.recent(self.factory.org, [self.factory.default_group.id], user_id=self.factory.user.id)
 
         self.assertIn(q1, recent)
         self.assertNotIn(q2, recent)
 
-        recent = Query.recent([self.factory.default_group.id], user_id=self.factory.user.id + 1)
+        recent = Query.recent(self.factory.org, [self.factory.default_group.id], user_id=self.factory.user.id + 1)
         self.assertNotIn(q1, recent)
         self.assertNotIn(q2, recent)
 
@@ -305,7 +326,7 @@ class QueryRecentTest(BaseTestCase):
         q1 = self.factory.create_query()
         ds = self.factory.create_data_source(group=self.factory.create_group())
         q2 = self.factory.create_query(data_source=ds)
-        db.session.flush()
+        db.session.commit()
         Event(
             org=self.factory.org,
             user=self.factory.user,
@@ -320,12 +341,89 @@ class QueryRecentTest(BaseTestCase):
             object_type="query",
             object_id=q2.id,
         )
+        db.session.commit()
 
-        recent = Query.recent([self.factory.default_group.id])
+        recent = Query.recent(self.factory.org, [self.factory.default_group.id])
 
         self.assertIn(q1, recent)
         self.assertNotIn(q2, recent)
 
+    def test_orders_by_activity(self):
+        q1 = self.factory.create_query()
+        q2 = self.factory.create_query()
+        now = utcnow().timestamp()
+        raw_event = {
+            "org_id": self.factory.org.id,
+            "user_id": self.factory.user.id,
+            "action": "execute",
+            "object_type": "query",
+            "timestamp": now,
+        }
+        Event.record_many([dict(raw_event, object_id=q1.id), dict(raw_event, object_id=q2.id)])
+        Event.record_many([dict(raw_event, object_id=q2.id)])
+        db.session.commit()
+
+        self.assertEqual([q2, q1], Query.recent(self.factory.org, [self.factory.default_group.id]))
+        self.assertEqual([q2], Query.recent(self.factory.org, [self.factory.default_group.id], limit=1))
+
+    def test_counts_activity_per_organization(self):
+        q1 = self.factory.create_query()
+        other_org = self.factory.create_org()
+        raw_event = {
+            "user_id": self.factory.user.id,
+            "action": "execute",
+            "object_type": "query",
+            "object_id": q1.id,
+            "timestamp": utcnow().timestamp(),
+        }
+        Event.record_many([dict(raw_event, org_id=other_org.id)])
+        db.session.commit()
+
+        self.assertEqual([], Query.recent(self.factory.org, [self.factory.default_group.id]))
+
+        Event.record_many([dict(raw_event, org_id=self.factory.org.id)])
+        db.session.commit()
+
+        self.assertEqual([q1], Query.recent(self.factory.org, [self.factory.default_group.id]))
+
+    def test_ignores_activity_older_than_a_week(self):
+        q1 = self.factory.create_query()
+        week_ago = (utcnow() - datetime.timedelta(days=8)).timestamp()
+        Event.record_many(
+            [
+                {
+                    "org_id": self.factory.org.id,
+                    "user_id": self.factory.user.id,
+                    "action": "edit",
+                    "object_type": "query",
+                    "object_id": q1.id,
+                    "timestamp": week_ago,
+                }
+            ]
+        )
+        db.session.commit()
+
+        self.assertEqual([], Query.recent(self.factory.org, [self.factory.default_group.id]))
+
+    def test_doesnt_count_rolled_back_activity(self):
+        q1 = self.factory.create_query()
+        db.session.commit()
+        Event.record_many(
+            [
+                {
+                    "org_id": self.factory.org.id,
+                    "user_id": self.factory.user.id,
+                    "action": "execute",
+                    "object_type": "query",
+                    "object_id": q1.id,
+                    "timestamp": utcnow().timestamp(),
+                }
+            ]
+        )
+        db.session.rollback()
+
+        self.assertEqual([], Query.recent(self.factory.org, [self.factory.default_group.id]))
+
 
 class TestQueryByUser(BaseTestCase):
     def test_returns_only_users_queries(self):
@@ -73,3 +73,46 @@ class QueryResultTest(BaseTestCase):
         )
 
         self.assertEqual(original_updated_at, query.updated_at)
+
+    def test_store_result_stores_column_stats(self):
+        query = self.factory.create_query()
+        data = {
+            "columns": [{"name": "value", "type": "integer"}],
+            "rows": [{"value": 3}, {"value": 1}, {"value": None}],
+        }
+
+        query_result = models.QueryResult.store_result(
+            query.org_id,
+            query.data_source,
+            query.query_hash,
+            query.query_text,
+            data,
+            0,
+            utcnow(),
+        )
+        models.db.session.commit()
+        models.db.session.expire_all()
+
+        self.assertEqual(
+            query_result.column_stats,
+            {"value": {"null_count": 1, "distinct_count": 2, "min": 1, "max": 3, "sum": 4.0, "mean": 2.0}},
+        )
+        self.assertEqual(query_result.to_dict()["column_stats"], query_result.column_stats)
+
+    def test_store_result_with_nul_characters_in_strings(self):
+        query = self.factory.create_query()
+        data = {"columns": [{"name": "value", "type": "string"}], "rows": [{"value": "a\x00b"}]}
+
+        query_result = models.QueryResult.store_result(
+            query.org_id,
+            query.data_source,
+            query.query_hash,
+            query.query_text,
+            data,
+            0,
+            utcnow(),
+        )
+        models.db.session.commit()
+        models.db.session.expire_all()
+
+        self.assertEqual(query_result.column_stats, {"value": {"null_count": 0, "distinct_count": 1}})
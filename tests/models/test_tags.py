@@ -0,0 +1,91 @@
+from mock import patch
+from sqlalchemy.exc import OperationalError
+
+from redash import redis_connection
+from redash.models import Dashboard, Query, db, tags
+from tests import BaseTestCase
+
+
+class TestTagCounts(BaseTestCase):
+    def refresh(self):
+        db.session.commit()
+        return tags.refresh()
+
+    def test_changes_mark_counts_stale_once_committed(self):
+        query = self.factory.create_query(tags=["tag1"])
+        self.assertTrue(self.refresh())
+        self.assertFalse(tags.refresh())
+
+        query.name = "Renamed"
+        self.assertFalse(self.refresh())
+
+        query.tags = ["tag2"]
+        db.session.flush()
+        self.assertFalse(redis_connection.exists(tags.STALE_KEY))
+        db.session.rollback()
+        self.assertFalse(self.refresh())
+
+        query.tags = ["tag2"]
+        self.assertTrue(self.refresh())
+        self.assertEqual(list(Query.all_tags(self.factory.user)), [("tag2", 1)])
+
+    def test_counts_stay_stale_when_refreshing_fails(self):
+        self.factory.create_query(tags=["tag1"])
+        db.session.commit()
+
+        error = OperationalError("REFRESH", {}, Exception("canceling statement due to lock timeout"))
+        with patch.object(db.session, "execute", side_effect=error):
+            with self.assertRaises(OperationalError):
+                tags.refresh()
+
+        self.assertTrue(redis_connection.exists(tags.STALE_KEY))
+        self.assertTrue(tags.refresh())
+
+    def test_counts_only_queries_of_users_data_sources(self):
+        other_data_source = self.factory.create_data_source(group=self.factory.create_group())
+        self.factory.create_query(tags=["tag1"])
+        self.factory.create_query(tags=["tag1", "tag2"], data_source=other_data_source)
+        self.factory.create_query(tags=["tag1"], is_archived=True)
+        self.refresh()
+
+        self.assertEqual(list(Query.all_tags(self.factory.user)), [("tag1", 1)])
+
+    def test_counts_other_users_drafts_only_when_including_drafts(self):
+        self.factory.create_query(tags=["tag1"], is_draft=True)
+        self.factory.create_query(tags=["tag1"], is_draft=True, user=self.factory.create_user())
+        self.refresh()
+
+        self.assertEqual(list(Query.all_tags(self.factory.user)), [("tag1", 1)])
+        self.assertEqual(list(Query.all_tags(self.factory.user, include_drafts=True)), [("tag1", 2)])
+
+    def test_counts_dashboards_with_widgets_of_users_data_sources_or_owned_by_user(self):
+        other_user = self.factory.create_user()
+        other_group = self.factory.create_group()
+        other_query = self.factory.create_query(
+            data_source=self.factory.create_data_source(group=other_group), user=other_user
+        )
+
+        # Visible through the widget's data source.
+        visible = self.factory.create_dashboard(tags=["tag1"], user=other_user, is_draft=False)
+        self.factory.create_widget(dashboard=visible)
+        # Owned by the user.
+        self.factory.create_dashboard(tags=["tag1", "tag2"])
+        # Neither.
+        hidden = self.factory.create_dashboard(tags=["tag3"], user=other_user, is_draft=False)
+        self.factory.create_widget(
+            dashboard=hidden, visualization=self.factory.create_visualization(query_rel=other_query)
+        )
+        self.refresh()
+
+        self.assertEqual(
+            list(Dashboard.all_tags(self.factory.org, self.factory.user)),
+            [("tag1", 2), ("tag2", 1)],
+        )
+
+        # Moving a widget's query to another data source changes which dashboards use it.
+        other_query.data_source = self.factory.data_source
+        self.assertTrue(self.refresh())
+        self.assertEqual(
+            list(Dashboard.all_tags(self.factory.org, self.factory.user)),
+            [("tag1", 2), ("tag2", 1), ("tag3", 1)],
+        )
@@ -1,5 +1,7 @@
+import mock
+
 from redash import redis_connection
-from redash.models import ApiUser, User, db
+from redash.models import ApiUser, User, db, principals
 from redash.models.users import LAST_ACTIVE_KEY, sync_last_active_at
 from redash.utils import dt_from_timestamp
 from tests import BaseTestCase, authenticated_user
@@ -100,9 +102,67 @@ class TestUserDetail(BaseTestCase):
             timestamp = dt_from_timestamp(redis_connection.hget(LAST_ACTIVE_KEY, user.id))
             sync_last_active_at()
 
-            user_reloaded = User.query.filter(User.id == user.id).first()
-            self.assertIn("active_at", user_reloaded.details)
-            self.assertEqual(user_reloaded.active_at, timestamp)
+            # The users are updated in bulk, bypassing the session.
+            active_at = db.session.query(User.active_at).filter(User.id == user.id).scalar()
+            self.assertEqual(active_at, timestamp)
+
+    def test_sync_updates_users_in_bulk(self):
+        users = [self.factory.create_user() for _ in range(3)]
+        db.session.commit()
+        redis_connection.hset(LAST_ACTIVE_KEY, users[0].id, 1700000000)
+        redis_connection.hset(LAST_ACTIVE_KEY, users[1].id, 1700000100)
+        redis_connection.hset(LAST_ACTIVE_KEY, 999999, 1700000200)
+
+        sync_last_active_at()
+
+        active_at = dict(db.session.query(User.id, User.active_at).filter(User.id.in_([u.id for u in users])))
+        self.assertEqual(active_at[users[0].id], dt_from_timestamp(1700000000))
+        self.assertEqual(active_at[users[1].id], dt_from_timestamp(1700000100))
+        self.assertIsNone(active_at[users[2].id])
+        self.assertFalse(redis_connection.exists(LAST_ACTIVE_KEY))
+
+    def test_sync_invalidates_cached_principals(self):
+        user = self.factory.create_user()
+        db.session.commit()
+        principals.cache_principal("user", user.id, {"user": {"id": user.id}})
+        redis_connection.hset(LAST_ACTIVE_KEY, user.id, 1700000000)
+
+        sync_last_active_at()
+
+        self.assertIsNone(principals.get_principal("user", user.id))
+
+    def test_sync_keeps_timestamps_when_update_fails(self):
+        user = self.factory.create_user()
+        db.session.commit()
+        redis_connection.hset(LAST_ACTIVE_KEY, user.id, 1700000000)
+
+        with mock.patch("redash.models.users._update_active_at", side_effect=ValueError("Failed")):
+            with self.assertRaises(ValueError):
+                sync_last_active_at()
+
+        self.assertEqual("1700000000", redis_connection.hget(LAST_ACTIVE_KEY, user.id))
+
+
+class TestUserPermissions(BaseTestCase):
+    def test_caches_group_permissions_for_the_request(self):
+        user = self.factory.create_user()
+
+        with self.app.test_request_context("/"):
+            permissions = user.permissions
+            self.factory.default_group.permissions = ["view_query"]
+            db.session.flush()
+            self.assertEqual(permissions, user.permissions)
+
+        with self.app.test_request_context("/"):
+            self.assertEqual(["view_query"], user.permissions)
+
+    def test_doesnt_share_permissions_between_group_sets(self):
+        user = self.factory.create_user()
+        admin = self.factory.create_admin()
+
+        with self.app.test_request_context("/"):
+            self.assertNotIn("admin", user.permissions)
+            self.assertIn("admin", admin.permissions)
 
 
 class TestUserGetActualUser(BaseTestCase):
@@ -0,0 +1,48 @@
+from flask_login import login_user
+
+from redash.models import Query, db
+from redash.serializers import QuerySerializer, serialize_query
+from tests import BaseTestCase, count_queries
+
+
+class QuerySerializerTest(BaseTestCase):
+    def create_queries(self, count):
+        for _ in range(count):
+            user = self.factory.create_user()
+            query = self.factory.create_query(
+                user=user, last_modified_by=user, latest_query_data=self.factory.create_query_result()
+            )
+            self.factory.create_visualization(query_rel=query)
+        db.session.commit()
+
+    def serialize(self, queries):
+        results = QuerySerializer(queries, with_stats=True, with_visualizations=True).serialize()
+        for result in results:
+            result.pop("is_favorite")
+        return results
+
+    def test_runs_the_same_number_of_sql_queries_for_any_number_of_queries(self):
+        self.create_queries(5)
+
+        counts = []
+        with self.app.test_request_context("/"):
+            login_user(self.factory.user)
+            for limit in (1, 5):
+                db.session.expunge_all()
+                with count_queries() as counter:
+                    self.serialize(Query.query.order_by(Query.id).limit(limit))
+                counts.append(counter.count)
+
+        self.assertGreater(counts[0], 0)
+        self.assertEqual(counts[0], counts[1])
+
+    def test_serializes_like_serialize_query(self):
+        self.create_queries(2)
+
+        with self.app.test_request_context("/"):
+            login_user(self.factory.user)
+            queries = Query.query.order_by(Query.id).all()
+            expected = [serialize_query(q, with_stats=True, with_visualizations=True) for q in queries]
+
+            db.session.expunge_all()
+            self.assertEqual(expected, self.serialize(Query.query.order_by(Query.id)))
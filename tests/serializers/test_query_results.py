@@ -1,10 +1,13 @@
 import csv
 import io
 
+from redash.models import QueryResult, db
 from redash.serializers import (
     serialize_query_result,
     serialize_query_result_to_dsv,
+    serialize_query_result_to_json,
 )
+from redash.utils import json_loads
 from tests import BaseTestCase
 
 data = {
@@ -35,6 +38,35 @@ class QueryResultSerializationTest(BaseTestCase):
         self.assertSetEqual(set(["data", "retrieved_at"]), set(serialized.keys()))
 
 
+class JsonSerializationTest(BaseTestCase):
+    def test_splices_serialized_data(self):
+        query_result = self.factory.create_query_result(data=data)
+        db.session.commit()
+        db.session.expunge_all()
+
+        loaded = QueryResult.get_by_id_and_org(
+            query_result.id, self.factory.org, load_data=False, load_serialized_data=True
+        )
+        serialized = json_loads(serialize_query_result_to_json(loaded))
+
+        self.assertEqual(serialized["query_result"]["data"], data)
+        self.assertEqual(serialized["query_result"]["id"], query_result.id)
+        self.assertSetEqual(set(query_result.to_dict().keys()), set(serialized["query_result"].keys()))
+
+    def test_serializes_null_data(self):
+        query_result = self.factory.create_query_result(data=None)
+        db.session.commit()
+
+        loaded = QueryResult.get_by_id_and_org(query_result.id, self.factory.org, load_data=False)
+
+        self.assertIsNone(json_loads(serialize_query_result_to_json(loaded))["query_result"]["data"])
+
+    def test_serializes_decoded_data(self):
+        query_result = self.factory.create_query_result(data=data)
+
+        self.assertEqual(json_loads(serialize_query_result_to_json(query_result))["query_result"]["data"], data)
+
+
 class DsvSerializationTest(BaseTestCase):
     def delimited_content(self, delimiter):
         query_result = self.factory.create_query_result(data=data)
@@ -1,4 +1,4 @@
-from mock import ANY, MagicMock
+from mock import ANY, MagicMock, patch
 
 import redash.tasks.alerts
 from redash.models import Alert
@@ -34,8 +34,22 @@ class TestCheckAlertsForQuery(BaseTestCase):
 
         self.assertFalse(redash.tasks.alerts.notify_subscriptions.called)
 
+    def test_uses_given_alert_states(self):
+        redash.tasks.alerts.notify_subscriptions = MagicMock()
+        Alert.evaluate = MagicMock(return_value=Alert.OK_STATE)
+
+        alert = self.factory.create_alert()
+        check_alerts_for_query(
+            alert.query_id, metadata={"Scheduled": False}, alert_states={alert.id: Alert.TRIGGERED_STATE}
+        )
+
+        self.assertFalse(Alert.evaluate.called)
+        self.assertTrue(redash.tasks.alerts.notify_subscriptions.called)
+        self.assertEqual(Alert.query.get(alert.id).state, Alert.TRIGGERED_STATE)
+
 
 class TestNotifySubscriptions(BaseTestCase):
+    @patch("redash.settings.NOTIFICATIONS_OUTBOX_ENABLED", False)
     def test_calls_notify_for_subscribers(self):
         subscription = self.factory.create_alert_subscription()
         subscription.notify = MagicMock()
@@ -49,3 +63,13 @@ class TestNotifySubscriptions(BaseTestCase):
             ANY,
             ANY,
         )
+
+    @patch("redash.settings.NOTIFICATIONS_OUTBOX_ENABLED", True)
+    @patch("redash.tasks.alerts.queue_notifications")
+    def test_queues_notifications_when_outbox_is_enabled(self, queue_notifications):
+        subscription = self.factory.create_alert_subscription()
+        subscription.notify = MagicMock()
+        notify_subscriptions(subscription.alert, Alert.OK_STATE, metadata={"Scheduled": False})
+
+        queue_notifications.assert_called_once_with(subscription.alert, Alert.OK_STATE, {"Scheduled": False})
+        subscription.notify.assert_not_called()
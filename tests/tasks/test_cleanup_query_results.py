@@ -0,0 +1,39 @@
+import datetime
+
+from mock import patch
+
+from redash import redis_connection, settings
+from redash.models import QueryResult
+from redash.tasks import cleanup_query_results
+from redash.utils import utcnow
+from tests import BaseTestCase
+
+
+class TestCleanupQueryResults(BaseTestCase):
+    def create_unused_results(self, count):
+        two_weeks_ago = utcnow() - datetime.timedelta(days=14)
+        return [self.factory.create_query_result(retrieved_at=two_weeks_ago) for _ in range(count)]
+
+    def test_deletes_unused_results_in_batches(self):
+        self.create_unused_results(5)
+        used_qr = self.factory.create_query_result()
+        self.factory.create_query(latest_query_data=used_qr)
+
+        with patch.object(settings, "QUERY_RESULTS_CLEANUP_COUNT", 2):
+            cleanup_query_results()
+
+        self.assertEqual([qr.id for qr in QueryResult.query], [used_qr.id])
+        status = redis_connection.hgetall("redash:status")
+        self.assertEqual(status["query_results_cleanup_deleted_count"], "5")
+        self.assertEqual(status["query_results_cleanup_backlog"], "0")
+
+    def test_reports_backlog_when_out_of_time(self):
+        self.create_unused_results(3)
+
+        with patch.object(settings, "QUERY_RESULTS_CLEANUP_TIME_BUDGET", 0):
+            cleanup_query_results()
+
+        self.assertEqual(QueryResult.query.count(), 3)
+        status = redis_connection.hgetall("redash:status")
+        self.assertEqual(status["query_results_cleanup_deleted_count"], "0")
+        self.assertGreater(int(status["query_results_cleanup_backlog"]), 0)
@@ -0,0 +1,155 @@
+import json
+import time
+
+from freezegun import freeze_time
+from mock import patch
+from sqlalchemy.exc import OperationalError
+
+from redash import models, redis_connection
+from redash.tasks.general import (
+    EVENTS_BUFFER_KEY,
+    enqueue_event,
+    flush_events,
+    manage_event_partitions,
+)
+from tests import BaseTestCase
+
+
+class TestEventsBuffer(BaseTestCase):
+    def setUp(self):
+        super(TestEventsBuffer, self).setUp()
+        redis_connection.flushall()
+
+    def raw_event(self, **kwargs):
+        event = {
+            "org_id": self.factory.org.id,
+            "user_id": self.factory.user.id,
+            "action": "view",
+            "object_type": "dashboard",
+            "object_id": 1,
+            "timestamp": int(time.time()),
+        }
+        event.update(kwargs)
+        return event
+
+    def test_buffers_events(self):
+        enqueue_event(self.raw_event())
+
+        self.assertEqual(1, redis_connection.llen(EVENTS_BUFFER_KEY))
+        self.assertEqual(0, models.Event.query.count())
+
+    @patch("redash.settings.EVENTS_BUFFER_ENABLED", False)
+    @patch("redash.tasks.general.record_event.delay")
+    def test_enqueues_job_when_buffering_is_disabled(self, delay):
+        event = self.raw_event()
+        enqueue_event(event)
+
+        delay.assert_called_once_with(event)
+        self.assertEqual(0, redis_connection.llen(EVENTS_BUFFER_KEY))
+
+    @patch("redash.settings.EVENTS_FLUSH_BATCH_SIZE", 2)
+    def test_flushes_all_buffered_events(self):
+        for action in ["view", "edit", "delete"]:
+            enqueue_event(self.raw_event(action=action))
+
+        flush_events()
+
+        self.assertEqual(["view", "edit", "delete"], [e.action for e in models.Event.query.order_by(models.Event.id)])
+        self.assertEqual(0, redis_connection.llen(EVENTS_BUFFER_KEY))
+
+    def test_records_valid_events_when_some_fail(self):
+        enqueue_event(self.raw_event(action="view"))
+        enqueue_event(self.raw_event(action="edit", org_id=-1))
+
+        flush_events()
+
+        self.assertEqual(["view"], [e.action for e in models.Event.query])
+
+    def test_keeps_events_when_the_database_fails(self):
+        enqueue_event(self.raw_event(action="view"))
+        enqueue_event(self.raw_event(action="edit"))
+
+        error = OperationalError("INSERT", {}, Exception("connection refused"))
+        with patch.object(models.Event, "record_many", side_effect=error):
+            with self.assertRaises(OperationalError):
+                flush_events()
+
+        self.assertEqual(0, models.Event.query.count())
+        self.assertEqual(
+            ["view", "edit"], [json.loads(e)["action"] for e in redis_connection.lrange(EVENTS_BUFFER_KEY, 0, -1)]
+        )
+
+        flush_events()
+
+        self.assertEqual(["view", "edit"], [e.action for e in models.Event.query.order_by(models.Event.id)])
+
+    def test_counts_activity_of_events_recorded_again_once(self):
+        query = self.factory.create_query()
+        enqueue_event(self.raw_event(action="execute", object_type="query", object_id=query.id))
+
+        error = OperationalError("COMMIT", {}, Exception("connection refused"))
+        with patch.object(models.db.session, "commit", side_effect=error):
+            with self.assertRaises(OperationalError):
+                flush_events()
+        flush_events()
+
+        self.assertEqual([query], models.Query.recent(self.factory.org, [self.factory.default_group.id]))
+        (key,) = redis_connection.keys("recent_queries:*:{}".format(self.factory.user.id))
+        self.assertEqual(1, redis_connection.zscore(key, str(query.id)))
+
+    @patch("redash.settings.EVENT_REPORTING_WEBHOOKS", ["https://example.com/events"])
+    @patch("requests.Session.post")
+    def test_forwards_events_in_batches(self, post):
+        post.return_value.status_code = 200
+        enqueue_event(self.raw_event(action="view"))
+        enqueue_event(self.raw_event(action="edit"))
+
+        flush_events()
+
+        post.assert_called_once()
+        self.assertEqual("https://example.com/events", post.call_args[0][0])
+        data = json.loads(post.call_args[1]["data"])
+        self.assertEqual(["view", "edit"], [e["data"]["action"] for e in data])
+
+
+class TestManageEventPartitions(BaseTestCase):
+    def partitions(self):
+        rows = models.db.session.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'events'::regclass ORDER BY 1"
+        )
+        return [name for name, in rows]
+
+    @freeze_time("2026-12-15")
+    def test_creates_partitions_of_this_and_next_month(self):
+        manage_event_partitions()
+        self.assertEqual(["events_default", "events_y2026m12", "events_y2027m01"], self.partitions())
+
+    @patch("redash.settings.EVENTS_RETENTION_DAYS", 60)
+    def test_drops_partitions_past_retention(self):
+        with freeze_time("2026-09-15"):
+            manage_event_partitions()
+        with freeze_time("2026-12-15"):
+            manage_event_partitions()
+
+        self.assertEqual(
+            ["events_default", "events_y2026m10", "events_y2026m12", "events_y2027m01"],
+            self.partitions(),
+        )
+
+    @patch("redash.settings.EVENTS_RETENTION_DAYS", 30)
+    def test_skips_months_covered_by_the_legacy_partition(self):
+        # The partition the migration makes of the events from before partitioning, up to the next month.
+        models.db.session.execute(
+            "CREATE TABLE events_legacy PARTITION OF events FOR VALUES FROM (MINVALUE) TO ('2026-11-01 00:00:00+00')"
+        )
+
+        with freeze_time("2026-10-20"):
+            manage_event_partitions()
+        self.assertEqual(["events_default", "events_legacy", "events_y2026m11"], self.partitions())
+
+        with freeze_time("2026-12-15"):
+            manage_event_partitions()
+        self.assertEqual(
+            ["events_default", "events_y2026m11", "events_y2026m12", "events_y2027m01"], self.partitions()
+        )
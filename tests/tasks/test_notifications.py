@@ -0,0 +1,190 @@
+import time
+from unittest import TestCase
+
+from mock import patch
+
+from redash import redis_connection
+from redash.models import Alert, AlertSubscription
+from redash.tasks.notifications import (
+    CHANNELS_KEY,
+    RETRIES_KEY,
+    channel_for,
+    coalesce,
+    deliver_channel_notifications,
+    deliver_notifications,
+    outbox_key,
+    processing_key,
+    queue_notifications,
+    slot_key,
+)
+from redash.utils import json_loads
+from tests import BaseTestCase
+
+
+@patch("redash.tasks.notifications.deliver_channel_notifications.delay")
+class TestNotificationOutbox(BaseTestCase):
+    def setUp(self):
+        super(TestNotificationOutbox, self).setUp()
+        redis_connection.flushall()
+
+    def queue(self, subscription, state=Alert.TRIGGERED_STATE):
+        queue_notifications(subscription.alert, state, {"Scheduled": False})
+        return channel_for(subscription)
+
+    def test_queues_notifications_and_starts_delivery(self, delay):
+        subscription = self.factory.create_alert_subscription()
+        channel = self.queue(subscription)
+
+        delay.assert_called_once_with(channel)
+        entries = [json_loads(e) for e in redis_connection.lrange(outbox_key(channel), 0, -1)]
+        self.assertEqual(1, len(entries))
+        self.assertEqual(subscription.id, entries[0]["subscription_id"])
+        self.assertEqual(Alert.TRIGGERED_STATE, entries[0]["state"])
+
+    def test_delivers_the_latest_state_once(self, delay):
+        subscription = self.factory.create_alert_subscription()
+        channel = self.queue(subscription, Alert.TRIGGERED_STATE)
+        self.queue(subscription, Alert.OK_STATE)
+
+        with patch.object(AlertSubscription, "notify") as notify:
+            deliver_channel_notifications(channel)
+
+        notify.assert_called_once()
+        self.assertEqual(Alert.OK_STATE, notify.call_args[0][3])
+        self.assertFalse(redis_connection.exists(outbox_key(channel)))
+
+    def test_schedules_retry_of_failed_delivery(self, delay):
+        subscription = self.factory.create_alert_subscription()
+        channel = self.queue(subscription)
+
+        with patch.object(AlertSubscription, "notify", side_effect=ValueError("Unavailable")):
+            deliver_channel_notifications(channel)
+
+        retries = redis_connection.zrange(RETRIES_KEY, 0, -1, withscores=True)
+        self.assertEqual(1, len(retries))
+        entry, retry_at = json_loads(retries[0][0]), retries[0][1]
+        self.assertEqual(1, entry["attempts"])
+        self.assertGreater(retry_at, time.time())
+
+    def test_gives_up_after_max_attempts(self, delay):
+        subscription = self.factory.create_alert_subscription()
+        channel = self.queue(subscription)
+
+        with patch("redash.settings.NOTIFICATIONS_MAX_ATTEMPTS", 1), patch.object(
+            AlertSubscription, "notify", side_effect=ValueError("Unavailable")
+        ):
+            deliver_channel_notifications(channel)
+
+        self.assertEqual(0, redis_connection.zcard(RETRIES_KEY))
+
+    def test_leaves_notifications_to_running_deliveries(self, delay):
+        subscription = self.factory.create_alert_subscription()
+        channel = self.queue(subscription)
+        redis_connection.set(slot_key(channel, 0), "running")
+        redis_connection.set(slot_key(channel, 1), "running")
+
+        with patch.object(AlertSubscription, "notify") as notify:
+            deliver_channel_notifications(channel)
+
+        notify.assert_not_called()
+        self.assertEqual(1, redis_connection.llen(outbox_key(channel)))
+
+    def test_keeps_notifications_of_failed_deliveries_for_redelivery(self, delay):
+        subscription = self.factory.create_alert_subscription()
+        channel = self.queue(subscription)
+
+        with patch("redash.tasks.notifications._deliver", side_effect=SystemExit):
+            with self.assertRaises(SystemExit):
+                deliver_channel_notifications(channel)
+
+        self.assertEqual(0, redis_connection.llen(outbox_key(channel)))
+        self.assertEqual(1, redis_connection.llen(processing_key(channel, 0)))
+        self.assertFalse(redis_connection.exists(slot_key(channel, 0)))
+
+        with patch.object(AlertSubscription, "notify") as notify:
+            deliver_channel_notifications(channel)
+
+        notify.assert_called_once()
+        self.assertFalse(redis_connection.exists(processing_key(channel, 0)))
+
+    def test_requeues_unacknowledged_notifications_of_released_slots(self, delay):
+        subscription = self.factory.create_alert_subscription()
+        channel = self.queue(subscription)
+        redis_connection.rpoplpush(outbox_key(channel), processing_key(channel, 1))
+        redis_connection.lpush(processing_key(channel, 0), "held")
+        redis_connection.set(slot_key(channel, 0), "running")
+
+        delay.reset_mock()
+        deliver_notifications()
+
+        self.assertEqual(1, redis_connection.llen(outbox_key(channel)))
+        self.assertFalse(redis_connection.exists(processing_key(channel, 1)))
+        self.assertEqual(["held"], redis_connection.lrange(processing_key(channel, 0), 0, -1))
+        delay.assert_called_once_with(channel)
+
+    def test_doesnt_release_slots_taken_over_by_other_jobs(self, delay):
+        subscription = self.factory.create_alert_subscription()
+        channel = self.queue(subscription)
+
+        def take_over(*args):
+            redis_connection.set(slot_key(channel, 0), "other")
+
+        with patch("redash.tasks.notifications._deliver", side_effect=take_over):
+            deliver_channel_notifications(channel)
+
+        self.assertEqual("other", redis_connection.get(slot_key(channel, 0)))
+
+    def test_requeues_due_retries(self, delay):
+        subscription = self.factory.create_alert_subscription()
+        channel = self.queue(subscription)
+
+        with patch("redash.settings.NOTIFICATIONS_RETRY_BACKOFF", 0), patch.object(
+            AlertSubscription, "notify", side_effect=ValueError("Unavailable")
+        ):
+            deliver_channel_notifications(channel)
+
+        delay.reset_mock()
+        deliver_notifications()
+
+        self.assertEqual(0, redis_connection.zcard(RETRIES_KEY))
+        entries = [json_loads(e) for e in redis_connection.lrange(outbox_key(channel), 0, -1)]
+        self.assertEqual(1, entries[0]["attempts"])
+        delay.assert_called_once_with(channel)
+
+    def test_forgets_channels_without_pending_notifications(self, delay):
+        subscription = self.factory.create_alert_subscription()
+        channel = self.queue(subscription)
+        self.assertEqual({channel}, redis_connection.smembers(CHANNELS_KEY))
+
+        with patch.object(AlertSubscription, "notify"):
+            deliver_channel_notifications(channel)
+        delay.reset_mock()
+        deliver_notifications()
+
+        delay.assert_not_called()
+        self.assertFalse(redis_connection.exists(CHANNELS_KEY))
+
+    def test_delivers_notifications_in_the_order_they_were_queued(self, delay):
+        destination = self.factory.create_destination()
+        subscriptions = [self.factory.create_alert_subscription(destination=destination) for _ in range(3)]
+        for subscription in subscriptions:
+            self.queue(subscription)
+        channel = channel_for(subscriptions[0])
+
+        with patch("redash.tasks.notifications._deliver") as deliver:
+            deliver_channel_notifications(channel)
+
+        self.assertEqual(
+            [subscription.id for subscription in subscriptions],
+            [entry["subscription_id"] for entry in deliver.call_args[0][1]],
+        )
+
+
+class TestCoalesce(TestCase):
+    def test_keeps_latest_entry_of_each_alert_and_subscription(self):
+        entries = [
+            {"subscription_id": 1, "alert_id": 1, "state": "triggered"},
+            {"subscription_id": 2, "alert_id": 1, "state": "triggered"},
+            {"subscription_id": 1, "alert_id": 1, "state": "ok"},
+        ]
+        self.assertEqual(coalesce(entries), [entries[1], entries[2]])
@@ -1,15 +1,21 @@
+import threading
+from collections import defaultdict
+
+import mock
 from mock import Mock, patch
-from rq import Connection
-from rq.exceptions import NoSuchJobError
+from rq import Connection, Queue
+from rq.job import JobStatus
 
 from redash import models, rq_redis_connection
 from redash.query_runner.pg import PostgreSQL
 from redash.tasks import Job
 from redash.tasks.queries.execution import (
     QueryExecutionError,
+    _job_lock_id,
     enqueue_query,
     execute_query,
 )
+from redash.utils import gen_query_hash
 from tests import BaseTestCase
 
 
@@ -22,6 +28,7 @@ def fetch_job(*args, **kwargs):
     result = Mock()
     result.id = job_id
     result.is_cancelled = False
+    result.meta = {}
 
     return result
 
@@ -30,146 +37,121 @@ def create_job(*args, **kwargs):
     return Job(connection=rq_redis_connection)
 
 
-@patch("redash.tasks.queries.execution.Job.fetch", side_effect=fetch_job)
-@patch("redash.tasks.queries.execution.Queue.enqueue", side_effect=create_job)
 class TestEnqueueTask(BaseTestCase):
-    def test_multiple_enqueue_of_same_query(self, enqueue, _):
-        query = self.factory.create_query()
-
+    def enqueue(self, query, query_text=None, scheduled_query=None):
         with Connection(rq_redis_connection):
-            enqueue_query(
-                query.query_text,
-                query.data_source,
-                query.user_id,
-                False,
-                query,
-                {"Username": "Arik", "query_id": query.id},
-            )
-            enqueue_query(
-                query.query_text,
-                query.data_source,
-                query.user_id,
-                False,
-                query,
-                {"Username": "Arik", "query_id": query.id},
-            )
-            enqueue_query(
-                query.query_text,
+            return enqueue_query(
+                query_text or query.query_text,
                 query.data_source,
                 query.user_id,
                 False,
-                query,
+                scheduled_query,
                 {"Username": "Arik", "query_id": query.id},
             )
 
-        self.assertEqual(1, enqueue.call_count)
+    def queued_job_ids(self, query):
+        return Queue(query.data_source.scheduled_queue_name, connection=rq_redis_connection).job_ids
 
-    def test_multiple_enqueue_of_expired_job(self, enqueue, fetch_job):
+    def test_multiple_enqueue_of_same_query(self):
         query = self.factory.create_query()
 
-        with Connection(rq_redis_connection):
-            enqueue_query(
-                query.query_text,
-                query.data_source,
-                query.user_id,
-                False,
-                query,
-                {"Username": "Arik", "query_id": query.id},
-            )
+        job_ids = {self.enqueue(query, scheduled_query=query).id for _ in range(3)}
 
-            # "expire" the previous job
-            fetch_job.side_effect = NoSuchJobError
+        self.assertEqual(1, len(job_ids))
+        self.assertEqual(list(job_ids), self.queued_job_ids(query))
 
-            enqueue_query(
-                query.query_text,
-                query.data_source,
-                query.user_id,
-                False,
-                query,
-                {"Username": "Arik", "query_id": query.id},
-            )
+    def test_multiple_enqueue_of_expired_job(self):
+        query = self.factory.create_query()
+
+        job = self.enqueue(query, scheduled_query=query)
+        # "expire" the previous job
+        job.delete()
+        new_job = self.enqueue(query, scheduled_query=query)
 
-        self.assertEqual(2, enqueue.call_count)
+        self.assertNotEqual(job.id, new_job.id)
+        self.assertEqual([new_job.id], self.queued_job_ids(query))
 
-    def test_reenqueue_during_job_cancellation(self, enqueue, my_fetch_job):
+    def test_multiple_enqueue_of_finished_job(self):
         query = self.factory.create_query()
 
-        with Connection(rq_redis_connection):
-            enqueue_query(
-                query.query_text,
-                query.data_source,
-                query.user_id,
-                False,
-                query,
-                {"Username": "Arik", "query_id": query.id},
-            )
+        job = self.enqueue(query, scheduled_query=query)
+        job.set_status(JobStatus.FINISHED)
+        new_job = self.enqueue(query, scheduled_query=query)
 
-            # "cancel" the previous job
-            def cancel_job(*args, **kwargs):
-                job = fetch_job(*args, **kwargs)
-                job.is_cancelled = True
-                return job
+        self.assertNotEqual(job.id, new_job.id)
 
-            my_fetch_job.side_effect = cancel_job
+    def test_reenqueue_during_job_cancellation(self):
+        query = self.factory.create_query()
 
-            enqueue_query(
-                query.query_text,
-                query.data_source,
-                query.user_id,
-                False,
-                query,
-                {"Username": "Arik", "query_id": query.id},
-            )
+        job = self.enqueue(query, scheduled_query=query)
+        job.cancel()
+        new_job = self.enqueue(query, scheduled_query=query)
 
-        self.assertEqual(2, enqueue.call_count)
+        self.assertNotEqual(job.id, new_job.id)
+        self.assertEqual([new_job.id], self.queued_job_ids(query))
 
     @patch("redash.settings.dynamic_settings.query_time_limit", return_value=60)
-    def test_limits_query_time(self, _, enqueue, __):
+    def test_limits_query_time(self, _):
         query = self.factory.create_query()
 
-        with Connection(rq_redis_connection):
-            enqueue_query(
-                query.query_text,
-                query.data_source,
-                query.user_id,
-                False,
-                query,
-                {"Username": "Arik", "query_id": query.id},
-            )
+        job = self.enqueue(query, scheduled_query=query)
 
-        _, kwargs = enqueue.call_args
-        self.assertEqual(60, kwargs.get("job_timeout"))
+        self.assertEqual(60, Job.fetch(job.id, connection=rq_redis_connection).timeout)
 
-    def test_multiple_enqueue_of_different_query(self, enqueue, _):
+    def test_enqueued_job_can_be_fetched(self):
         query = self.factory.create_query()
 
-        with Connection(rq_redis_connection):
-            enqueue_query(
-                query.query_text,
-                query.data_source,
-                query.user_id,
-                False,
-                None,
-                {"Username": "Arik", "query_id": query.id},
-            )
-            enqueue_query(
-                query.query_text + "2",
-                query.data_source,
-                query.user_id,
-                False,
-                None,
-                {"Username": "Arik", "query_id": query.id},
-            )
-            enqueue_query(
-                query.query_text + "3",
-                query.data_source,
-                query.user_id,
-                False,
-                None,
-                {"Username": "Arik", "query_id": query.id},
-            )
+        job = Job.fetch(self.enqueue(query).id, connection=rq_redis_connection)
+
+        self.assertEqual(JobStatus.QUEUED, job.get_status())
+        self.assertEqual(query.data_source.queue_name, job.origin)
+        self.assertEqual((query.query_text, query.data_source.id), job.args[:2])
+        self.assertEqual(query.user_id, job.kwargs["user_id"])
+        self.assertEqual(query.id, job.meta["query_id"])
+
+        self.assertEqual(-1, rq_redis_connection.ttl(job.key))
 
-        self.assertEqual(3, enqueue.call_count)
+    @patch("redash.tasks.queries.execution.time.sleep")
+    def test_gives_up_on_jobs_that_never_finish_being_enqueued(self, _):
+        query = self.factory.create_query()
+        query_hash = gen_query_hash(query.query_text)
+        rq_redis_connection.set(_job_lock_id(query_hash, query.data_source.id), "pending-job-id")
+        rq_redis_connection.hset(Job.key_for("pending-job-id"), "status", "queued")
+
+        with patch("redash.tasks.queries.execution.logger") as logger:
+            self.assertIsNone(self.enqueue(query))
+
+        logger.error.assert_called_once_with("[Manager][%s] Failed adding job for query.", query_hash)
+
+    def test_multiple_enqueue_of_different_query(self):
+        query = self.factory.create_query()
+
+        job_ids = {self.enqueue(query, query.query_text + suffix).id for suffix in ("", "2", "3")}
+
+        self.assertEqual(3, len(job_ids))
+
+    def test_concurrent_enqueue_of_same_queries(self):
+        queries = [self.factory.create_query(query_text="SELECT {}".format(i)) for i in range(4)]
+        submitters = 200
+        barrier = threading.Barrier(submitters)
+        job_ids = defaultdict(set)
+
+        def submit(query):
+            barrier.wait()
+            with self.app.app_context():
+                job_ids[query.id].add(self.enqueue(query, scheduled_query=query).id)
+
+        threads = [threading.Thread(target=submit, args=(queries[i % len(queries)],)) for i in range(submitters)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([1] * len(queries), [len(job_ids[query.id]) for query in queries])
+        self.assertEqual(
+            sorted(job_id for query in queries for job_id in job_ids[query.id]),
+            sorted(self.queued_job_ids(queries[0])),
+        )
 
 
 @patch("redash.tasks.queries.execution.get_current_job", side_effect=fetch_job)
@@ -315,3 +297,76 @@ class QueryExecutorTests(BaseTestCase):
             )
             q = models.Query.get_by_id(q.id)
             self.assertEqual(q.schedule_failures, 0)
+
+    def test_checks_alerts_of_updated_queries(self, _):
+        """
+        Alerts of the queries updated with the new result are evaluated against it, and only queries with alerts get
+        an alert checking job.
+        """
+        q = self.factory.create_query(query_text="SELECT 1, 2")
+        alert = self.factory.create_alert(query_rel=q, options={"op": ">", "column": "_col0", "value": "0"})
+        self.factory.create_query(query_text="SELECT 1, 2")
+        with patch.object(PostgreSQL, "run_query") as qr, patch(
+            "redash.tasks.queries.execution.check_alerts_for_query"
+        ) as check_alerts:
+            qr.return_value = (
+                {
+                    "columns": [{"name": "_col0", "friendly_name": "_col0", "type": "integer"}],
+                    "rows": [{"_col0": 1}],
+                },
+                None,
+            )
+            execute_query("SELECT 1, 2", self.factory.data_source.id, {"query_id": q.id})
+
+        check_alerts.delay.assert_called_once_with(q.id, mock.ANY, {alert.id: models.Alert.TRIGGERED_STATE})
+
+    def test_defers_alerts_that_fail_to_evaluate_to_alert_checking(self, _):
+        """
+        Alerts that can't be evaluated (like ones with incomplete options) don't fail the query's execution, and are
+        left to the alert checking job to evaluate.
+        """
+        q = self.factory.create_query(query_text="SELECT 1, 2")
+        self.factory.create_alert(query_rel=q, options={"op": ">", "column": "_col0"})
+        with patch.object(PostgreSQL, "run_query") as qr, patch(
+            "redash.tasks.queries.execution.check_alerts_for_query"
+        ) as check_alerts:
+            qr.return_value = (
+                {
+                    "columns": [{"name": "_col0", "friendly_name": "_col0", "type": "integer"}],
+                    "rows": [{"_col0": 1}],
+                },
+                None,
+            )
+            result_id = execute_query("SELECT 1, 2", self.factory.data_source.id, {"query_id": q.id})
+
+        self.assertIsNotNone(models.QueryResult.query.get(result_id))
+        check_alerts.delay.assert_called_once_with(q.id, mock.ANY, {})
+
+    def test_records_phase_timings(self, get_current_job):
+        job = fetch_job()
+        get_current_job.side_effect = None
+        get_current_job.return_value = job
+
+        with patch.object(PostgreSQL, "run_query") as qr:
+            qr.return_value = ({"columns": [], "rows": []}, None)
+            result_id = execute_query("SELECT 1, 2", self.factory.data_source.id, {})
+
+        self.assertEqual(
+            {"load_data_source", "execute", "serialize", "store", "update_latest_result", "enqueue_alerts"},
+            set(job.meta["timings"]),
+        )
+        job.save_meta.assert_called_once_with()
+        # The timings are kept out of the result.
+        self.assertEqual({"columns": [], "rows": []}, models.QueryResult.query.get(result_id).data)
+
+    def test_returns_the_result_when_recording_timings_fails(self, get_current_job):
+        job = fetch_job()
+        job.save_meta.side_effect = ConnectionError("Redis is down")
+        get_current_job.side_effect = None
+        get_current_job.return_value = job
+
+        with patch.object(PostgreSQL, "run_query") as qr:
+            qr.return_value = ({"columns": [], "rows": []}, None)
+            result_id = execute_query("SELECT 1, 2", self.factory.data_source.id, {})
+
+        self.assertIsNotNone(models.QueryResult.query.get(result_id))
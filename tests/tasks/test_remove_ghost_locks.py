@@ -0,0 +1,67 @@
+from mock import patch
+from rq import Connection
+from rq.job import JobStatus
+
+from redash import rq_redis_connection
+from redash.tasks import remove_ghost_locks
+from redash.tasks.queries.execution import enqueue_query
+from redash.tasks.queries.maintenance import GHOST_LOCKS_CURSOR_KEY
+from tests import BaseTestCase
+
+
+class TestRemoveGhostLocks(BaseTestCase):
+    def enqueue(self, query_text):
+        query = self.factory.create_query(query_text=query_text)
+        with Connection(rq_redis_connection):
+            return enqueue_query(query.query_text, query.data_source, query.user_id, metadata={})
+
+    def locks(self):
+        return sorted(key.decode() for key in rq_redis_connection.scan_iter(match="query_hash_job:*"))
+
+    def test_removes_locks_of_jobs_that_are_gone(self):
+        self.enqueue("SELECT 1")
+        self.enqueue("SELECT 2").delete()
+        rq_redis_connection.set("query_hash_job:1:unknown", "unknown-job-id")
+        locks = self.locks()
+
+        remove_ghost_locks()
+
+        self.assertEqual(1, len(self.locks()))
+        self.assertIn(self.locks()[0], locks)
+
+    def test_keeps_locks_of_jobs_enqueued_while_scanning(self):
+        job = self.enqueue("SELECT 1")
+
+        with patch("redash.tasks.queries.maintenance.rq_job_ids", return_value=[]):
+            remove_ghost_locks()
+
+        self.assertEqual(1, len(self.locks()))
+        self.assertEqual(job.get_status(), JobStatus.QUEUED)
+
+    def test_resumes_scanning_where_it_stopped(self):
+        for i in range(20):
+            rq_redis_connection.set("query_hash_job:1:{}".format(i), "unknown-job-id")
+
+        with patch("redash.tasks.queries.maintenance.GHOST_LOCKS_SCAN_BATCH_SIZE", 2), patch(
+            "redash.tasks.queries.maintenance.GHOST_LOCKS_SCAN_LIMIT", 5
+        ):
+            remove_ghost_locks()
+            self.assertLess(len(self.locks()), 20)
+            self.assertNotEqual(b"0", rq_redis_connection.get(GHOST_LOCKS_CURSOR_KEY))
+
+            while self.locks():
+                remove_ghost_locks()
+
+        self.assertEqual([], self.locks())
+
+    def test_limits_the_keys_scanned_in_each_run(self):
+        for i in range(20):
+            rq_redis_connection.set("not_a_lock:{}".format(i), "value")
+
+        with patch("redash.tasks.queries.maintenance.GHOST_LOCKS_SCAN_BATCH_SIZE", 2), patch(
+            "redash.tasks.queries.maintenance.GHOST_LOCKS_SCAN_LIMIT", 4
+        ), patch.object(rq_redis_connection, "scan", wraps=rq_redis_connection.scan) as scan:
+            remove_ghost_locks()
+
+        self.assertEqual(2, scan.call_count)
+        self.assertNotEqual(b"0", rq_redis_connection.get(GHOST_LOCKS_CURSOR_KEY))
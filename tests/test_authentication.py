@@ -11,10 +11,11 @@ from flask import request
 from mock import Mock, patch
 from sqlalchemy.orm.exc import NoResultFound
 
-from redash import models, settings
+from redash import models, redis_connection, settings
 from redash.authentication import (
     api_key_load_user_from_request,
     get_login_url,
+    get_user_by_id_and_org,
     hmac_load_user_from_request,
     jwt_auth,
     org_settings,
@@ -177,6 +178,118 @@ class TestSessionAuthentication(BaseTestCase):
         self.assertEqual(rv.status_code, 200)
 
 
+class TestPrincipalsCache(BaseTestCase):
+    def setUp(self):
+        super(TestPrincipalsCache, self).setUp()
+        self.session_url = "/{}/api/session".format(self.factory.org.slug)
+
+    def load_user_from_api_key(self, api_key, url=None):
+        with self.app.test_client() as c:
+            c.get(url or self.session_url, query_string={"api_key": api_key})
+            return api_key_load_user_from_request(request)
+
+    def test_caches_session_users(self):
+        rv = self.make_request("get", "/api/queries")
+        self.assertEqual(200, rv.status_code)
+
+        with patch.object(models.User, "get_by_id_and_org") as get_by_id_and_org:
+            rv = self.make_request("get", "/api/queries")
+            self.assertEqual(200, rv.status_code)
+            get_by_id_and_org.assert_not_called()
+
+    def test_rejects_disabled_session_users(self):
+        user = self.factory.create_user()
+        self.assertEqual(200, self.make_request("get", "/api/queries", user=user).status_code)
+
+        user.disable()
+        models.db.session.commit()
+
+        self.assertNotEqual(200, self.make_request("get", "/api/queries", user=user).status_code)
+
+    def test_caches_api_keys(self):
+        user = self.factory.create_user(api_key="user_key")
+        dashboard_api_key = self.factory.create_api_key(object=self.factory.create_dashboard())
+        models.db.session.flush()
+        self.load_user_from_api_key(user.api_key)
+        dashboard_url = "/{}/api/dashboards/public/{}".format(self.factory.org.slug, dashboard_api_key.api_key)
+        self.load_user_from_api_key(dashboard_api_key.api_key, dashboard_url)
+
+        with patch.object(models.User, "get_by_api_key_and_org") as get_by_api_key_and_org, patch.object(
+            models.ApiKey, "get_by_api_key"
+        ) as get_by_api_key:
+            self.assertEqual(user.id, self.load_user_from_api_key(user.api_key).id)
+            self.assertEqual(
+                dashboard_api_key.api_key, self.load_user_from_api_key(dashboard_api_key.api_key, dashboard_url).id
+            )
+            get_by_api_key_and_org.assert_not_called()
+            get_by_api_key.assert_not_called()
+
+    def test_doesnt_cache_user_api_keys(self):
+        user = self.factory.create_user(api_key="user_key")
+        models.db.session.flush()
+        self.load_user_from_api_key("user_key")
+
+        (principal,) = [redis_connection.get(key) for key in redis_connection.keys("principals:*:user:*")]
+        self.assertNotIn("user_key", principal)
+        self.assertNotIn("password_hash", principal)
+
+        models.db.session.expunge_all()
+        with self.app.test_request_context():
+            self.assertEqual("user_key", get_user_by_id_and_org(user.id, self.factory.org)[0].api_key)
+
+    def test_doesnt_write_back_stale_details_of_cached_users(self):
+        user = self.factory.create_user()
+        models.db.session.commit()
+        with self.app.test_request_context():
+            get_user_by_id_and_org(user.id, self.factory.org)
+        # Updated behind the cache's back, as by a sync that commits while the user is being cached.
+        models.db.session.execute(
+            "UPDATE users SET details = details || '{\"is_invitation_pending\": true}' WHERE id = :id", {"id": user.id}
+        )
+        models.db.session.commit()
+        models.db.session.expunge_all()
+
+        with self.app.test_request_context():
+            cached_user = get_user_by_id_and_org(user.id, self.factory.org)[0]
+            cached_user.name = "New Name"
+            models.db.session.commit()
+
+        self.assertTrue(models.User.query.get(user.id).is_invitation_pending)
+
+    def test_rejects_regenerated_user_api_keys(self):
+        user = self.factory.create_user(api_key="user_key")
+        models.db.session.flush()
+        self.assertIsNotNone(self.load_user_from_api_key("user_key"))
+
+        user.regenerate_api_key()
+        models.db.session.commit()
+
+        self.assertIsNone(self.load_user_from_api_key("user_key"))
+
+    def test_rejects_deactivated_api_keys(self):
+        api_key = self.factory.create_api_key(object=self.factory.create_dashboard())
+        models.db.session.flush()
+        dashboard_url = "/{}/api/dashboards/public/{}".format(self.factory.org.slug, api_key.api_key)
+        self.assertIsNotNone(self.load_user_from_api_key(api_key.api_key, dashboard_url))
+
+        api_key.active = False
+        models.db.session.commit()
+
+        self.assertIsNone(self.load_user_from_api_key(api_key.api_key, dashboard_url))
+
+    def test_updates_query_api_key_groups(self):
+        query = self.factory.create_query()
+        query_url = "/{}/api/queries/{}".format(self.factory.org.slug, query.id)
+        models.db.session.flush()
+        self.assertEqual(list(query.groups.keys()), self.load_user_from_api_key(query.api_key, query_url).group_ids)
+
+        group = self.factory.create_group()
+        query.data_source.add_group(group)
+        models.db.session.commit()
+
+        self.assertIn(group.id, self.load_user_from_api_key(query.api_key, query_url).group_ids)
+
+
 class TestCreateAndLoginUser(BaseTestCase):
     def test_logins_valid_user(self):
         user = self.factory.create_user(email="test@example.com")
@@ -4,7 +4,7 @@ import mock
 from click.testing import CliRunner
 
 from redash.cli import manager
-from redash.models import DataSource, Group, Organization, User, db
+from redash.models import Change, DataSource, Group, Organization, User, db
 from redash.query_runner import query_runners
 from redash.utils.configuration import ConfigurationContainer
 from tests import BaseTestCase
@@ -566,3 +566,27 @@ class UserCommandTests(BaseTestCase):
         self.assertEqual(result.exit_code, 0)
         db.session.add(u)
         self.assertEqual(u.group_ids, [u.org.default_group.id, u.org.admin_group.id])
+
+
+class DatabaseCommandTests(BaseTestCase):
+    def test_compact_changes(self):
+        query = self.factory.create_query(query_text="SELECT 1")
+        change = Change(
+            object=query,
+            object_version=query.version,
+            user=self.factory.user,
+            change={
+                "name": {"previous": query.name, "current": query.name},
+                "query": {"previous": "SELECT 1", "current": "SELECT 1\nFROM table"},
+            },
+        )
+        db.session.add(change)
+        db.session.commit()
+
+        runner = CliRunner()
+        result = runner.invoke(manager, ["database", "compact_changes"])
+        self.assertFalse(result.exception)
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Rewrote 1 changes of 1 objects.", result.output)
+        db.session.refresh(change)
+        self.assertEqual(change.change, {"query": {"diff": [[0, 1, "SELECT 1\nFROM table"]]}})
@@ -2,6 +2,7 @@ import calendar
 import datetime
 from unittest import TestCase
 
+import pytz
 from dateutil.parser import parse as date_parse
 
 from redash import models
@@ -401,6 +402,24 @@ class TestUnusedQueryResults(BaseTestCase):
         self.assertIn(unused_qr, list(models.QueryResult.unused()))
         self.assertNotIn(new_unused_qr, list(models.QueryResult.unused()))
 
+    def test_deletes_unused_results_in_batches(self):
+        two_weeks_ago = utcnow() - datetime.timedelta(days=14)
+        used_qr = self.factory.create_query_result(retrieved_at=two_weeks_ago)
+        self.factory.create_query(latest_query_data=used_qr)
+        unused_qrs = [self.factory.create_query_result(retrieved_at=two_weeks_ago) for _ in range(3)]
+        new_unused_qr = self.factory.create_query_result()
+        db.session.flush()
+
+        self.assertEqual(models.QueryResult.delete_unused(limit=2), [qr.id for qr in unused_qrs[:2]])
+        self.assertEqual(models.QueryResult.delete_unused(after_id=unused_qrs[2].id), [])
+        self.assertEqual(models.QueryResult.delete_unused(after_id=unused_qrs[1].id), [unused_qrs[2].id])
+        self.assertEqual(
+            [qr.id for qr in models.QueryResult.query.order_by(models.QueryResult.id)], [used_qr.id, new_unused_qr.id]
+        )
+
+    def test_drops_no_partitions_of_unpartitioned_table(self):
+        self.assertEqual(models.QueryResult.drop_expired_partitions(), [])
+
 
 class TestQueryAll(BaseTestCase):
     def test_returns_only_queries_in_given_groups(self):
@@ -576,6 +595,45 @@ class TestEvents(BaseTestCase):
 
         self.assertDictEqual(event.additional_properties, additional_properties)
 
+    def test_records_many_events(self):
+        raw_event, user, created_at = self.raw_event()
+        other_event = dict(raw_event, action="edit", test=1)
+
+        events = models.Event.record_many([raw_event, other_event])
+
+        self.assertEqual([(e.action, e.created_at) for e in events], [("view", created_at), ("edit", created_at)])
+        recorded = models.Event.query.order_by(models.Event.id).all()
+        self.assertEqual([(e.user, e.action) for e in recorded], [(user, "view"), (user, "edit")])
+        self.assertDictEqual(recorded[1].additional_properties, {"test": 1})
+
+    def partition_of(self, event):
+        return db.session.execute(
+            "SELECT tableoid::regclass::text FROM events WHERE id = :id", {"id": event.id}
+        ).scalar()
+
+    def test_create_partition_moves_events_from_default_partition(self):
+        raw_event, _, _ = self.raw_event()
+        event = models.Event.record(raw_event)
+        db.session.flush()
+        self.assertEqual(models.Event.DEFAULT_PARTITION, self.partition_of(event))
+
+        self.assertTrue(models.Event.create_partition(datetime.date(2014, 9, 1)))
+        self.assertFalse(models.Event.create_partition(datetime.date(2014, 9, 1)))
+
+        self.assertEqual("events_y2014m09", self.partition_of(event))
+        self.assertEqual(1, models.Event.query.count())
+
+    def test_drop_partitions_before(self):
+        raw_event, _, _ = self.raw_event()
+        models.Event.record_many([raw_event, dict(self.raw_event()[0], timestamp=1420070400)])
+        models.Event.create_partition(datetime.date(2014, 9, 1))
+        models.Event.create_partition(datetime.date(2014, 12, 1))
+
+        dropped = models.Event.drop_partitions_before(datetime.datetime(2014, 12, 15, tzinfo=pytz.utc))
+
+        self.assertEqual(["events_y2014m09"], dropped)
+        self.assertEqual([datetime.datetime(2015, 1, 1, tzinfo=pytz.utc)], [e.created_at for e in models.Event.query])
+
 
 def _set_up_dashboard_test(d):
     d.g1 = d.factory.create_group(name="First", permissions=["create", "view"])
@@ -1,7 +1,18 @@
 from unittest.mock import MagicMock, patch
 
+from rq import Queue
+from rq.registry import StartedJobRegistry
+
 from redash import rq_redis_connection
-from redash.monitor import rq_job_ids
+from redash.models import db
+from redash.monitor import (
+    estimated_row_counts,
+    get_status,
+    refresh_database_status,
+    rq_job_ids,
+    rq_queues,
+)
+from tests import BaseTestCase
 
 
 def test_rq_job_ids_uses_rq_redis_connection():
@@ -21,3 +32,52 @@ def test_rq_job_ids_uses_rq_redis_connection():
 
         mock_Queue.all.assert_called_once_with(connection=rq_redis_connection)
         mock_StartedJobRegistry.assert_called_once_with(queue=mock_queue)
+
+
+class TestDatabaseStatus(BaseTestCase):
+    def test_reads_snapshot_until_refreshed(self):
+        self.factory.create_query()
+        db.session.execute("ANALYZE queries")
+
+        self.assertEqual(1, get_status()["queries_count"])
+        self.factory.create_query()
+        db.session.execute("ANALYZE queries")
+        self.assertEqual(1, get_status()["queries_count"])
+
+        refresh_database_status()
+        self.assertEqual(2, get_status()["queries_count"])
+
+    def test_estimates_row_counts(self):
+        self.factory.create_query()
+        db.session.execute("ANALYZE queries")
+
+        self.assertEqual({"queries": 1, "unknown": 0}, estimated_row_counts("queries", "unknown"))
+
+    def test_counts_tables_that_havent_been_analyzed(self):
+        self.factory.create_query()
+        db.session.execute("CREATE TABLE unanalyzed AS SELECT * FROM generate_series(1, 3)")
+
+        with patch("redash.monitor.EXACT_ROW_COUNT_THRESHOLD", 0):
+            self.assertEqual({"unanalyzed": 3}, estimated_row_counts("unanalyzed"))
+
+    @patch("redash.monitor.EXACT_ROW_COUNT_THRESHOLD", 0)
+    def test_estimates_analyzed_tables_above_the_threshold(self):
+        self.factory.create_query()
+        db.session.execute("ANALYZE queries")
+        self.factory.create_query()
+
+        self.assertEqual({"queries": 1}, estimated_row_counts("queries"))
+
+
+class TestRqQueues(BaseTestCase):
+    def test_lists_queued_and_started_jobs(self):
+        queue = Queue("queries", connection=rq_redis_connection)
+        started = queue.enqueue("redash.tasks.general.version_check")
+        queue.enqueue("redash.tasks.general.version_check")
+        queue.remove(started)
+        StartedJobRegistry(queue=queue).add(started, -1)
+
+        status = rq_queues()["queries"]
+
+        self.assertEqual(1, status["queued"])
+        self.assertEqual([started.id], [job["id"] for job in status["started"]])
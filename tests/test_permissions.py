@@ -1,5 +1,7 @@
 from collections import namedtuple
 
+import mock
+
 from redash import models
 from redash.permissions import has_access
 from tests import BaseTestCase
@@ -64,3 +66,21 @@ class TestHasAccess(BaseTestCase):
         user = models.ApiUser(api_key, None, [])
 
         self.assertTrue(has_access(query, user, view_only))
+
+    def test_uses_prefetched_dashboard_api_keys(self):
+        dashboard = self.factory.create_dashboard()
+        visualization = self.factory.create_visualization()
+        self.factory.create_widget(dashboard=dashboard, visualization=visualization)
+        query = self.factory.create_query(visualizations=[visualization])
+        other_query = self.factory.create_query()
+
+        api_key = self.factory.create_api_key(object=dashboard).api_key
+        user = models.ApiUser(api_key, None, [])
+
+        with self.app.test_request_context("/"):
+            models.Query.prefetch_dashboard_api_keys([query.id, other_query.id])
+
+            with mock.patch.object(models.db.session, "execute") as execute:
+                self.assertTrue(has_access(query, user, view_only))
+                self.assertFalse(has_access(other_query, user, view_only))
+                execute.assert_not_called()
@@ -0,0 +1,84 @@
+import datetime
+import decimal
+from unittest import TestCase
+
+from mock import patch
+
+from redash.utils.column_stats import compute_column_stats
+
+
+def result(*values):
+    return {"columns": [{"name": "col", "type": None}], "rows": [{"col": v} for v in values]}
+
+
+class TestComputeColumnStats(TestCase):
+    def test_returns_none_without_columns(self):
+        self.assertIsNone(compute_column_stats(None))
+        self.assertIsNone(compute_column_stats({}))
+
+    def test_numeric_column(self):
+        stats = compute_column_stats(result(1, 2.5, decimal.Decimal("3.5"), None, 2.5))["col"]
+
+        self.assertEqual(
+            stats,
+            {"null_count": 1, "distinct_count": 3, "min": 1, "max": decimal.Decimal("3.5"), "sum": 9.5, "mean": 2.375},
+        )
+
+    def test_non_finite_floats_are_nulls(self):
+        stats = compute_column_stats(result(1.0, float("nan"), float("inf")))["col"]
+
+        self.assertEqual(stats["null_count"], 2)
+        self.assertEqual(stats["max"], 1.0)
+
+    def test_string_column(self):
+        stats = compute_column_stats(result("b", "a", "c", "a"))["col"]
+
+        self.assertEqual(stats, {"null_count": 0, "distinct_count": 3, "min": "a", "max": "c"})
+
+    def test_strings_with_nul_characters_have_no_min_max(self):
+        stats = compute_column_stats(result("b", "a\x00"))["col"]
+
+        self.assertEqual(stats, {"null_count": 0, "distinct_count": 2})
+
+    def test_lists_with_nul_characters_have_no_min_max(self):
+        stats = compute_column_stats(result(["b"], ["a\x00"]))["col"]
+
+        self.assertEqual(stats, {"null_count": 0})
+
+    @patch("redash.utils.column_stats.DISTINCT_COUNT_LIMIT", 2)
+    def test_distinct_count_is_limited(self):
+        self.assertEqual(compute_column_stats(result(1, 2, 1))["col"]["distinct_count"], 2)
+        self.assertNotIn("distinct_count", compute_column_stats(result(1, 2, 3))["col"])
+
+    def test_datetime_column(self):
+        first = datetime.datetime(2024, 1, 1)
+        last = datetime.datetime(2024, 2, 1)
+        stats = compute_column_stats(result(last, first))["col"]
+
+        self.assertEqual(stats["min"], first)
+        self.assertEqual(stats["max"], last)
+
+    def test_booleans_are_not_numeric(self):
+        stats = compute_column_stats(result(True, False, True))["col"]
+
+        self.assertNotIn("sum", stats)
+        self.assertEqual(stats["distinct_count"], 2)
+
+    def test_mixed_types_have_no_min_max(self):
+        stats = compute_column_stats(result(1, "a"))["col"]
+
+        self.assertEqual(stats, {"null_count": 0, "distinct_count": 2})
+
+    def test_unhashable_values(self):
+        stats = compute_column_stats(result([1], [2]))["col"]
+
+        self.assertNotIn("distinct_count", stats)
+        self.assertEqual(stats["min"], [1])
+
+    def test_missing_values_are_nulls(self):
+        data = {"columns": [{"name": "a"}, {"name": "b"}], "rows": [{"a": 1}, {"a": 2, "b": 3}]}
+
+        self.assertEqual(compute_column_stats(data)["b"]["null_count"], 1)
+
+    def test_empty_rows(self):
+        self.assertEqual(compute_column_stats(result()), {"col": {"null_count": 0}})
@@ -1,4 +1,18 @@
-from redash.utils import json_dumps, json_loads
+import datetime
+import decimal
+import uuid
+
+import mock
+import pytest
+import pytz
+
+from redash import utils
+from redash.utils import (
+    COMPACT_SEPARATORS,
+    json_dumps,
+    json_loads,
+    register_json_encoder,
+)
 from tests import BaseTestCase
 
 
@@ -29,3 +43,104 @@ class TestJsonDumps(BaseTestCase):
         json_data = json_dumps(input_data)
         actual_output_data = json_loads(json_data)
         self.assertEqual(actual_output_data, expected_output_data)
+
+    def test_data_without_nan_is_not_copied(self):
+        input_data = {"columns": [{"name": "_col0", "type": "float"}], "rows": [{"_col0": 1.5}]}
+        with mock.patch("redash.utils._sanitize_data") as sanitize_data:
+            json_data = json_dumps(input_data)
+
+        sanitize_data.assert_not_called()
+        self.assertEqual(json_loads(json_data), input_data)
+
+    def test_nested_nan_is_sanitized(self):
+        input_data = {"rows": [{"values": [1.0, float("nan"), {"x": float("-inf")}]}]}
+        self.assertEqual(json_loads(json_dumps(input_data)), {"rows": [{"values": [1.0, None, {"x": None}]}]})
+
+    def test_other_value_errors_are_raised(self):
+        tz_aware_time = datetime.time(12, 0, tzinfo=pytz.utc)
+        with self.assertRaises(ValueError):
+            json_dumps({"time": tz_aware_time, "value": float("nan")})
+
+
+class Point:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+def encode_point(encoder, o):
+    if isinstance(o, Point):
+        return [o.x, o.y]
+    return None
+
+
+class TestJsonEncoderRegistry(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        register_json_encoder(encode_point)
+        self.addCleanup(utils._json_encoders_by_type.clear)
+        self.addCleanup(utils._custom_json_encoders.remove, encode_point)
+
+    def test_uses_registered_encoder(self):
+        self.assertEqual(json_loads(json_dumps({"points": [Point(1, 2), Point(3, 4)]})), {"points": [[1, 2], [3, 4]]})
+
+    def test_caches_encoder_by_type(self):
+        json_dumps([Point(1, 2), datetime.date(2024, 1, 1), decimal.Decimal("1.5")])
+
+        self.assertIs(utils._json_encoders_by_type[datetime.date], utils._encode_date)
+        self.assertIs(utils._json_encoders_by_type[decimal.Decimal], utils._encode_decimal)
+        self.assertIn(Point, utils._json_encoders_by_type)
+
+    def test_registering_encoder_twice_is_a_noop(self):
+        register_json_encoder(encode_point)
+
+        self.assertEqual(utils._custom_json_encoders.count(encode_point), 1)
+
+    def test_unsupported_types_raise_type_error(self):
+        with self.assertRaises(TypeError):
+            json_dumps({"value": object()})
+
+
+@pytest.mark.skipif(utils.orjson is None, reason="orjson is not installed")
+class TestJsonDumpsEncoders(BaseTestCase):
+    data = {
+        "datetime": datetime.datetime(2024, 1, 1, 12, 30, 15, 123456, tzinfo=pytz.utc),
+        "date": datetime.date(2024, 1, 1),
+        "time": datetime.time(12, 30, 15, 123456),
+        "decimal": decimal.Decimal("1.25"),
+        "uuid": uuid.UUID("0b1a1c4e-7d2e-4b4c-9f61-a7c7a8b4c3d2"),
+        "bytes": b"test",
+        "nan": float("nan"),
+        "big_int": 2**70,
+        1: "int key",
+    }
+
+    def test_fast_and_standard_encoders_produce_the_same_output(self):
+        with mock.patch("redash.utils.orjson.dumps", wraps=utils.orjson.dumps) as orjson_dumps:
+            fast = json_dumps(self.data, separators=COMPACT_SEPARATORS)
+        orjson_dumps.assert_called_once()
+        with mock.patch("redash.utils._use_fast_json_dumps", return_value=False):
+            standard = json_dumps(self.data, separators=COMPACT_SEPARATORS)
+
+        self.assertEqual(fast, standard)
+        self.assertEqual(
+            json_loads(standard),
+            {
+                "datetime": "2024-01-01T12:30:15.123Z",
+                "date": "2024-01-01",
+                "time": "12:30:15.123",
+                "decimal": 1.25,
+                "uuid": "0b1a1c4e-7d2e-4b4c-9f61-a7c7a8b4c3d2",
+                "bytes": "74657374",
+                "nan": None,
+                "big_int": 2**70,
+                "1": "int key",
+            },
+        )
+
+    def test_other_options_use_the_standard_encoder(self):
+        with mock.patch("redash.utils.orjson.dumps") as orjson_dumps:
+            self.assertEqual(json_dumps({"b": 1, "a": 2}, sort_keys=True), '{"a": 2, "b": 1}')
+            self.assertEqual(json_dumps({"a": 1}), '{"a": 1}')
+
+        orjson_dumps.assert_not_called()
@@ -0,0 +1,47 @@
+from unittest import TestCase
+
+from mock import patch
+
+from redash.utils.timing import add_timings, current_timings, phase, timed_phases
+
+
+@patch("redash.utils.timing.time.perf_counter", side_effect=range(100))
+class TestTimedPhases(TestCase):
+    def test_phases_do_nothing_outside_of_timed_phases(self, _):
+        with phase("execute"):
+            pass
+
+        self.assertIsNone(current_timings())
+
+    def test_nested_phases_are_excluded_from_their_parents(self, _):
+        with timed_phases() as timings:
+            with phase("execute"):  # 0 - 5
+                with phase("connect"):  # 1 - 2
+                    pass
+                with phase("fetch"):  # 3 - 4
+                    pass
+
+        self.assertEqual(timings, {"connect": 1, "fetch": 1, "execute": 3})
+        self.assertIsNone(current_timings())
+
+    def test_phases_with_the_same_name_add_up(self, _):
+        with timed_phases() as timings:
+            with phase("store"):  # 0 - 1
+                pass
+            with phase("update"):  # 2 - 5
+                with phase("store"):  # 3 - 4
+                    pass
+
+        self.assertEqual(timings, {"store": 2, "update": 2})
+
+    def test_added_timings_are_nested_in_the_running_phase(self, _):
+        with timed_phases() as timings:
+            with phase("execute"):  # 0 - 1
+                add_timings({"fetch": 0.25})
+
+        self.assertEqual(timings, {"fetch": 0.25, "execute": 0.75})
+
+    def test_added_timings_are_dropped_outside_of_timed_phases(self, _):
+        add_timings({"fetch": 1})
+
+        self.assertIsNone(current_timings())